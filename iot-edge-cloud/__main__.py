@@ -1,8 +1,18 @@
 import os
+import json
 import click
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from helpers.common import get_nid
+from helpers.common import DEFAULT_BATCH_WAIT, get_nid
+from helpers.dedup import DEFAULT_DEDUP_STORE_BYTES
+from helpers.transfer import DEFAULT_CHUNK_WINDOW
+from helpers.serializer import (
+    COMPRESSION_NAMES,
+    DEFAULT_COMPRESSION,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_SERIALIZER,
+    SERIALIZER_NAMES,
+)
 from services import Algorithm, ModelArch
 from services.IoTClient import IoTClient
 from services.EdgeNode import EdgeNode
@@ -14,6 +24,7 @@ load_dotenv()
 VALID_ROLES: List[str] = ["IOT", "EDGE", "CLOUD"]
 DEFAULT_ITERATIONS: int = 54
 DEFAULT_DATA_SIZE_OPTION: str = "small"
+DEFAULT_WORKERS: int = 1
 ROLE = os.environ.get("ROLE", "EDGE").upper()
 DEVICE_ID = os.environ.get("DEVICE_ID", "").upper()
 
@@ -23,6 +34,20 @@ def get_target_node_addresses(num_nodes: int) -> List[str]:
     return [os.getenv(f"IOT_TARGET_{i + 1}") for i in range(num_nodes)]
 
 
+def parse_algo_options(values: Tuple[str, ...]) -> Dict[str, Any]:
+    """Parse KEY=VALUE algorithm options, decoding JSON values (numbers, booleans)."""
+    options = {}
+    for value in values:
+        key, sep, raw = value.partition("=")
+        if not sep or not key:
+            raise ValueError(f"Invalid algorithm option: {value}. Expected KEY=VALUE")
+        try:
+            options[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            options[key] = raw
+    return options
+
+
 def validate_size_option(algo_code: str, size_option: str) -> Algorithm:
     """Validate the size option against the algorithm's available sizes."""
     algo = Algorithm[algo_code]
@@ -35,7 +60,24 @@ def validate_size_option(algo_code: str, size_option: str) -> Algorithm:
 
 
 def start_iot(
-    device_id: str, algo_code: str, size_option: str, iterations: int, arch_name: str
+    device_id: str,
+    algo_code: str,
+    size_option: str,
+    iterations: int,
+    arch_name: str,
+    workers: int = DEFAULT_WORKERS,
+    algo_options: Dict[str, Any] = None,
+    ack: bool = False,
+    window: int = 1,
+    serializer: str = DEFAULT_SERIALIZER,
+    compression: str = DEFAULT_COMPRESSION,
+    compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+    compression_threshold: Optional[int] = None,
+    dedup: bool = False,
+    batch_size: int = 1,
+    batch_wait: float = DEFAULT_BATCH_WAIT,
+    chunk_size: Optional[int] = None,
+    chunk_window: int = DEFAULT_CHUNK_WINDOW,
 ) -> None:
     """Start IoT clients and handle their lifecycle."""
     try:
@@ -55,6 +97,19 @@ def start_iot(
                 algo=algo,
                 iterations=iterations,
                 arch=arch,
+                workers=workers,
+                algo_options=algo_options,
+                ack=ack,
+                window=window,
+                serializer=serializer,
+                compression=compression,
+                compression_level=compression_level,
+                compression_threshold=compression_threshold,
+                dedup=dedup,
+                batch_size=batch_size,
+                batch_wait=batch_wait,
+                chunk_size=chunk_size,
+                chunk_window=chunk_window,
             )
             iot_clients.append(iot_client)
             iot_client.start()
@@ -71,9 +126,39 @@ def start_iot(
             iot_client.stop()
 
 
-def start_edge(device_id: str) -> None:
+def start_edge(
+    device_id: str,
+    workers: int = DEFAULT_WORKERS,
+    ack: bool = False,
+    window: int = 1,
+    serializer: str = DEFAULT_SERIALIZER,
+    compression: str = DEFAULT_COMPRESSION,
+    compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+    compression_threshold: Optional[int] = None,
+    dedup: bool = False,
+    dedup_store_bytes: int = DEFAULT_DEDUP_STORE_BYTES,
+    batch_size: int = 1,
+    batch_wait: float = DEFAULT_BATCH_WAIT,
+    chunk_size: Optional[int] = None,
+    chunk_window: int = DEFAULT_CHUNK_WINDOW,
+) -> None:
     """Start Edge node and handle its lifecycle."""
-    edge_node = EdgeNode(device_id)
+    edge_node = EdgeNode(
+        device_id,
+        workers=workers,
+        ack=ack,
+        window=window,
+        serializer=serializer,
+        compression=compression,
+        compression_level=compression_level,
+        compression_threshold=compression_threshold,
+        dedup=dedup,
+        dedup_store_bytes=dedup_store_bytes,
+        batch_size=batch_size,
+        batch_wait=batch_wait,
+        chunk_size=chunk_size,
+        chunk_window=chunk_window,
+    )
     try:
         edge_node.run()
     except Exception as e:
@@ -82,9 +167,19 @@ def start_edge(device_id: str) -> None:
         edge_node.stop()
 
 
-def start_cloud(device_id: str, arch_name: str) -> None:
+def start_cloud(
+    device_id: str,
+    arch_name: str,
+    workers: int = DEFAULT_WORKERS,
+    dedup_store_bytes: int = DEFAULT_DEDUP_STORE_BYTES,
+) -> None:
     """Start Cloud server and handle its lifecycle."""
-    cloud = CloudServer(device_id, arch=ModelArch[arch_name])
+    cloud = CloudServer(
+        device_id,
+        arch=ModelArch[arch_name],
+        workers=workers,
+        dedup_store_bytes=dedup_store_bytes,
+    )
     try:
         cloud.run()
     except Exception as e:
@@ -121,7 +216,117 @@ def start_cloud(device_id: str, arch_name: str) -> None:
     prompt=True if ROLE != "EDGE" else False,
     help="Model architecture",
 )
-def main(algo_code: str, size_option: str, iterations: int, arch_name: str) -> None:
+@click.option(
+    "--workers",
+    default=DEFAULT_WORKERS,
+    type=click.IntRange(min=1),
+    help="Number of worker processes used to process the data",
+    show_default=True,
+)
+@click.option(
+    "--algo-option",
+    "algo_options",
+    multiple=True,
+    help="Algorithm option sent with every request, as KEY=VALUE (e.g., mode=banded)",
+)
+@click.option(
+    "--ack",
+    is_flag=True,
+    help="Wait for the receiving node to acknowledge every packet, timing the round trip",
+)
+@click.option(
+    "--window",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of packets in flight waiting for acknowledgement with --ack",
+    show_default=True,
+)
+@click.option(
+    "--serializer",
+    default=DEFAULT_SERIALIZER,
+    type=click.Choice(SERIALIZER_NAMES),
+    help="Encoding of the payloads sent, agreed on with the receiving node",
+    show_default=True,
+)
+@click.option(
+    "--compression",
+    default=DEFAULT_COMPRESSION,
+    type=click.Choice(COMPRESSION_NAMES),
+    help="Compression of the payloads sent, agreed on with the receiving node",
+    show_default=True,
+)
+@click.option(
+    "--compression-level",
+    default=DEFAULT_COMPRESSION_LEVEL,
+    type=click.IntRange(min=1, max=9),
+    help="zlib level with --compression zlib, 1 is the fastest and 9 the smallest",
+    show_default=True,
+)
+@click.option(
+    "--compression-threshold",
+    default=None,
+    type=click.IntRange(min=0),
+    help="Compress every payload of at least this many bytes, not only those of algorithms that compress well",
+)
+@click.option(
+    "--dedup",
+    is_flag=True,
+    help="Offer the digest of every payload first, sending it only if the receiving node does not have it",
+)
+@click.option(
+    "--dedup-store-bytes",
+    default=DEFAULT_DEDUP_STORE_BYTES,
+    type=click.IntRange(min=0),
+    help="Bytes of the recent payloads kept by edge and cloud servers for --dedup, 0 disables it",
+    show_default=True,
+)
+@click.option(
+    "--batch-size",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of messages sent together in one frame, 1 sends every message on its own",
+    show_default=True,
+)
+@click.option(
+    "--batch-wait",
+    default=DEFAULT_BATCH_WAIT,
+    type=click.FloatRange(min=0),
+    help="Seconds a batch waits to fill up with --batch-size before it is sent",
+    show_default=True,
+)
+@click.option(
+    "--chunk-size",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Send the payloads in chunks of this many bytes, with flow control per stream",
+)
+@click.option(
+    "--chunk-window",
+    default=DEFAULT_CHUNK_WINDOW,
+    type=click.IntRange(min=1),
+    help="Number of chunks of a stream in flight waiting for acknowledgement with --chunk-size",
+    show_default=True,
+)
+def main(
+    algo_code: str,
+    size_option: str,
+    iterations: int,
+    arch_name: str,
+    workers: int,
+    algo_options: Tuple[str, ...],
+    ack: bool,
+    window: int,
+    serializer: str,
+    compression: str,
+    compression_level: int,
+    compression_threshold: Optional[int],
+    dedup: bool,
+    dedup_store_bytes: int,
+    batch_size: int,
+    batch_wait: float,
+    chunk_size: Optional[int],
+    chunk_window: int,
+) -> None:
     """Main entry point to start IoT, Edge, or Cloud based on the ROLE environment variable."""
     try:
         if ROLE not in VALID_ROLES:
@@ -129,16 +334,53 @@ def main(algo_code: str, size_option: str, iterations: int, arch_name: str) -> N
         if not DEVICE_ID:
             raise ValueError("Device ID is not set in environment variables")
 
+        if ack and chunk_size:
+            raise ValueError(
+                "--ack cannot be used with --chunk-size, every chunk is acknowledged already"
+            )
+
         device_id = get_nid(ROLE, DEVICE_ID)
 
         if ROLE == "IOT":
             start_iot(
-                device_id, algo_code.upper(), size_option, iterations, arch_name.upper()
+                device_id,
+                algo_code.upper(),
+                size_option,
+                iterations,
+                arch_name.upper(),
+                workers,
+                parse_algo_options(algo_options),
+                ack,
+                window,
+                serializer,
+                compression,
+                compression_level,
+                compression_threshold,
+                dedup,
+                batch_size,
+                batch_wait,
+                chunk_size,
+                chunk_window,
             )
         elif ROLE == "EDGE":
-            start_edge(device_id)
+            start_edge(
+                device_id,
+                workers,
+                ack,
+                window,
+                serializer,
+                compression,
+                compression_level,
+                compression_threshold,
+                dedup,
+                dedup_store_bytes,
+                batch_size,
+                batch_wait,
+                chunk_size,
+                chunk_window,
+            )
         elif ROLE == "CLOUD":
-            start_cloud(device_id, arch_name.upper())
+            start_cloud(device_id, arch_name.upper(), workers, dedup_store_bytes)
         else:
             raise ValueError(f"Invalid role: {ROLE}")
 
@@ -0,0 +1,126 @@
+"""
+Benchmark micro-batching: messages are coalesced by a batcher into frames of
+up to a batch size, encoded into socketio packets, decoded, and processed at
+once with the `process_batch` function of the algorithm. For every batch size,
+the throughput of encoding, decoding and processing, and the latency added by
+waiting for a batch to fill up with messages arriving at a fixed interval.
+
+Run from the repository root:
+
+    python iot-edge-cloud/bench/bench_batch.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio.packet import Packet  # noqa: E402
+from config import DATA_CONFIG  # noqa: E402
+from helpers.common import MessageBatcher, process_data  # noqa: E402
+
+# Messages sent per batch size, and the seconds between two messages
+MESSAGES = 16
+INTERVAL = 0.002
+BATCH_SIZES = [1, 2, 4, 8, 16]
+# Algorithm options, with the result cache disabled so every message is processed
+OPTIONS = {
+    "sa": {"scorer": "batch", "cache_size": 0},
+    "ocr": {"decode_scale": 8, "localize": True},
+}
+WORKERS = os.cpu_count() or 1
+
+
+def make_message(algo_code: str, size: str) -> dict:
+    """
+    Read a data set and wrap it in the message an IoT device sends.
+    """
+    algo_config = DATA_CONFIG[algo_code]
+    data_dir = os.path.join(algo_config["data_dir"], size)
+    data = algo_config["preprocess"](data_dir)
+    pack = algo_config.get("pack")
+    return {
+        "arch": "CLOUD",
+        "data_size": 0,
+        "data_dir": data_dir,
+        "algo": algo_code.upper(),
+        "data": pack(data) if pack is not None else data,
+        "iters": MESSAGES,
+        "options": OPTIONS.get(algo_code, {}),
+    }
+
+
+def transfer(message: dict) -> dict:
+    """
+    Encode a message into the socketio packet and its attachments, and decode it.
+    """
+    encoded = Packet(data=["recv", message]).encode()
+    parts = encoded if isinstance(encoded, list) else [encoded]
+    packet = Packet(encoded_packet=parts[0])
+    for attachment in parts[1:]:
+        packet.add_attachment(attachment)
+    return packet.data[1]
+
+
+def run(algo_code: str, message: dict, batch_size: int) -> tuple:
+    """
+    Send the messages through a batcher and process every batch as it arrives.
+
+    Returns:
+        tuple: The busy time, and the batching statistics.
+    """
+    algo_config = DATA_CONFIG[algo_code]
+    options = {**message["options"], "workers": WORKERS}
+    busy = []
+
+    def send(messages: list):
+        start = time.perf_counter()
+        received = transfer({"batch": messages})["batch"]
+        if batch_size > 1:
+            results, _ = process_data(
+                algo_config["process_batch"],
+                [m["data"] for m in received],
+                **options,
+            )
+        else:
+            results = [
+                process_data(algo_config["process"], m["data"], **options)[0]
+                for m in received
+            ]
+        assert len(results) == len(messages)
+        busy.append(time.perf_counter() - start)
+
+    batcher = MessageBatcher(send, batch_size, max_wait=MESSAGES * INTERVAL)
+    for _ in range(MESSAGES):
+        batcher.add(message)
+        time.sleep(INTERVAL)
+    batcher.flush()
+    return sum(busy), batcher.stats()
+
+
+def main():
+    print(f"workers: {WORKERS}, {MESSAGES} messages every {INTERVAL}s")
+    print(
+        f"{'algo':<5}{'size':<8}{'batch':>6}{'batches':>9}{'msgs/s':>10}"
+        f"{'mean wait (s)':>15}{'max wait (s)':>14}"
+    )
+    for algo_code, algo_config in DATA_CONFIG.items():
+        if algo_config.get("process_batch") is None:
+            continue
+        size = algo_config["avail_sizes"][0]
+        message = make_message(algo_code, size)
+        # load the algorithm resources and start the workers before timing
+        run(algo_code, message, 2)
+        for batch_size in BATCH_SIZES:
+            busy, stats = run(algo_code, message, batch_size)
+            waits = stats["waittimes"]
+            print(
+                f"{algo_code:<5}{size:<8}{batch_size:>6}{len(stats['sizes']):>9}"
+                f"{MESSAGES / busy:>10.1f}{sum(waits) / len(waits):>15.5f}"
+                f"{max(waits):>14.5f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Benchmark license plate OCR: the per-image latency of every OCR backend, the
+persistent Tesseract engine against the tesseract command run per image, and
+the reduced-resolution decode and plate localization before OCR, the batch
+OCR of a directory of plates, read lazily through memory maps, and the bytes
+saved by reducing the images on the IoT device against the OCR accuracy.
+
+Run from the repository root:
+
+    python iot-edge-cloud/bench/bench_ocr.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DATA_CONFIG  # noqa: E402
+from helpers.common import (  # noqa: E402
+    fimg_from_dir,
+    image_to_bytes,
+    iter_images,
+    list_images,
+)
+from helpers.ocr import (  # noqa: E402
+    BACKENDS,
+    PlateResults,
+    get_backend_in_use,
+    get_ocr_engine,
+    ocr_license_plate,
+    ocr_license_plates,
+    reduce_ocr_data,
+    stream_ocr_data,
+)
+
+# Images recognized per backend and size, after the first one
+REPEATS = 5
+# Decode scale and localization of every preprocessing benchmarked
+PREPROCESSING = [(1, False), (1, True), (2, True), (4, True), (8, False), (8, True)]
+# Copies of every plate in the batch directory, and the preprocessing of the batch
+BATCH_COPIES = 4
+BATCH_OPTIONS = {"decode_scale": 8, "localize": True}
+# Width, JPEG quality and cropping of every reduction benchmarked
+REDUCTIONS = [
+    (1024, 90, False),
+    (1024, 75, False),
+    (640, 75, False),
+    (480, 75, False),
+    (640, 75, True),
+    (320, 50, True),
+]
+
+
+def expected_plate(path: str) -> str:
+    """
+    Get the plate of an image from its file name (e.g., KL-31-B-4000-2MB.jpg).
+    """
+    return "".join(os.path.basename(path).split("-")[:-1])
+
+
+def main():
+    print(f"backend in use: {get_backend_in_use()}")
+    print()
+
+    data_dir = DATA_CONFIG["ocr"]["data_dir"]
+    print(
+        f"{'backend':<13}{'size':<8}{'init (s)':>10}{'first (s)':>11}"
+        f"{'per image (s)':>15}  text"
+    )
+    for backend in BACKENDS:
+        # the engine loads once per process, the per-image latency excludes it
+        start = time.perf_counter()
+        get_ocr_engine(backend)
+        init_time = time.perf_counter() - start
+        try:
+            ocr_license_plate(fimg_from_dir(os.path.join(data_dir, "small")), backend)
+        except Exception as e:
+            print(f"{backend:<13}unavailable: {e}")
+            continue
+        for size in DATA_CONFIG["ocr"]["avail_sizes"]:
+            data = fimg_from_dir(os.path.join(data_dir, size))
+            start = time.perf_counter()
+            text = ocr_license_plate(data, backend)
+            first_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                ocr_license_plate(data, backend)
+            per_image = (time.perf_counter() - start) / REPEATS
+            print(
+                f"{backend:<13}{size:<8}{init_time:>10.4f}{first_time:>11.4f}"
+                f"{per_image:>15.4f}  {text!r}"
+            )
+
+    print()
+    print(f"{'size':<8}{'scale':>6}{'localize':>10}{'per image (s)':>15}  text")
+    for size in DATA_CONFIG["ocr"]["avail_sizes"]:
+        path = fimg_from_dir(os.path.join(data_dir, size), out_format="path")
+        data = image_to_bytes(path)
+        expected = expected_plate(path)
+        for decode_scale, localize in PREPROCESSING:
+            ocr_license_plate(data, decode_scale=decode_scale, localize=localize)
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                text = ocr_license_plate(
+                    data, decode_scale=decode_scale, localize=localize
+                )
+            per_image = (time.perf_counter() - start) / REPEATS
+            print(
+                f"{size:<8}{decode_scale:>6}{str(localize):>10}{per_image:>15.4f}"
+                f"  {text!r} ({'correct' if text.strip() == expected else expected!r})"
+            )
+
+    print()
+    bench_batch(data_dir)
+
+    print()
+    bench_reduce(data_dir)
+
+
+def make_batch_dir(data_dir: str) -> str:
+    """
+    Make a directory with copies of the plates of every size, a stream of plates.
+    """
+    batch_dir = tempfile.mkdtemp(prefix="plates-")
+    for size in DATA_CONFIG["ocr"]["avail_sizes"]:
+        for path in list_images(os.path.join(data_dir, size)):
+            # the copy number goes after the size, the plate stays readable from the name
+            stem, ext = os.path.splitext(os.path.basename(path))
+            for copy in range(BATCH_COPIES):
+                shutil.copy(path, os.path.join(batch_dir, f"{stem}_{copy}{ext}"))
+    return batch_dir
+
+
+def bench_batch(data_dir: str):
+    """
+    Compare reading the plates eagerly to mapping them lazily, and the workers of
+    the batch OCR.
+    """
+    batch_dir = make_batch_dir(data_dir)
+    try:
+        paths = list_images(batch_dir)
+        expected = [expected_plate(path) for path in paths]
+        print(f"{len(paths)} images, {BATCH_OPTIONS}")
+
+        # the peaks only count the images read, OCR allocates the same either way
+        tracemalloc.start()
+        eager = [image_to_bytes(path) for path in paths]
+        eager_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del eager
+        tracemalloc.start()
+        for _, image in iter_images(batch_dir):
+            image.sum()
+        lazy_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"peak read: eager {eager_peak / 1024:.1f} KiB, "
+            f"memory-mapped {lazy_peak / 1024:.1f} KiB"
+        )
+
+        print(
+            f"{'mode':<12}{'workers':>8}{'total (s)':>11}{'per image (s)':>15}{'correct':>9}"
+        )
+        runs = [("stream", 1, None)] + [
+            ("paths", workers, paths) for workers in sorted({1, 2, os.cpu_count() or 1})
+        ]
+        for mode, workers, images in runs:
+            start = time.perf_counter()
+            if mode == "stream":
+                counter = PlateResults()
+                for chunk in stream_ocr_data(batch_dir):
+                    results = counter.update(chunk, **BATCH_OPTIONS)
+            else:
+                # the first call forks the pool
+                ocr_license_plates(images[:workers], workers, **BATCH_OPTIONS)
+                start = time.perf_counter()
+                results = ocr_license_plates(images, workers, **BATCH_OPTIONS)
+            total = time.perf_counter() - start
+            correct = sum(
+                text.strip() == plate for (text, _), plate in zip(results, expected)
+            )
+            per_image = sum(elapsed for _, elapsed in results) / len(results)
+            print(
+                f"{mode:<12}{workers:>8}{total:>11.4f}{per_image:>15.4f}"
+                f"{correct:>6}/{len(results)}"
+            )
+    finally:
+        shutil.rmtree(batch_dir)
+
+
+def bench_reduce(data_dir: str):
+    """
+    Compare the bytes sent and the OCR of the images reduced on the IoT device.
+    """
+    print(
+        f"{'size':<8}{'width':>6}{'quality':>8}{'crop':>6}{'bytes':>10}{'saved':>8}"
+        f"{'reduce (s)':>12}{'ocr (s)':>9}  text, localized text"
+    )
+    for size in DATA_CONFIG["ocr"]["avail_sizes"]:
+        path = fimg_from_dir(os.path.join(data_dir, size), out_format="path")
+        data = image_to_bytes(path)
+        expected = expected_plate(path)
+        for reduction in [None] + REDUCTIONS:
+            start = time.perf_counter()
+            reduced = data if reduction is None else reduce_ocr_data(data, *reduction)
+            reduce_time = time.perf_counter() - start
+            # the node processing the images recognizes them as sent, then localized
+            start = time.perf_counter()
+            text = ocr_license_plate(reduced)
+            ocr_time = time.perf_counter() - start
+            localized = ocr_license_plate(reduced, localize=True)
+            width, quality, crop = reduction or ("-", "-", "-")
+            print(
+                f"{size:<8}{width:>6}{quality:>8}{str(crop):>6}{len(reduced):>10}"
+                f"{1 - len(reduced) / len(data):>8.1%}{reduce_time:>12.4f}{ocr_time:>9.4f}"
+                f"  {text!r}{'*' if text.strip() == expected else ''}, "
+                f"{localized!r}{'*' if localized.strip() == expected else ''}"
+            )
+    print(f"* correct, {expected!r}")
+
+
+if __name__ == "__main__":
+    main()
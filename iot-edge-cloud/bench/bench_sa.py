@@ -0,0 +1,212 @@
+"""
+Benchmark sentiment analysis: the one-time VADER lexicon load, the review
+scoring with a shared analyzer against a new analyzer per review, the batch
+scorer against `SentimentIntensityAnalyzer.polarity_scores`, streaming the
+reviews file in chunks against reading it at once, and the process-pool
+parallel mode, and the result cache on repeated and duplicate reviews.
+
+Run from the repository root:
+
+    python iot-edge-cloud/bench/bench_sa.py
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nltk.sentiment.vader import SentimentIntensityAnalyzer  # noqa: E402
+from config import DATA_CONFIG  # noqa: E402
+from helpers.common import warm_up  # noqa: E402
+from helpers.sa import (  # noqa: E402
+    collect_sa_data,
+    SentimentCounter,
+    clear_sa_cache,
+    get_analyzer,
+    get_sa_cache_stats,
+    score_batch,
+    sentiment_analysis,
+    stream_sa_data,
+)
+
+# Reviews scored with a new analyzer each, the old behavior is too slow for more
+NUM_UNSHARED_REVIEWS = 20
+# Fixed chunk size benchmarked next to the default split
+CHUNK_SIZE = 16
+# Reviews per chunk when streaming the reviews file
+STREAM_CHUNK = 64
+# Times every review is repeated in the data set with duplicates
+DUPLICATES = 3
+# Cached results when benchmarking the result cache, which is disabled by default
+CACHE_SIZE = 100_000
+
+
+def classify(score: float) -> str:
+    """
+    Classify a compound score like `sentiment_analysis`.
+    """
+    if score >= 0.05:
+        return "good"
+    elif score <= -0.05:
+        return "bad"
+    else:
+        return "neutral"
+
+
+def classify_unshared(text: str) -> str:
+    """
+    Classify a review with a new analyzer, like before the analyzer was shared.
+    """
+    return classify(SentimentIntensityAnalyzer().polarity_scores(text)["compound"])
+
+
+def check_batch_scorer(texts):
+    """
+    Check that the batch scorer classifies every review like `polarity_scores`.
+    """
+    analyzer = get_analyzer()
+    expected = [classify(analyzer.polarity_scores(text)["compound"]) for text in texts]
+    actual = [classify(score) for score in score_batch(texts)]
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    assert not mismatches, f"batch scorer differs on reviews {mismatches[:10]}"
+
+
+def main():
+    load_time = warm_up([DATA_CONFIG["sa"]])
+    print(f"lexicon load (once per process): {load_time:.4f} s")
+    print()
+
+    data_dir = DATA_CONFIG["sa"]["data_dir"]
+    print(f"{'size':<8}{'reviews':>8}{'shared (s)':>12}{'per review (ms)':>17}")
+    for size in DATA_CONFIG["sa"]["avail_sizes"]:
+        texts = collect_sa_data(os.path.join(data_dir, size))
+        start = time.perf_counter()
+        result = sentiment_analysis(texts, cache_size=0)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{size:<8}{len(texts):>8}{elapsed:>12.4f}"
+            f"{elapsed / len(texts) * 1e3:>17.3f}  {result}"
+        )
+
+    print()
+    print(f"{'size':<8}{'vader (s)':>10}{'batch (s)':>10}{'speedup':>10}  parity")
+    for size in DATA_CONFIG["sa"]["avail_sizes"]:
+        texts = collect_sa_data(os.path.join(data_dir, size))
+        check_batch_scorer(texts)
+        start = time.perf_counter()
+        vader = sentiment_analysis(texts, cache_size=0)
+        vader_time = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = sentiment_analysis(texts, scorer="batch", cache_size=0)
+        batch_time = time.perf_counter() - start
+        print(
+            f"{size:<8}{vader_time:>10.4f}{batch_time:>10.4f}"
+            f"{vader_time / batch_time:>10.2f}  {batch == vader}"
+        )
+
+    print()
+    # the peaks only count the reviews read, scoring allocates the same either way
+    print(
+        f"{'size':<8}{'chunks':>8}{'peak read (KiB)':>17}"
+        f"{'peak stream (KiB)':>19}  parity"
+    )
+    for size in DATA_CONFIG["sa"]["avail_sizes"]:
+        size_dir = os.path.join(data_dir, size)
+        tracemalloc.start()
+        texts = collect_sa_data(size_dir)
+        read_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        tracemalloc.start()
+        for chunk in stream_sa_data(size_dir, STREAM_CHUNK):
+            pass
+        stream_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        counter = SentimentCounter()
+        running = [
+            counter.update(chunk, cache_size=0)
+            for chunk in stream_sa_data(size_dir, STREAM_CHUNK)
+        ]
+        print(
+            f"{size:<8}{len(running):>8}{read_peak / 1024:>17.1f}"
+            f"{stream_peak / 1024:>19.1f}  {running[-1] == sentiment_analysis(texts, cache_size=0)}"
+        )
+
+    print()
+    print(
+        f"{'size':<8}{'workers':>8}{'chunk':>8}{'time (s)':>10}{'speedup':>10}  parity"
+    )
+    for size in DATA_CONFIG["sa"]["avail_sizes"]:
+        texts = collect_sa_data(os.path.join(data_dir, size))
+        start = time.perf_counter()
+        serial = sentiment_analysis(texts, cache_size=0)
+        serial_time = time.perf_counter() - start
+        for workers in sorted({2, os.cpu_count() or 1} - {1}):
+            for chunk_size in (None, CHUNK_SIZE):
+                # the first call forks the pool, time the second one
+                sentiment_analysis(
+                    texts, workers=workers, chunk_size=chunk_size, cache_size=0
+                )
+                start = time.perf_counter()
+                result = sentiment_analysis(
+                    texts, workers=workers, chunk_size=chunk_size, cache_size=0
+                )
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{size:<8}{workers:>8}{str(chunk_size or 'auto'):>8}"
+                    f"{elapsed:>10.4f}{serial_time / elapsed:>10.2f}  {result == serial}"
+                )
+
+    print()
+    print(
+        f"{'size':<8}{'data':>12}{'uncached (s)':>14}{'cached (s)':>12}"
+        f"{'hits':>8}{'misses':>8}  parity"
+    )
+    for size in DATA_CONFIG["sa"]["avail_sizes"]:
+        texts = collect_sa_data(os.path.join(data_dir, size))
+        duplicated = texts * DUPLICATES
+        random.Random(0).shuffle(duplicated)
+        # the same data set sent again, like every iteration of an IoT device,
+        # and a data set where every review appears several times
+        for name, requests in (
+            ("repeated", [texts, texts]),
+            ("duplicates", [duplicated]),
+        ):
+            clear_sa_cache()
+            start = time.perf_counter()
+            expected = [sentiment_analysis(data, cache_size=0) for data in requests]
+            uncached_time = time.perf_counter() - start
+            start = time.perf_counter()
+            results = [
+                sentiment_analysis(data, cache_size=CACHE_SIZE) for data in requests
+            ]
+            cached_time = time.perf_counter() - start
+            stats = get_sa_cache_stats()
+            print(
+                f"{size:<8}{name:>12}{uncached_time:>14.4f}{cached_time:>12.4f}"
+                f"{stats['hits']:>8}{stats['misses']:>8}  {results == expected}"
+            )
+
+    texts = collect_sa_data(os.path.join(data_dir, "small"))[:NUM_UNSHARED_REVIEWS]
+    start = time.perf_counter()
+    unshared = [classify_unshared(text) for text in texts]
+    unshared_time = time.perf_counter() - start
+    start = time.perf_counter()
+    shared = sentiment_analysis(texts, cache_size=0)
+    shared_time = time.perf_counter() - start
+    total = len(unshared)
+    expected = tuple(
+        unshared.count(label) / total * 100 for label in ("good", "bad", "neutral")
+    )
+    print()
+    print(
+        f"{NUM_UNSHARED_REVIEWS} reviews: new analyzer per review {unshared_time:.4f} s, "
+        f"shared analyzer {shared_time:.4f} s ({unshared_time / shared_time:.1f}x), "
+        f"parity {shared == expected}"
+    )
+
+
+if __name__ == "__main__":
+    main()
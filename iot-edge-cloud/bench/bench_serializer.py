@@ -0,0 +1,137 @@
+"""
+Benchmark the payload serializers: the time to encode a payload into socketio
+packets and decode it again, the bytes sent and the number of frames, for the
+data set of every algorithm and size as an IoT device sends it. Then the zlib
+compression of the payloads at several levels: the bytes, the compression and
+decompression times, and the link rate below which it saves time.
+
+Run from the repository root:
+
+    python iot-edge-cloud/bench/bench_serializer.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio.packet import Packet  # noqa: E402
+from config import DATA_CONFIG  # noqa: E402
+from helpers.serializer import (  # noqa: E402
+    SERIALIZER_NAMES,
+    SERIALIZERS,
+    PayloadCompressor,
+    decode_payload,
+    encode_payload,
+)
+
+# Encodings and decodings timed per serializer and data set
+REPEATS = 5
+# zlib levels compared, from the fastest to the smallest
+COMPRESSION_LEVELS = [1, 6, 9]
+
+
+def make_payload(algo_code: str, size: str) -> dict:
+    """
+    Read a data set and wrap it in the payload an IoT device emits.
+    """
+    algo_config = DATA_CONFIG[algo_code]
+    data_dir = os.path.join(algo_config["data_dir"], size)
+    data = algo_config["preprocess"](data_dir)
+    pack = algo_config.get("pack")
+    return {
+        "arch": "CLOUD",
+        "data_size": 0,
+        "data_dir": data_dir,
+        "algo": algo_code.upper(),
+        "data": pack(data) if pack is not None else data,
+        "iters": 1,
+        "options": {},
+    }
+
+
+def encode(serializer: str, payload: dict) -> list:
+    """
+    Encode a payload into the socketio packet and its binary attachments.
+    """
+    encoded = Packet(data=["recv", encode_payload(serializer, payload)]).encode()
+    return encoded if isinstance(encoded, list) else [encoded]
+
+
+def decode(serializer: str, parts: list) -> dict:
+    """
+    Decode a payload from the socketio packet and its binary attachments.
+    """
+    packet = Packet(encoded_packet=parts[0])
+    for attachment in parts[1:]:
+        packet.add_attachment(attachment)
+    return decode_payload(serializer, packet.data[1])
+
+
+def bench_compression():
+    """
+    Compress the raw frame of every data set at every level. The break-even
+    rate is the link rate below which the bytes saved take longer to send than
+    compressing and decompressing them.
+    """
+    print(
+        f"{'algo':<5}{'size':<8}{'level':<7}{'bytes':>11}{'raw bytes':>11}{'ratio':>7}"
+        f"{'compress (s)':>14}{'decompress (s)':>16}{'break-even (B/s)':>18}"
+    )
+    for algo_code, algo_config in DATA_CONFIG.items():
+        for size in algo_config["avail_sizes"]:
+            payload = encode_payload("raw", make_payload(algo_code, size))
+            for level in COMPRESSION_LEVELS:
+                compressor = PayloadCompressor("zlib", level)
+                start = time.perf_counter()
+                for _ in range(REPEATS):
+                    frame = compressor.compress("raw", payload, always=True)
+                compress_time = (time.perf_counter() - start) / REPEATS
+                start = time.perf_counter()
+                for _ in range(REPEATS):
+                    decode_payload("raw", frame)
+                decompress_time = (time.perf_counter() - start) / REPEATS
+                saved = len(payload) - len(frame)
+                break_even = saved / (compress_time + decompress_time)
+                print(
+                    f"{algo_code:<5}{size:<8}{level:<7}{len(frame):>11}{len(payload):>11}"
+                    f"{len(payload) / len(frame):>7.2f}{compress_time:>14.5f}"
+                    f"{decompress_time:>16.5f}{max(break_even, 0):>18.0f}"
+                )
+
+
+def main():
+    print(
+        f"{'algo':<5}{'size':<8}{'serializer':<12}{'bytes':>11}{'frames':>8}"
+        f"{'encode (s)':>12}{'decode (s)':>12}"
+    )
+    for algo_code, algo_config in DATA_CONFIG.items():
+        for size in algo_config["avail_sizes"]:
+            payload = make_payload(algo_code, size)
+            for serializer in SERIALIZER_NAMES:
+                if serializer not in SERIALIZERS:
+                    print(f"{algo_code:<5}{size:<8}{serializer:<12}unavailable")
+                    continue
+                start = time.perf_counter()
+                for _ in range(REPEATS):
+                    parts = encode(serializer, payload)
+                encode_time = (time.perf_counter() - start) / REPEATS
+                start = time.perf_counter()
+                for _ in range(REPEATS):
+                    decode(serializer, parts)
+                decode_time = (time.perf_counter() - start) / REPEATS
+                size_bytes = sum(
+                    len(part.encode("utf-8")) if isinstance(part, str) else len(part)
+                    for part in parts
+                )
+                print(
+                    f"{algo_code:<5}{size:<8}{serializer:<12}{size_bytes:>11}"
+                    f"{len(parts):>8}{encode_time:>12.5f}{decode_time:>12.5f}"
+                )
+    print()
+    bench_compression()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Benchmark the Smith-Waterman kernels and memory modes, and check that they
+agree with the reference Python implementation.
+
+Run from the repository root:
+
+    python iot-edge-cloud/bench/bench_sw.py
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DATA_CONFIG  # noqa: E402
+from helpers.sw import (  # noqa: E402
+    HEURISTIC_MODES,
+    KERNELS,
+    MODES,
+    _water_batch,
+    collect_kmer_index,
+    collect_sw_data,
+    encode_sw_data,
+    get_kernel_in_use,
+    pack_sw_result,
+    search_database,
+    smith_waterman,
+    unpack_sw_result,
+)
+
+REFERENCE_KERNEL = "python"
+NUM_RANDOM_PAIRS = 200
+LONG_QUERY_LEN = 100
+NUM_QUERIES = 64
+SHORT_RECORD_LEN = 500
+TIMING_REPEATS = 5
+
+
+def check_random_pairs(matrix, alphabet: str, num_pairs: int = NUM_RANDOM_PAIRS):
+    """
+    Compare every kernel and memory mode against the reference kernel on random short pairs.
+    """
+    rng = random.Random(0)
+    reference = KERNELS[REFERENCE_KERNEL]
+    for _ in range(num_pairs):
+        seq1 = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        seq2 = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        sw_data = encode_sw_data([seq1], [seq2], matrix, alphabet)
+        args = (sw_data.substitution, sw_data.gaps, sw_data.seq1s[0], sw_data.seq2s[0])
+        expected = reference(*args)
+        for name, water in KERNELS.items():
+            out = water(*args)
+            assert out == expected, f"{name} differs on ({seq1!r}, {seq2!r})"
+        for name, water in MODES.items():
+            if water is None or name in HEURISTIC_MODES:
+                continue
+            out = water(*args)
+            if name == "score":
+                out = (out[0], expected[1], expected[2])
+            assert out == expected, f"{name} differs on ({seq1!r}, {seq2!r})"
+        # a batch of queries of different lengths against the same sequence
+        seq2s = [seq2[: rng.randint(0, len(seq2))] for _ in range(rng.randint(1, 5))]
+        batch = _water_batch(
+            sw_data.substitution,
+            sw_data.gaps,
+            args[2],
+            [sw_data.seq2s[0][: len(seq2)] for seq2 in seq2s],
+            lanes=3,
+        )
+        assert batch == [
+            reference(
+                sw_data.substitution,
+                sw_data.gaps,
+                args[2],
+                sw_data.seq2s[0][: len(seq2)],
+            )
+            for seq2 in seq2s
+        ], f"batch differs on ({seq1!r}, {seq2s!r})"
+        for name in HEURISTIC_MODES:
+            score, _, _, _ = smith_waterman(sw_data, mode=name)
+            # a heuristic may miss the optimum, but never overshoots it
+            assert score <= expected[0], f"{name} overshoots on ({seq1!r}, {seq2!r})"
+
+
+def measure(sw_data, **options):
+    """
+    Run `smith_waterman` and return its result, run time, and peak traced memory.
+    Memory is traced in a second run, since tracing slows down NumPy allocations.
+    """
+    start = time.perf_counter()
+    result = smith_waterman(sw_data, **options)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    smith_waterman(sw_data, **options)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def best_time(sw_data, repeats: int = TIMING_REPEATS, **options):
+    """
+    Run `smith_waterman` `repeats` times and return its best run time and result.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = smith_waterman(sw_data, **options)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench_modes(label: str, sw_data):
+    """
+    Print the run time and peak memory of every memory mode.
+    """
+    results = {}
+    for mode in MODES:
+        if mode in HEURISTIC_MODES:
+            continue
+        results[mode], elapsed, peak = measure(sw_data, mode=mode)
+        if mode == "score":
+            parity = results[mode][0] == results["full"][0]
+        else:
+            parity = results[mode] == results["full"]
+        print(f"{label:<12}{mode:<12}{elapsed:>10.4f}{peak / 2**20:>12.2f}  {parity}")
+
+
+def bench_heuristics(label: str, sw_data):
+    """
+    Print the best run time of every heuristic mode, its speedup over the exact
+    full mode, its score against the optimal one, and whether it flagged that
+    the optimal score may have been missed.
+    """
+    exact_time, exact = best_time(sw_data)
+    for mode in HEURISTIC_MODES:
+        elapsed, (score, _, _, missed) = best_time(sw_data, mode=mode)
+        print(
+            f"{label:<12}{mode:<12}{elapsed:>10.4f}{exact_time / elapsed:>10.2f}"
+            f"{score:>8}{exact[0]:>8}  {missed}"
+        )
+
+
+def bench_search(label: str, data_dir: str, sw_data):
+    """
+    Print the time of the k-mer index load and the best time of the prefiltered
+    database search, its speedup over the exhaustive search, how many seeds were
+    extended or pruned, and whether the best hit may have missed the optimal score.
+    """
+    exact_time, exact = best_time(sw_data)
+    start = time.perf_counter()
+    index = collect_kmer_index(data_dir)
+    load_time = time.perf_counter() - start
+    for extend in ("full", "banded"):
+        times = []
+        for _ in range(TIMING_REPEATS):
+            start = time.perf_counter()
+            (result,) = search_database(sw_data, index, extend=extend)
+            times.append(time.perf_counter() - start)
+        elapsed = min(times)
+        top = result.hits[0] if result.hits else None
+        print(
+            f"{label:<12}{extend:<10}{load_time:>10.4f}{elapsed:>10.4f}"
+            f"{exact_time / elapsed:>10.2f}{top.score if top else 0:>6}{exact[0]:>8}"
+            f"{result.candidates:>8}{result.pruned:>8}  {bool(top and top.missed)}"
+        )
+
+
+def make_queries(sw_data, num_queries: int = NUM_QUERIES):
+    """
+    Cut short queries out of the first database sequence, with a few letters mutated
+    so that they are not exact matches.
+    """
+    rng = random.Random(0)
+    database = sw_data.seq1s[0]
+    queries = []
+    for _ in range(num_queries):
+        length = rng.randint(8, 32)
+        start = rng.randrange(len(database) - length)
+        query = database[start : start + length].copy()
+        for i in rng.sample(range(length), length // 8):
+            query[i] = rng.randrange(len(sw_data.alphabet))
+        queries.append(query)
+    return queries
+
+
+def bench_result_encoding(label: str, result):
+    """
+    Print the JSON size of a result with and without the compact encoding, the
+    time to encode and decode it, and whether it decodes to the same value.
+    """
+    plain = json.dumps(result)
+    start = time.perf_counter()
+    packed = json.dumps(pack_sw_result(result))
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    decoded = unpack_sw_result(json.loads(packed))
+    decode_time = time.perf_counter() - start
+    # the wire turns tuples into lists, compare the JSON forms
+    parity = json.dumps(decoded) == plain
+    print(
+        f"{label:<16}{len(plain):>12}{len(packed):>12}{len(plain) / len(packed):>8.2f}"
+        f"{encode_time * 1e3:>12.3f}{decode_time * 1e3:>12.3f}  {parity}"
+    )
+
+
+def bench_queries(
+    label: str, sw_data, record_len: int = 0, num_queries: int = NUM_QUERIES
+):
+    """
+    Print the time of aligning many short queries one pair at a time and as lanes
+    of the batched kernel. With a `record_len`, the database is split into records
+    of that length, where the per-pair overhead dominates.
+    """
+    database = sw_data.seq1s[0]
+    queries = make_queries(sw_data, num_queries)
+    records = [database]
+    if record_len:
+        records = [
+            database[i : i + record_len] for i in range(0, len(database), record_len)
+        ]
+    sw_data = sw_data._replace(seq1s=records, seq2s=queries)
+    water = MODES["hirschberg"]
+
+    start = time.perf_counter()
+    pairs = [
+        water(sw_data.substitution, sw_data.gaps, record, query)
+        for record in records
+        for query in queries
+    ]
+    pair_time = time.perf_counter() - start
+    for lanes in (1, 16, num_queries):
+        start = time.perf_counter()
+        result = smith_waterman(sw_data, mode="hirschberg", lanes=lanes)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<12}{lanes:<8}{pair_time:>12.4f}{elapsed:>12.4f}"
+            f"{pair_time / elapsed:>10.2f}  {result == pairs}"
+        )
+
+
+def main():
+    data_dir = DATA_CONFIG["sw"]["data_dir"]
+    # results from different devices are only comparable with the same kernel
+    print(f"kernel in use: {get_kernel_in_use()}")
+    print()
+    print(f"{'size':<8}{'kernel':<12}{'time (s)':>10}{'speedup':>10}  parity")
+    for size in DATA_CONFIG["sw"]["avail_sizes"]:
+        sw_data = collect_sw_data(os.path.join(data_dir, size))
+        timings = {}
+        results = {}
+        for name in KERNELS:
+            start = time.perf_counter()
+            results[name] = smith_waterman(sw_data, kernel=name)
+            timings[name] = time.perf_counter() - start
+        for name in KERNELS:
+            speedup = timings[REFERENCE_KERNEL] / timings[name]
+            parity = results[name] == results[REFERENCE_KERNEL]
+            print(
+                f"{size:<8}{name:<12}{timings[name]:>10.4f}{speedup:>10.2f}  {parity}"
+            )
+
+    print()
+    print(f"{'size':<12}{'mode':<12}{'time (s)':>10}{'peak (MiB)':>12}  parity")
+    for size in DATA_CONFIG["sw"]["avail_sizes"]:
+        sw_data = collect_sw_data(os.path.join(data_dir, size))
+        bench_modes(size, sw_data)
+    # a longer query taken from the database shows how the memory modes scale
+    long_query = sw_data.seq1s[0][1000 : 1000 + LONG_QUERY_LEN].copy()
+    bench_modes(f"{size}+q{LONG_QUERY_LEN}", sw_data._replace(seq2s=[long_query]))
+
+    print()
+    print(
+        f"{'size':<12}{'mode':<12}{'time (s)':>10}{'speedup':>10}"
+        f"{'score':>8}{'optimal':>8}  may have missed"
+    )
+    for size in DATA_CONFIG["sw"]["avail_sizes"]:
+        sw_data = collect_sw_data(os.path.join(data_dir, size))
+        bench_heuristics(size, sw_data)
+
+    print()
+    print(
+        f"{'size':<12}{'extend':<10}{'load (s)':>10}{'time (s)':>10}{'speedup':>10}"
+        f"{'top':>6}{'optimal':>8}{'seeds':>8}{'pruned':>8}  may have missed"
+    )
+    for size in DATA_CONFIG["sw"]["avail_sizes"]:
+        sw_data = collect_sw_data(os.path.join(data_dir, size))
+        bench_search(size, os.path.join(data_dir, size), sw_data)
+
+    print()
+    print(
+        f"{'size':<12}{'lanes':<8}{'pairs (s)':>12}{'batch (s)':>12}{'speedup':>10}"
+        f"  parity ({NUM_QUERIES} queries)"
+    )
+    for size in DATA_CONFIG["sw"]["avail_sizes"]:
+        sw_data = collect_sw_data(os.path.join(data_dir, size))
+        bench_queries(size, sw_data)
+        bench_queries(f"{size}/{SHORT_RECORD_LEN}", sw_data, SHORT_RECORD_LEN)
+
+    print()
+    print(
+        f"{'result':<16}{'JSON bytes':>12}{'packed':>12}{'ratio':>8}"
+        f"{'encode (ms)':>12}{'decode (ms)':>12}  parity"
+    )
+    for size in DATA_CONFIG["sw"]["avail_sizes"]:
+        sw_data = collect_sw_data(os.path.join(data_dir, size))
+        bench_result_encoding(size, smith_waterman(sw_data))
+        sw_data = sw_data._replace(seq2s=make_queries(sw_data))
+        bench_result_encoding(f"{size}+q{NUM_QUERIES}", smith_waterman(sw_data))
+    # a longer query gives longer alignments
+    bench_result_encoding(
+        f"{size}+q{LONG_QUERY_LEN}",
+        smith_waterman(sw_data._replace(seq2s=[long_query])),
+    )
+
+    print()
+    print(f"{'size':<12}{'workers':<12}{'time (s)':>10}{'speedup':>10}  parity")
+    losses = []
+    for size in DATA_CONFIG["sw"]["avail_sizes"]:
+        sw_data = collect_sw_data(os.path.join(data_dir, size))
+        serial, serial_time, _ = measure(sw_data)
+        for workers in sorted({2, os.cpu_count() or 1} - {1}):
+            # the first call forks the pool, time the second one
+            smith_waterman(sw_data, workers=workers)
+            start = time.perf_counter()
+            result = smith_waterman(sw_data, workers=workers)
+            elapsed = time.perf_counter() - start
+            speedup = serial_time / elapsed
+            print(
+                f"{size:<12}{workers:<12}{elapsed:>10.4f}"
+                f"{speedup:>10.2f}  {result == serial}"
+            )
+            if speedup < 1:
+                losses.append(f"{size} with {workers} workers")
+    if losses:
+        # the pool pays for the tasks and the tile overlaps, which short
+        # queries or too few cores do not win back
+        print(
+            f"Parallelism is a net loss on {os.cpu_count()} CPU(s) for: "
+            + ", ".join(losses)
+        )
+
+    # an asymmetric matrix catches kernels that swap the sequences
+    check_random_pairs(
+        [[2, -1, -3, 0], [-2, 1, -1, -1], [0, -3, 3, -2], [-1, 0, -1, 1]], "acgt"
+    )
+    print(f"All kernels and modes match on {NUM_RANDOM_PAIRS} random pairs")
+
+
+if __name__ == "__main__":
+    main()
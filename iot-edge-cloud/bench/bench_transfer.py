@@ -0,0 +1,112 @@
+"""
+Benchmark the reassembly of payloads received in chunks: every chunk written
+in place into a buffer of the full size, against keeping the chunks and
+joining them once the last one arrives, for the raw frame of every data set
+and several chunk sizes. Reports the time and the peak memory above the
+payload itself.
+
+Run from the repository root:
+
+    python iot-edge-cloud/bench/bench_transfer.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DATA_CONFIG  # noqa: E402
+from helpers.serializer import decode_payload, encode_payload  # noqa: E402
+from helpers.transfer import ChunkAssembler  # noqa: E402
+
+# Chunk sizes compared, in bytes
+CHUNK_SIZES = [16 * 2**10, 64 * 2**10, 256 * 2**10]
+
+
+def make_frame(algo_code: str, size: str) -> bytes:
+    """
+    Read a data set and encode the payload an IoT device emits as a raw frame.
+    """
+    algo_config = DATA_CONFIG[algo_code]
+    data_dir = os.path.join(algo_config["data_dir"], size)
+    data = algo_config["preprocess"](data_dir)
+    pack = algo_config.get("pack")
+    return encode_payload(
+        "raw",
+        {
+            "arch": "CLOUD",
+            "data_size": 0,
+            "data_dir": data_dir,
+            "algo": algo_code.upper(),
+            "data": pack(data) if pack is not None else data,
+            "iters": 1,
+            "options": {},
+        },
+    )
+
+
+def receive(frame: bytes, chunk_size: int):
+    """
+    Yield the chunks of a frame as new objects, as the socket delivers them.
+    """
+    for offset in range(0, len(frame), chunk_size):
+        yield offset, frame[offset : offset + chunk_size]
+
+
+def in_place(chunks, size: int) -> bytes:
+    """
+    Write every chunk into the buffer of the payload as it arrives.
+    """
+    assembler = ChunkAssembler()
+    for offset, chunk in chunks:
+        payload = assembler.add(("client", 0), {"offset": offset, "size": size}, chunk)
+    return payload
+
+
+def joined(chunks, size: int) -> bytes:
+    """
+    Keep every chunk as it arrives and join them after the last one.
+    """
+    received = []
+    for _, chunk in chunks:
+        received.append(chunk)
+    return b"".join(received)
+
+
+def measure(reassemble, frame: bytes, chunk_size: int) -> tuple:
+    """
+    Reassemble the chunks, timing it and tracing the memory allocated besides the payload.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    payload = reassemble(receive(frame, chunk_size), len(frame))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return payload, elapsed, peak - len(frame)
+
+
+def main():
+    print(
+        f"{'algo':<5}{'size':<8}{'bytes':>10}{'chunk':>9}{'chunks':>8}"
+        f"{'mode':>10}{'time (s)':>11}{'extra peak (B)':>16}"
+    )
+    for algo_code, algo_config in DATA_CONFIG.items():
+        size = algo_config["avail_sizes"][-1]
+        frame = make_frame(algo_code, size)
+        for chunk_size in CHUNK_SIZES:
+            chunks = -(-len(frame) // chunk_size)
+            for mode, reassemble in (("in place", in_place), ("joined", joined)):
+                payload, elapsed, extra = measure(reassemble, frame, chunk_size)
+                assert bytes(payload) == frame
+                decode_payload("raw", payload)
+                print(
+                    f"{algo_code:<5}{size:<8}{len(frame):>10}{chunk_size:>9}"
+                    f"{chunks:>8}{mode:>10}{elapsed:>11.5f}{max(extra, 0):>16}"
+                )
+
+
+if __name__ == "__main__":
+    main()
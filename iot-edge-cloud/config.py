@@ -1,8 +1,33 @@
 from typing import Dict
 from helpers.common import fimg_from_dir
-from helpers.ocr import ocr_license_plate
-from helpers.sw import collect_sw_data, smith_waterman
-from helpers.sa import collect_sa_data, sentiment_analysis
+from helpers.ocr import (
+    PlateResults,
+    get_backend_in_use,
+    ocr_license_plate,
+    ocr_license_plate_batch,
+    pack_ocr_data,
+    reduce_ocr_data,
+    stream_ocr_data,
+    warm_up_ocr,
+)
+from helpers.sw import (
+    collect_sw_data,
+    get_kernel_in_use,
+    pack_sw_data,
+    pack_sw_result,
+    smith_waterman,
+    unpack_sw_result,
+)
+from helpers.sa import (
+    SentimentCounter,
+    collect_sa_data,
+    get_sa_cache_stats,
+    get_scorer_in_use,
+    sentiment_analysis,
+    sentiment_analysis_batch,
+    stream_sa_data,
+    warm_up_sa,
+)
 
 DATA_CONFIG: Dict[str, Dict[str, str]] = {
     "sw": {
@@ -12,6 +37,11 @@ DATA_CONFIG: Dict[str, Dict[str, str]] = {
         "avail_sizes": ["small", "medium", "large"],
         "preprocess": collect_sw_data,
         "process": smith_waterman,
+        "pack": pack_sw_data,
+        "kernel": get_kernel_in_use,
+        "pack_result": pack_sw_result,
+        "unpack_result": unpack_sw_result,
+        "compress": True,
     },
     "sa": {
         "name": "Sentiment Analysis",
@@ -20,6 +50,13 @@ DATA_CONFIG: Dict[str, Dict[str, str]] = {
         "avail_sizes": ["small", "medium", "large"],
         "preprocess": collect_sa_data,
         "process": sentiment_analysis,
+        "process_batch": sentiment_analysis_batch,
+        "kernel": get_scorer_in_use,
+        "warm_up": warm_up_sa,
+        "stream": stream_sa_data,
+        "counter": SentimentCounter,
+        "cache_stats": get_sa_cache_stats,
+        "compress": True,
     },
     "ocr": {
         "name": "Optical Character Recognition",
@@ -28,5 +65,12 @@ DATA_CONFIG: Dict[str, Dict[str, str]] = {
         "avail_sizes": ["small", "medium", "large"],
         "preprocess": fimg_from_dir,
         "process": ocr_license_plate,
+        "process_batch": ocr_license_plate_batch,
+        "pack": pack_ocr_data,
+        "reduce": reduce_ocr_data,
+        "kernel": get_backend_in_use,
+        "warm_up": warm_up_ocr,
+        "stream": stream_ocr_data,
+        "counter": PlateResults,
     },
 }
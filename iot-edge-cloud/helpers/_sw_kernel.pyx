@@ -0,0 +1,118 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Compiled Smith-Waterman kernel, built by setup.py when Cython is available.
+
+`helpers/sw.py` registers `water` as the "compiled" kernel when this extension is
+importable and falls back to the NumPy kernels otherwise. The result is identical
+to `_water` in `helpers/sw.py`.
+"""
+
+import numpy as np
+
+cimport numpy as cnp
+from libc.stdint cimport int32_t, int64_t, uint8_t
+
+cnp.import_array()
+
+
+def water(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    max_cell: bool = False,
+):
+    """
+    Perform the Smith-Waterman algorithm, keeping two rows of scores and the backtracking matrix.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        max_cell (bool): Whether to add the row and the column of the first cell holding the maximum score (-1, -1 if no score is positive).
+
+    Returns:
+        Tuple[int, List[int], List[int]]: The maximum alignment score, the indices for the first aligned sequence, and the indices for the second aligned sequence.
+    """
+    cdef const int32_t[:, :] sub = np.ascontiguousarray(substitution, dtype=np.int32)
+    cdef const int32_t[:] gap = np.ascontiguousarray(gaps, dtype=np.int32)
+    cdef const uint8_t[:] s1 = np.ascontiguousarray(seq1, dtype=np.uint8)
+    cdef const uint8_t[:] s2 = np.ascontiguousarray(seq2, dtype=np.uint8)
+    cdef Py_ssize_t seq1_len = s1.shape[0]
+    cdef Py_ssize_t seq2_len = s2.shape[0]
+    if seq1_len == 0 or seq2_len == 0:
+        return (0, [], [], -1, -1) if max_cell else (0, [], [])
+
+    backtracking_matrix = np.zeros((seq2_len + 1, seq1_len + 1), dtype=np.uint8)
+    cdef uint8_t[:, :] origins = backtracking_matrix
+    cdef int64_t[:] prev_row = np.zeros(seq1_len + 1, dtype=np.int64)
+    cdef int64_t[:] cur_row = np.zeros(seq1_len + 1, dtype=np.int64)
+    cdef int64_t[:] swap
+    cdef int64_t max_score = 0, score, diagonal_score, up_score, left_score
+    cdef Py_ssize_t max_score_row = -1, max_score_column = -1
+    cdef Py_ssize_t row, column
+    cdef uint8_t seq2_letter, seq1_letter
+    cdef int64_t up_gap
+
+    with nogil:
+        for row in range(1, seq2_len + 1):
+            seq2_letter = s2[row - 1]
+            up_gap = gap[seq2_letter]
+            cur_row[0] = 0
+            for column in range(1, seq1_len + 1):
+                seq1_letter = s1[column - 1]
+                diagonal_score = prev_row[column - 1] + sub[seq1_letter, seq2_letter]
+                up_score = prev_row[column] + up_gap
+                left_score = cur_row[column - 1] + gap[seq1_letter]
+                score = diagonal_score
+                if up_score > score:
+                    score = up_score
+                if left_score > score:
+                    score = left_score
+                if score < 0:
+                    score = 0
+                # 8 = DIAGONAL, 2 = UP, 4 = LEFT
+                if score == diagonal_score:
+                    origins[row, column] = 8
+                elif score == up_score:
+                    origins[row, column] = 2
+                else:
+                    origins[row, column] = 4
+                if score > max_score:
+                    max_score = score
+                    max_score_row = row
+                    max_score_column = column
+                cur_row[column] = score
+            swap = prev_row
+            prev_row = cur_row
+            cur_row = swap
+
+    if max_score <= 0:
+        return (0, [], [], -1, -1) if max_cell else (0, [], [])
+
+    seq1_indices = []
+    seq2_indices = []
+    row, column = max_score_row, max_score_column
+    while row > 0 and column > 0:
+        if origins[row, column] == 8:
+            row -= 1
+            column -= 1
+            seq1_indices.append(column)
+            seq2_indices.append(row)
+        elif origins[row, column] == 2:
+            row -= 1
+        else:
+            column -= 1
+
+    seq1_indices.reverse()
+    seq2_indices.reverse()
+    if max_cell:
+        return (
+            int(max_score),
+            seq1_indices,
+            seq2_indices,
+            max_score_row,
+            max_score_column,
+        )
+    return (int(max_score), seq1_indices, seq2_indices)
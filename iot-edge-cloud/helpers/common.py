@@ -1,8 +1,25 @@
 import os
+import json
+import mmap
 import time
+import atexit
+import inspect
+import threading
 import socketio
-from typing import Any, Union, List, Tuple
+import numpy as np
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Union,
+    List,
+    Tuple,
+)
 from logging import Logger
+from concurrent.futures import ProcessPoolExecutor
 
 
 def safe_int(value, default):
@@ -95,6 +112,105 @@ def read_txt_lines(filename: str) -> List[str]:
     return [line.strip() for line in lines]
 
 
+def iter_txt_lines(filename: str) -> Iterator[str]:
+    """
+    Read the lines of text data from the specified file one at a time, without loading the whole file.
+
+    Args:
+        filename (str): The file containing the text data.
+
+    Yields:
+        str: The lines of text data read from the file, like `read_txt_lines`.
+    """
+    with open(filename, "r") as f:
+        for line in f:
+            yield line.strip()
+
+
+def iter_with_last(items: Iterable[Any]) -> Iterator[Tuple[Any, bool]]:
+    """
+    Iterate over the items, telling which one is the last.
+
+    Args:
+        items (Iterable[Any]): The items.
+
+    Yields:
+        Tuple[Any, bool]: Every item and whether it is the last one.
+    """
+    items = iter(items)
+    try:
+        previous = next(items)
+    except StopIteration:
+        return
+    for item in items:
+        yield previous, False
+        previous = item
+    yield previous, True
+
+
+# Extensions of the image files read from the data directories
+IMAGE_EXTENSIONS: Tuple[str, ...] = (".jpg", ".jpeg", ".png")
+
+# Seconds to wait for the server to acknowledge an emitted packet
+DEFAULT_ACK_TIMEOUT: float = 60
+
+# Seconds a batch of messages waits for more messages after its first one
+DEFAULT_BATCH_WAIT: float = 0.05
+
+
+def list_images(dir: str) -> List[str]:
+    """
+    List the image files in the specified directory, sorted by name.
+
+    Args:
+        dir (str): The directory containing the images.
+
+    Returns:
+        List[str]: The paths to the image files.
+    """
+    return [
+        os.path.join(dir, f)
+        for f in sorted(os.listdir(dir))
+        if f.endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def map_file(filename: str) -> np.ndarray:
+    """
+    Map a file into memory read-only, without reading it.
+
+    The pages are read by the OS when they are first accessed, and the array can
+    be handed to `cv2.imdecode` without copying the data.
+
+    Args:
+        filename (str): The path to the file.
+
+    Returns:
+        np.ndarray: The bytes of the file as a uint8 array backed by the mapping.
+    """
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return np.empty(0, dtype=np.uint8)
+        # the mapping stays valid after the file is closed, until the array is freed
+        return np.frombuffer(
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), dtype=np.uint8
+        )
+
+
+def iter_images(dir: str) -> Iterator[Tuple[str, np.ndarray]]:
+    """
+    Iterate over the images in the specified directory lazily, mapping one file at a time.
+
+    Args:
+        dir (str): The directory containing the images.
+
+    Yields:
+        Tuple[str, np.ndarray]: The path to every image and its memory-mapped bytes.
+    """
+    for path in list_images(dir):
+        yield path, map_file(path)
+
+
 def fimg_from_dir(dir: str, out_format: str = "bytes") -> Any:
     """
     Get the first image from the specified directory.
@@ -106,7 +222,7 @@ def fimg_from_dir(dir: str, out_format: str = "bytes") -> Any:
     Returns:
         Any: The image data in bytes or the path to the image file.
     """
-    img_files = [f for f in os.listdir(dir) if f.endswith((".jpg", ".jpeg", ".png"))]
+    img_files = [f for f in os.listdir(dir) if f.endswith(IMAGE_EXTENSIONS)]
     if not img_files:
         raise ValueError(f"No image files found in the directory: {dir}")
     img_file = img_files[0]
@@ -131,20 +247,153 @@ def cal_data_size(dir: str) -> int:
     return sum(os.path.getsize(os.path.join(dir, f)) for f in os.listdir(dir))
 
 
-def process_data(func: Any, data: Any) -> Tuple[Any, float]:
+def cal_payload_size(data: Any) -> int:
+    """
+    Calculate the size of the binary and text data in a payload, an item or a list of items.
+
+    Args:
+        data (Any): Bytes, a numpy array, a string, or a list of them.
+
+    Returns:
+        int: Total size of the data in bytes, strings count as UTF-8, other items count as 0.
+    """
+    if isinstance(data, (list, tuple)):
+        return sum(cal_payload_size(item) for item in data)
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    return 0
+
+
+def _filter_options(func: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep the options that a function accepts as keyword arguments.
+
+    Args:
+        func (Any): The function.
+        options (Dict[str, Any]): The options.
+
+    Returns:
+        Dict[str, Any]: The options accepted by the function.
+    """
+    params = inspect.signature(func).parameters
+    return {key: value for key, value in options.items() if key in params}
+
+
+def get_kernel_name(
+    algo_config: Dict[str, Any], options: Dict[str, Any]
+) -> Optional[str]:
+    """
+    Get the name of the kernel an algorithm processes the data with, for the logs.
+
+    Args:
+        algo_config (Dict[str, Any]): The algorithm configuration from DATA_CONFIG.
+        options (Dict[str, Any]): The algorithm options of the request.
+
+    Returns:
+        Optional[str]: The kernel name, or None if the algorithm does not report one.
+    """
+    kernel = algo_config.get("kernel")
+    if kernel is None:
+        return None
+    return kernel(**_filter_options(kernel, options))
+
+
+def get_cache_stats(algo_config: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """
+    Get the hits and misses of the result cache of an algorithm in this process, for the statistics.
+
+    Args:
+        algo_config (Dict[str, Any]): The algorithm configuration from DATA_CONFIG.
+
+    Returns:
+        Optional[Dict[str, int]]: The cache statistics, or None if the algorithm has no cache.
+    """
+    cache_stats = algo_config.get("cache_stats")
+    if cache_stats is None:
+        return None
+    return cache_stats()
+
+
+def warm_up(algo_configs: List[Dict[str, Any]]) -> float:
+    """
+    Load the one-time resources of the algorithms (e.g., models or lexicons) ahead of the first request.
+
+    Args:
+        algo_configs (List[Dict[str, Any]]): The configurations of the algorithms from DATA_CONFIG.
+
+    Returns:
+        float: The load time, reported apart from the processing time.
+    """
+    start = time.perf_counter()
+    for algo_config in algo_configs:
+        load = algo_config.get("warm_up")
+        if load is not None:
+            load()
+    return time.perf_counter() - start
+
+
+# Worker pools of the algorithms by worker count and initializer, kept alive
+# across requests so processing does not fork again, and shut down at exit
+_pools: Dict[Tuple[int, Optional[Callable]], ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(
+    workers: int, initializer: Optional[Callable[[], Any]] = None
+) -> ProcessPoolExecutor:
+    """
+    Get the process pool with the given number of workers and initializer, creating it if needed.
+
+    Args:
+        workers (int): The number of worker processes.
+        initializer (Optional[Callable[[], Any]]): The function every worker runs when it starts, e.g., to load the resources of an algorithm.
+
+    Returns:
+        ProcessPoolExecutor: The process pool.
+    """
+    with _pools_lock:
+        pool = _pools.get((workers, initializer))
+        if pool is None:
+            pool = _pools[(workers, initializer)] = ProcessPoolExecutor(
+                max_workers=workers, initializer=initializer
+            )
+        return pool
+
+
+def shutdown_pools():
+    """
+    Shut down the worker pools, waiting for their workers to exit. Registered to run at exit.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+atexit.register(shutdown_pools)
+
+
+def process_data(func: Any, data: Any, **options: Any) -> Tuple[Any, float]:
     """
     Process the data using the specified function.
 
     Args:
         func (Any): The function to process the data.
         data (Any): The data to process.
+        **options (Any): Keyword options for the function. Options it does not accept are ignored.
 
     Returns:
         Tuple[Any, float]: The processed data and the processing time.
     """
+    options = _filter_options(func, options)
     try:
         start = time.perf_counter()
-        result = func(data)
+        result = func(data, **options)
         finished = time.perf_counter()
         proctime = finished - start
         return result, proctime
@@ -152,6 +401,37 @@ def process_data(func: Any, data: Any) -> Tuple[Any, float]:
         raise e
 
 
+def process_stream_chunk(
+    counters: Dict[Any, Any],
+    key: Any,
+    counter_cls: Any,
+    data: Any,
+    last: bool,
+    **options: Any,
+) -> Tuple[Any, float]:
+    """
+    Process one chunk of a streamed data set, adding it to the counter of its stream.
+
+    Args:
+        counters (Dict[Any, Any]): The counters of the streams in progress, by stream key.
+        key (Any): The key of the stream the chunk belongs to.
+        counter_cls (Any): The counter class of the algorithm, created on the first chunk of a stream.
+        data (Any): The chunk.
+        last (bool): Whether the chunk is the last of its stream, the counter is dropped after it.
+        **options (Any): Keyword options for the counter update. Options it does not accept are ignored.
+
+    Returns:
+        Tuple[Any, float]: The running result of the stream and the processing time.
+    """
+    counter = counters.get(key)
+    if counter is None:
+        counter = counters[key] = counter_cls()
+    result, proctime = process_data(counter.update, data, **options)
+    if last:
+        del counters[key]
+    return result, proctime
+
+
 def emit_data(sio_client: socketio.Client, data: Any) -> float:
     """
     Emit the data to the server using the specified socketio client.
@@ -172,6 +452,281 @@ def emit_data(sio_client: socketio.Client, data: Any) -> float:
         raise e
 
 
+class WindowedSender:
+    """
+    Emit packets without waiting for each acknowledgement, with at most `window`
+    packets in flight. Sending blocks while the window is full, so a slow link
+    holds the sender back instead of queuing packets without bound.
+
+    Args:
+        sio_client (socketio.Client): The socketio client.
+        window (int): The number of packets in flight waiting for acknowledgement, 1 waits for every packet.
+        timeout (float): The seconds to wait for a free slot or for the last acknowledgements.
+    """
+
+    def __init__(
+        self,
+        sio_client: socketio.Client,
+        window: int = 1,
+        timeout: float = DEFAULT_ACK_TIMEOUT,
+    ):
+        self.sio_client = sio_client
+        self.window = window
+        self.timeout = timeout
+        self.slots = threading.Semaphore(window)
+        self.lock = threading.Condition()
+        self.in_flight = 0
+        # Acknowledgement time of every packet, the time with packets in flight,
+        # and the time waiting for a free slot
+        self.acktimes: List[float] = []
+        self.busytime = 0.0
+        self.busy_since = None
+        self.waittime = 0.0
+        self.packet_bytes = 0
+
+    def send(self, data: Any) -> float:
+        """
+        Emit a packet once a slot of the window is free.
+
+        Args:
+            data (Any): The data to emit.
+
+        Returns:
+            float: The time until the packet was queued, after a slot was free.
+
+        Raises:
+            socketio.exceptions.TimeoutError: If no slot is freed in time.
+        """
+        packet_bytes = cal_packet_size(data)
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            raise socketio.exceptions.TimeoutError()
+        sent = time.perf_counter()
+        with self.lock:
+            if self.in_flight == 0:
+                self.busy_since = sent
+            self.in_flight += 1
+            self.packet_bytes += packet_bytes
+            self.waittime += sent - start
+
+        def on_ack(*args):
+            acked = time.perf_counter()
+            with self.lock:
+                self.acktimes.append(acked - sent)
+                self.in_flight -= 1
+                if self.in_flight == 0:
+                    self.busytime += acked - self.busy_since
+                    self.lock.notify_all()
+            self.slots.release()
+
+        self.sio_client.emit("recv", data=data, callback=on_ack)
+        return time.perf_counter() - sent
+
+    def flush(self):
+        """
+        Wait until every packet sent is acknowledged.
+
+        Raises:
+            socketio.exceptions.TimeoutError: If the packets are not acknowledged in time.
+        """
+        with self.lock:
+            if not self.lock.wait_for(lambda: self.in_flight == 0, self.timeout):
+                raise socketio.exceptions.TimeoutError()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the acknowledgement statistics of the packets sent, see `merge_stats`.
+
+        Returns:
+            Dict[str, Any]: The time with packets in flight, the acknowledgement time of every packet, the bytes sent and the time waiting for a free slot.
+        """
+        with self.lock:
+            return {
+                "acktime": self.busytime,
+                "acktimes": list(self.acktimes),
+                "packet_bytes": self.packet_bytes,
+                "waittime": self.waittime,
+            }
+
+
+class MessageBatcher:
+    """
+    Coalesce messages into batches, sending a batch once it has `max_count`
+    messages or `max_wait` seconds after its first message, whichever comes
+    first. Batches are sent in order, one at a time.
+
+    Args:
+        send (Callable[[List[Any]], None]): The function sending a batch of messages.
+        max_count (int): The number of messages of a full batch.
+        max_wait (float): The seconds to wait for a batch to fill up.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[Any]], None],
+        max_count: int = 1,
+        max_wait: float = DEFAULT_BATCH_WAIT,
+    ):
+        self.send = send
+        self.max_count = max_count
+        self.max_wait = max_wait
+        self.lock = threading.RLock()
+        self.messages: List[Any] = []
+        self.added: List[float] = []
+        self.timer = None
+        # Number of messages of every batch, and the time every message waited for its batch
+        self.sizes: List[int] = []
+        self.waittimes: List[float] = []
+
+    def add(self, message: Any):
+        """
+        Add a message to the batch, sending the batch if it is full.
+
+        Args:
+            message (Any): The message.
+        """
+        with self.lock:
+            self.messages.append(message)
+            self.added.append(time.perf_counter())
+            if len(self.messages) >= self.max_count:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.max_wait, self._expire)
+                self.timer.args = (self.timer,)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _expire(self, timer: threading.Timer):
+        """
+        Send the batch when its wait is over, unless it was sent already.
+
+        Args:
+            timer (threading.Timer): The timer of the batch.
+        """
+        with self.lock:
+            if self.timer is timer:
+                self.flush()
+
+    def flush(self):
+        """
+        Send the messages of the batch, if any.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.messages:
+                return
+            messages, self.messages = self.messages, []
+            sent = time.perf_counter()
+            self.waittimes.extend(sent - added for added in self.added)
+            self.sizes.append(len(messages))
+            self.added = []
+            self.send(messages)
+
+    def stats(self) -> Optional[Dict[str, List[float]]]:
+        """
+        Get the batching statistics of the messages sent, see `merge_stats`.
+
+        Returns:
+            Optional[Dict[str, List[float]]]: The number of messages of every batch and the time every message waited for its batch, or None if no batch was sent.
+        """
+        with self.lock:
+            if not self.sizes:
+                return None
+            return {"sizes": list(self.sizes), "waittimes": list(self.waittimes)}
+
+
+def _json_size(data: Any, attachments: List[int]) -> int:
+    """
+    Calculate the size of the JSON text of a socketio packet, where every bytes
+    object is replaced by a placeholder and counted as a binary attachment.
+
+    Args:
+        data (Any): The data.
+        attachments (List[int]): The sizes of the binary attachments so far, extended in place.
+
+    Returns:
+        int: The size of the JSON text in bytes.
+    """
+    if isinstance(data, bytes):
+        attachments.append(len(data))
+        return len(f'{{"_placeholder":true,"num":{len(attachments) - 1}}}')
+    if isinstance(data, str):
+        if data.isascii() and data.isprintable():
+            # only quotes and backslashes are escaped, with one more character
+            return len(data) + 2 + data.count('"') + data.count("\\")
+        # control and non-ASCII characters are escaped as \n, \t, ... or \uXXXX
+        return len(json.dumps(data))
+    if isinstance(data, (list, tuple)):
+        return (
+            2
+            + len(data)
+            + sum(_json_size(item, attachments) for item in data)
+            - (len(data) > 0)
+        )
+    if isinstance(data, dict):
+        return (
+            2
+            + 2 * len(data)
+            + sum(
+                _json_size(str(key), attachments) + _json_size(value, attachments)
+                for key, value in data.items()
+            )
+            - (len(data) > 0)
+        )
+    return len(json.dumps(data))
+
+
+def cal_packet_size(data: Any, event: str = "recv") -> int:
+    """
+    Calculate the size of the socketio packet that emits the data, with its binary
+    attachments, from the data itself rather than by encoding the packet again.
+
+    Args:
+        data (Any): The data to emit.
+        event (str): The event the data is emitted with.
+
+    Returns:
+        int: The size of the packet in bytes.
+    """
+    attachments: List[int] = []
+    size = _json_size([event, data], attachments)
+    # packet type, and the number of attachments of a binary packet
+    header = f"{len(attachments)}-" if attachments else ""
+    return 1 + len(header) + size + sum(attachments)
+
+
+def merge_stats(
+    stats: Optional[Dict[str, Any]], other: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Add statistics of more packets to statistics, such as the acknowledgement
+    statistics of `WindowedSender.stats`: the totals are summed and the
+    per-packet lists are concatenated. A key missing from either statistics,
+    such as a field only some senders report, keeps the value of the other.
+
+    Args:
+        stats (Optional[Dict[str, Any]]): The statistics so far, or None.
+        other (Dict[str, Any]): The statistics of more packets.
+
+    Returns:
+        Dict[str, Any]: The statistics of all the packets.
+    """
+    if stats is None:
+        stats = {}
+    merged = {}
+    for key in list(stats) + [key for key in other if key not in stats]:
+        if key not in other:
+            merged[key] = stats[key]
+        elif key not in stats:
+            value = other[key]
+            merged[key] = list(value) if isinstance(value, list) else value
+        else:
+            merged[key] = stats[key] + other[key]
+    return merged
+
+
 def print_dict(
     dict_data: dict,
     logger: Logger = None,
@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from helpers.serializer import as_frame
+
+# Payloads smaller than this are sent as they are, offering their digest would cost more than it saves
+DEDUP_MIN_BYTES: int = 1024
+# Bytes of the payloads kept by a receiving node, least recently used are evicted
+DEFAULT_DEDUP_STORE_BYTES: int = 64 * 2**20
+
+
+def payload_digest(payload: bytes) -> str:
+    """
+    Hash an encoded payload to address it in a payload store.
+
+    Args:
+        payload (bytes): The encoded payload.
+
+    Returns:
+        str: The hexadecimal 128-bit BLAKE2 digest of the payload.
+    """
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class PayloadStore:
+    """
+    Bounded store of the payloads recently received by a node, by digest, so a
+    sender can offer the digest of a payload and send its bytes only on a miss.
+
+    Args:
+        max_bytes (int): The bytes of the payloads kept, least recently used are evicted. 0 disables the store.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_DEDUP_STORE_BYTES):
+        self.max_bytes = max_bytes
+        self.payloads: "OrderedDict[str, bytes]" = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_avoided = 0
+        self.evictions = 0
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """
+        Look up an offered payload, counting the hit or miss.
+
+        Args:
+            digest (str): The digest of the payload.
+
+        Returns:
+            Optional[bytes]: The payload, or None if it is not stored and must be sent.
+        """
+        with self.lock:
+            payload = self.payloads.get(digest)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.payloads.move_to_end(digest)
+            self.hits += 1
+            self.bytes_avoided += len(payload)
+            return payload
+
+    def put(self, payload: bytes):
+        """
+        Keep a received payload, evicting the least recently used ones beyond the bound.
+
+        Args:
+            payload (bytes): The payload as received.
+        """
+        if len(payload) < DEDUP_MIN_BYTES or len(payload) > self.max_bytes:
+            return
+        digest = payload_digest(payload)
+        with self.lock:
+            if digest in self.payloads:
+                self.payloads.move_to_end(digest)
+                return
+            self.payloads[digest] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self.payloads.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> Optional[Dict[str, int]]:
+        """
+        Get the deduplication statistics of the payloads offered, see `merge_stats`.
+
+        Returns:
+            Optional[Dict[str, int]]: The number of hits and misses, the bytes not sent thanks to the hits, and the number of evicted payloads, or None if no payload was offered.
+        """
+        with self.lock:
+            if not self.hits and not self.misses:
+                return None
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_avoided": self.bytes_avoided,
+                "evictions": self.evictions,
+            }
+
+
+def negotiate_dedup(sio_client: Any, dedup: bool = False) -> bool:
+    """
+    Agree with the server on offering the digests of the payloads before sending them.
+
+    Args:
+        sio_client (socketio.Client): The connected socketio client.
+        dedup (bool): Whether the client wants to deduplicate the payloads.
+
+    Returns:
+        bool: Whether the server keeps a payload store for the connection.
+    """
+    if not dedup:
+        return False
+    return bool(sio_client.call("dedup", True))
+
+
+def offer_payload(sio_client: Any, payload: Any) -> Tuple[Any, bool, float]:
+    """
+    Offer the digest of a payload to the server, which processes its stored copy on a hit.
+    Payloads smaller than `DEDUP_MIN_BYTES` are not offered.
+
+    Args:
+        sio_client (socketio.Client): The connected socketio client.
+        payload (Any): The encoded payload.
+
+    Returns:
+        Tuple[Any, bool, float]: The payload to send on a miss, as one binary frame if it was offered, whether the server had it, and the round trip time of the offer.
+    """
+    frame = as_frame(payload)
+    if len(frame) < DEDUP_MIN_BYTES:
+        return payload, False, 0.0
+    start = time.perf_counter()
+    hit = sio_client.call("offer", payload_digest(frame))
+    return frame, bool(hit), time.perf_counter() - start
@@ -1,6 +1,177 @@
+import os
 import cv2
+import time
+import threading
 import numpy as np
+from functools import partial
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from pytesseract import image_to_string
+from helpers.common import get_pool, iter_images, map_file
+
+try:
+    import tesserocr
+except ImportError:  # the persistent engine is optional, see `get_backend_in_use`
+    tesserocr = None
+
+# Tesseract settings, shared by all the backends
+OCR_PSM: int = 8
+OCR_OEM: int = 3
+OCR_WHITELIST: str = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+OCR_CONFIG: str = (
+    f"--psm {OCR_PSM} --oem {OCR_OEM} -c tessedit_char_whitelist={OCR_WHITELIST}"
+)
+
+# Decode flags by decode scale: JPEG images are decoded at 1/2, 1/4 or 1/8 of
+# their resolution directly, without decoding the full image first
+DECODE_FLAGS: Dict[int, int] = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# Width the plate is localized at, the characters are found on a smaller copy
+DEFAULT_LOCATE_WIDTH: int = 640
+# Height range of a character, relative to the image, and margin around the characters
+_CHAR_MIN_HEIGHT: float = 0.2
+_CHAR_MAX_HEIGHT: float = 0.9
+_CHAR_MAX_WIDTH: float = 0.25
+_CROP_MARGIN: float = 0.15
+
+# Engines of this process, by backend, see `get_ocr_engine`
+_engines: Dict[str, Any] = {}
+_engine_lock = threading.Lock()
+
+# Images per chunk when streaming an images directory
+DEFAULT_STREAM_CHUNK: int = 8
+
+# Largest width and JPEG quality of the images reduced by the IoT device before sending
+DEFAULT_REDUCE_WIDTH: int = 1024
+DEFAULT_REDUCE_QUALITY: int = 75
+
+
+class PytesseractEngine:
+    """
+    OCR through pytesseract, which writes the image to a temporary file and runs
+    the tesseract command for every image, loading the trained data every time.
+    """
+
+    def recognize(self, image: np.ndarray) -> str:
+        """
+        Recognize the text in an image.
+
+        Args:
+            image (np.ndarray): The grayscale image.
+
+        Returns:
+            str: The recognized text.
+        """
+        return image_to_string(image, config=OCR_CONFIG)
+
+
+class TesserocrEngine:
+    """
+    OCR through a Tesseract API instance that stays loaded in this process, so
+    the trained data is loaded once and no process is started per image.
+    """
+
+    def __init__(self):
+        kwargs = {"psm": OCR_PSM, "oem": OCR_OEM}
+        if os.getenv("TESSDATA_PREFIX"):
+            kwargs["path"] = os.getenv("TESSDATA_PREFIX")
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+        self.api.SetVariable("tessedit_char_whitelist", OCR_WHITELIST)
+        # the API holds one image at a time
+        self.lock = threading.Lock()
+
+    def recognize(self, image: np.ndarray) -> str:
+        """
+        Recognize the text in an image.
+
+        Args:
+            image (np.ndarray): The grayscale image.
+
+        Returns:
+            str: The recognized text.
+        """
+        image = np.ascontiguousarray(image)
+        with self.lock:
+            self.api.SetImageBytes(
+                image.tobytes(), image.shape[1], image.shape[0], 1, image.strides[0]
+            )
+            return self.api.GetUTF8Text()
+
+
+# Available OCR backends, "tesserocr" is registered when it is installed
+BACKENDS = {"pytesseract": PytesseractEngine}
+if tesserocr is not None:
+    BACKENDS["tesserocr"] = TesserocrEngine
+
+# Backends used when a requested backend is not installed or fails to start
+FALLBACK_BACKENDS: Dict[str, str] = {"tesserocr": "pytesseract"}
+DEFAULT_BACKEND: str = "tesserocr"
+# Errors of the backends that failed to start in this process, by backend
+_failed_backends: Dict[str, str] = {}
+
+
+def get_backend_in_use(backend: str = DEFAULT_BACKEND) -> str:
+    """
+    Get the backend that runs for a requested OCR backend, falling back when it is
+    not installed or failed to start (see `get_ocr_engine`).
+
+    Args:
+        backend (str): The requested backend.
+
+    Returns:
+        str: The backend that runs.
+    """
+    if (
+        backend not in BACKENDS or backend in _failed_backends
+    ) and backend in FALLBACK_BACKENDS:
+        backend = FALLBACK_BACKENDS[backend]
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Invalid OCR backend: {backend}. Valid backends are: {list(BACKENDS)}"
+        )
+    return backend
+
+
+def get_ocr_engine(backend: str = DEFAULT_BACKEND) -> Any:
+    """
+    Get the OCR engine of this process for a backend, creating it on first use.
+
+    A backend that fails to start, such as tesserocr without its trained data, is
+    replaced by its fallback backend for the rest of the process.
+
+    Args:
+        backend (str): The requested backend.
+
+    Returns:
+        Any: The engine, with a `recognize` method.
+    """
+    backend = get_backend_in_use(backend)
+    if backend not in _engines:
+        with _engine_lock:
+            if backend not in _engines:
+                try:
+                    _engines[backend] = BACKENDS[backend]()
+                except RuntimeError as e:
+                    if backend not in FALLBACK_BACKENDS:
+                        raise
+                    _failed_backends[backend] = str(e)
+        if backend in _failed_backends:
+            return get_ocr_engine(FALLBACK_BACKENDS[backend])
+    return _engines[backend]
+
+
+def warm_up_ocr() -> Any:
+    """
+    Create the default OCR engine, so the first image does not pay for loading the trained data.
+
+    Returns:
+        Any: The engine.
+    """
+    return get_ocr_engine()
 
 
 def _enlarge_img(image: np.ndarray, scale_percent: int) -> np.ndarray:
@@ -21,24 +192,310 @@ def _enlarge_img(image: np.ndarray, scale_percent: int) -> np.ndarray:
     return resized_image
 
 
-def ocr_license_plate(data: bytes) -> str:
+def _decode_gray(data: bytes, decode_scale: int = 1) -> np.ndarray:
     """
-    Perform OCR on an image to extract the license plate.
+    Decode an image in grayscale, at a reduced resolution for a decode scale above 1.
 
     Args:
         data (bytes): The image data in bytes.
+        decode_scale (int): The resolution divisor, 1, 2, 4 or 8.
 
     Returns:
-        str: The extracted license plate.
+        np.ndarray: The grayscale image.
     """
-    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if decode_scale not in DECODE_FLAGS:
+        raise ValueError(
+            f"Invalid decode scale: {decode_scale}. Valid scales are: {list(DECODE_FLAGS)}"
+        )
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), DECODE_FLAGS[decode_scale])
     # Enlarge the image scale by 150% to improve OCR accuracy if the image is too small
-    carplate_extract_img = (
-        _enlarge_img(img, 150) if img.shape[0] < 100 or img.shape[1] < 100 else img
+    if img.shape[0] < 100 or img.shape[1] < 100:
+        img = _enlarge_img(img, 150)
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    return img
+
+
+def _locate_plate(
+    gray: np.ndarray, locate_width: int = DEFAULT_LOCATE_WIDTH
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the region of the plate characters in an image.
+
+    The image is shrunk to `locate_width` and binarized with Otsu's threshold.
+    The contours that are shaped like characters are kept, and those of about
+    the median height form the plate text.
+
+    Args:
+        gray (np.ndarray): The grayscale image.
+        locate_width (int): The width the characters are searched at.
+
+    Returns:
+        Optional[Tuple[int, int, int, int]]: The left, top, right and bottom of the region in the image, or None if no characters are found.
+    """
+    factor = min(1.0, locate_width / gray.shape[1])
+    small = (
+        cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        if factor < 1
+        else gray
     )
-    carplate_extract_img_gray = cv2.cvtColor(carplate_extract_img, cv2.COLOR_RGB2GRAY)
+    height, width = small.shape
+    # dark characters on a light plate
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [
+        (x, y, w, h)
+        for x, y, w, h in map(cv2.boundingRect, contours)
+        if _CHAR_MIN_HEIGHT * height <= h <= _CHAR_MAX_HEIGHT * height
+        and w <= _CHAR_MAX_WIDTH * width
+        and h >= 0.8 * w
+    ]
+    if len(boxes) < 2:
+        return None
+    char_height = np.median([h for _, _, _, h in boxes])
+    boxes = [box for box in boxes if 0.6 * char_height <= box[3] <= 1.4 * char_height]
+    left = min(x for x, _, _, _ in boxes)
+    top = min(y for _, y, _, _ in boxes)
+    right = max(x + w for x, _, w, _ in boxes)
+    bottom = max(y + h for _, y, _, h in boxes)
+    margin = int(_CROP_MARGIN * (bottom - top))
+    left, top = max(0, left - margin), max(0, top - margin)
+    right, bottom = min(width, right + margin), min(height, bottom + margin)
+    return tuple(int(v / factor) for v in (left, top, right, bottom))
+
+
+def ocr_license_plate(
+    data: bytes,
+    backend: str = DEFAULT_BACKEND,
+    decode_scale: int = 1,
+    localize: bool = False,
+    locate_width: int = DEFAULT_LOCATE_WIDTH,
+) -> str:
+    """
+    Perform OCR on an image to extract the license plate.
+
+    Args:
+        data (bytes): The image data in bytes.
+        backend (str): "tesserocr" keeps a Tesseract engine loaded in the process, "pytesseract" runs the tesseract command for every image.
+        decode_scale (int): Decode the image at 1/2, 1/4 or 1/8 of its resolution, 1 decodes it in full.
+        localize (bool): Recognize only the region of the plate characters instead of the whole image.
+        locate_width (int): The width the plate characters are searched at when localizing.
+
+    Returns:
+        str: The extracted license plate.
+    """
+    engine = get_ocr_engine(backend)
+    carplate_extract_img_gray = _decode_gray(data, decode_scale)
+    if localize:
+        region = _locate_plate(carplate_extract_img_gray, locate_width)
+        if region is not None:
+            left, top, right, bottom = region
+            carplate_extract_img_gray = carplate_extract_img_gray[
+                top:bottom, left:right
+            ]
     carplate_extract_img_gray_blur = cv2.medianBlur(carplate_extract_img_gray, 3)
-    return image_to_string(
-        carplate_extract_img_gray_blur,
-        config="--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789",
+    return engine.recognize(carplate_extract_img_gray_blur)
+
+
+def _ocr_timed(
+    image: Union[str, bytes, np.ndarray], **options: Any
+) -> Tuple[str, float]:
+    """
+    Perform OCR on an image and time it.
+
+    Args:
+        image (Union[str, bytes, np.ndarray]): The path to the image, memory-mapped by the worker, or the image data.
+        **options (Any): The options of `ocr_license_plate`.
+
+    Returns:
+        Tuple[str, float]: The extracted license plate and the time it took, including decoding.
+    """
+    start = time.perf_counter()
+    data = map_file(image) if isinstance(image, str) else image
+    text = ocr_license_plate(data, **options)
+    return text, time.perf_counter() - start
+
+
+def ocr_license_plates(
+    images: List[Union[str, bytes, np.ndarray]],
+    workers: int = 1,
+    backend: str = DEFAULT_BACKEND,
+    decode_scale: int = 1,
+    localize: bool = False,
+    locate_width: int = DEFAULT_LOCATE_WIDTH,
+) -> List[Tuple[str, float]]:
+    """
+    Perform OCR on a batch of images, spreading them across the workers.
+
+    Args:
+        images (List[Union[str, bytes, np.ndarray]]): The paths to the images or the image data. Workers map the files of the paths themselves, so only the paths are sent to them.
+        workers (int): The number of worker processes. 1 recognizes the images serially in this process.
+        backend (str): The OCR backend, see `ocr_license_plate`.
+        decode_scale (int): The decode scale, see `ocr_license_plate`.
+        localize (bool): Whether to localize the plate, see `ocr_license_plate`.
+        locate_width (int): The localization width, see `ocr_license_plate`.
+
+    Returns:
+        List[Tuple[str, float]]: The extracted license plate of every image and the time it took, in order.
+    """
+    ocr = partial(
+        _ocr_timed,
+        backend=backend,
+        decode_scale=decode_scale,
+        localize=localize,
+        locate_width=locate_width,
     )
+    if workers > 1 and len(images) > 1:
+        return list(get_pool(workers, warm_up_ocr).map(ocr, images))
+    return [ocr(image) for image in images]
+
+
+def ocr_license_plate_batch(
+    batch: List[Union[bytes, np.ndarray]],
+    workers: int = 1,
+    backend: str = DEFAULT_BACKEND,
+    decode_scale: int = 1,
+    localize: bool = False,
+    locate_width: int = DEFAULT_LOCATE_WIDTH,
+) -> List[str]:
+    """
+    Perform OCR on a batch of images sent as separate messages, spreading them across the workers.
+
+    Args:
+        batch (List[Union[bytes, np.ndarray]]): The image data of every message.
+        workers (int): The number of worker processes, see `ocr_license_plates`.
+        backend (str): The OCR backend, see `ocr_license_plate`.
+        decode_scale (int): The decode scale, see `ocr_license_plate`.
+        localize (bool): Whether to localize the plate, see `ocr_license_plate`.
+        locate_width (int): The localization width, see `ocr_license_plate`.
+
+    Returns:
+        List[str]: The result of `ocr_license_plate` on every image, in order.
+    """
+    return [
+        text
+        for text, _ in ocr_license_plates(
+            batch, workers, backend, decode_scale, localize, locate_width
+        )
+    ]
+
+
+def stream_ocr_data(
+    dir: str, chunk_size: int = DEFAULT_STREAM_CHUNK
+) -> Iterator[List[np.ndarray]]:
+    """
+    Read the images from the specified directory in chunks, mapping the files one chunk at a time.
+
+    Args:
+        dir (str): The directory containing the images.
+        chunk_size (int): The number of images per chunk.
+
+    Yields:
+        List[np.ndarray]: The memory-mapped bytes of the next chunk of images, in name order.
+    """
+    chunk = []
+    for _, image in iter_images(dir):
+        chunk.append(image)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def pack_ocr_data(data: Union[bytes, np.ndarray, List[np.ndarray]]) -> Any:
+    """
+    Copy memory-mapped images into bytes that can be emitted through socketio.
+
+    Args:
+        data (Union[bytes, np.ndarray, List[np.ndarray]]): An image or a chunk of images.
+
+    Returns:
+        Any: The image or the chunk of images as bytes.
+    """
+    if isinstance(data, list):
+        return [pack_ocr_data(image) for image in data]
+    return data if isinstance(data, bytes) else data.tobytes()
+
+
+def reduce_ocr_data(
+    data: Union[bytes, np.ndarray, List[np.ndarray]],
+    reduce_width: int = DEFAULT_REDUCE_WIDTH,
+    reduce_quality: int = DEFAULT_REDUCE_QUALITY,
+    reduce_crop: bool = False,
+    locate_width: int = DEFAULT_LOCATE_WIDTH,
+) -> Any:
+    """
+    Shrink images before they are sent: crop to the plate, convert to grayscale,
+    downscale to a width and re-encode as JPEG. An image is sent as it is if
+    the reduced one is not smaller.
+
+    Args:
+        data (Union[bytes, np.ndarray, List[np.ndarray]]): An image or a chunk of images.
+        reduce_width (int): The largest width of the reduced image, after cropping.
+        reduce_quality (int): The JPEG quality of the reduced image, from 0 to 100.
+        reduce_crop (bool): Crop the image to the region of the plate characters, if they are found.
+        locate_width (int): The width the plate characters are searched at, see `ocr_license_plate`.
+
+    Returns:
+        Any: The reduced image or chunk of images as bytes.
+    """
+    if isinstance(data, list):
+        return [
+            reduce_ocr_data(
+                image, reduce_width, reduce_quality, reduce_crop, locate_width
+            )
+            for image in data
+        ]
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if reduce_crop:
+        region = _locate_plate(gray, locate_width)
+        if region is not None:
+            left, top, right, bottom = region
+            gray = gray[top:bottom, left:right]
+    if gray.shape[1] > reduce_width:
+        factor = reduce_width / gray.shape[1]
+        gray = cv2.resize(
+            gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA
+        )
+    ok, encoded = cv2.imencode(".jpg", gray, [cv2.IMWRITE_JPEG_QUALITY, reduce_quality])
+    if not ok or encoded.nbytes >= len(data):
+        return pack_ocr_data(data)
+    return encoded.tobytes()
+
+
+class PlateResults:
+    """
+    The license plates of a stream of images, extended one chunk of images at a time.
+    """
+
+    def __init__(self):
+        self.results: List[Tuple[str, float]] = []
+
+    def update(
+        self,
+        images: List[Union[bytes, np.ndarray]],
+        workers: int = 1,
+        backend: str = DEFAULT_BACKEND,
+        decode_scale: int = 1,
+        localize: bool = False,
+        locate_width: int = DEFAULT_LOCATE_WIDTH,
+    ) -> List[Tuple[str, float]]:
+        """
+        Perform OCR on a chunk of images and add their results.
+
+        Args:
+            images (List[Union[bytes, np.ndarray]]): The chunk of images.
+            workers (int): The number of worker processes, see `ocr_license_plates`.
+            backend (str): The OCR backend, see `ocr_license_plate`.
+            decode_scale (int): The decode scale, see `ocr_license_plate`.
+            localize (bool): Whether to localize the plate, see `ocr_license_plate`.
+            locate_width (int): The localization width, see `ocr_license_plate`.
+
+        Returns:
+            List[Tuple[str, float]]: The extracted license plate and time of every image so far.
+        """
+        self.results += ocr_license_plates(
+            images, workers, backend, decode_scale, localize, locate_width
+        )
+        return self.results
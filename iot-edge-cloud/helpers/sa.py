@@ -1,12 +1,75 @@
 import os
 import nltk
-from typing import List, Tuple
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from helpers.common import read_txt_lines
+import hashlib
+import threading
+import numpy as np
+from functools import partial
+from collections import OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+from helpers.common import get_pool, iter_txt_lines, read_txt_lines
 
 # Download the vader lexicon (if not already downloaded)
 # nltk.download("vader_lexicon")
 
+# Analyzer shared by all the reviews processed in this process, see `get_analyzer`
+_analyzer: Optional[SentimentIntensityAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+# Chunks per worker when no chunk size is given, so uneven chunks balance out
+_CHUNKS_PER_WORKER: int = 4
+
+
+class CompiledLexicon(NamedTuple):
+    """
+    The VADER lexicon compiled into a token-id index and per-id lookup tables.
+    Id 0 stands for every token that is not in the index.
+    """
+
+    index: Dict[str, int]
+    valence: np.ndarray
+    in_lexicon: np.ndarray
+    booster: np.ndarray
+    is_booster: np.ndarray
+    negate: np.ndarray
+
+
+# Lexicon compiled for the batch scorer, see `get_compiled_lexicon`
+_compiled: Optional[CompiledLexicon] = None
+
+# Words the VADER rules compare against, on top of the lexicon, boosters and negations
+_RULE_WORDS: List[str] = ["kind", "of", "least", "at", "very", "but"]
+
+# Codes of the case-sensitive words checked by VADER's "never so/this" rule
+_NEVER: int = 1
+_SO_THIS: int = 2
+_EXACT_WORDS: Dict[str, int] = {"never": _NEVER, "so": _SO_THIS, "this": _SO_THIS}
+
+# Words of VADER's idioms and booster bigrams, only these can change the valence there
+_IDIOM_WORDS = {
+    word
+    for phrase in list(VaderConstants.SPECIAL_CASE_IDIOMS)
+    + [key for key in VaderConstants.BOOSTER_DICT if " " in key]
+    for word in phrase.split()
+}
+
+# Punctuation stripped from the start or end of a token, as in VADER
+_PUNC_CHARS = set("".join(VaderConstants.PUNC_LIST))
+
+# Results of the reviews seen by this process, by review hash, least recently used first
+_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+# Bounded to about 15 MB of results, so a data set sent again every iteration is
+# not scored again; 0 disables it, so the processing time measures the scoring
+DEFAULT_CACHE_SIZE: int = 100_000
+
+# Reviews per chunk when streaming a reviews file
+DEFAULT_STREAM_CHUNK: int = 1000
+
+SCORERS: List[str] = ["vader", "batch"]
+DEFAULT_SCORER: str = "vader"
+
 
 def collect_sa_data(dir: str, filename: str = "reviews.txt") -> List[str]:
     """
@@ -22,6 +85,308 @@ def collect_sa_data(dir: str, filename: str = "reviews.txt") -> List[str]:
     return read_txt_lines(reviews_file)
 
 
+def stream_sa_data(
+    dir: str, chunk_size: int = DEFAULT_STREAM_CHUNK, filename: str = "reviews.txt"
+) -> Iterator[List[str]]:
+    """
+    Read the reviews from the specified directory in chunks, holding one chunk in memory at a time.
+
+    Args:
+        dir (str): The directory containing the reviews.
+        chunk_size (int): The number of reviews per chunk.
+
+    Yields:
+        List[str]: The next chunk of reviews, in file order.
+    """
+    chunk = []
+    for review in iter_txt_lines(os.path.join(dir, filename)):
+        chunk.append(review)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_analyzer() -> SentimentIntensityAnalyzer:
+    """
+    Get the sentiment analyzer of this process, loading the VADER lexicon on first use.
+
+    Loading and parsing the lexicon is much slower than scoring a review, so the
+    analyzer is created once per process. Servers call this at startup to pay the
+    load cost before the first request.
+
+    Returns:
+        SentimentIntensityAnalyzer: The shared analyzer.
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def get_compiled_lexicon() -> CompiledLexicon:
+    """
+    Get the VADER lexicon of this process compiled for the batch scorer, compiling it on first use.
+
+    Every lexicon word, booster word, negation and rule word gets an id, and the
+    valence, booster scalar and negation flag of every id are kept in arrays, so
+    the scores of a whole batch of tokens are array lookups.
+
+    Returns:
+        CompiledLexicon: The compiled lexicon.
+    """
+    global _compiled
+    if _compiled is None:
+        lexicon = get_analyzer().lexicon
+        with _analyzer_lock:
+            if _compiled is None:
+                constants = VaderConstants
+                words = list(lexicon)
+                words += [
+                    word for word in constants.BOOSTER_DICT if word not in lexicon
+                ]
+                words += [word for word in constants.NEGATE if word not in lexicon]
+                words += [word for word in _RULE_WORDS if word not in lexicon]
+                index: Dict[str, int] = {}
+                for word in words:
+                    index.setdefault(word, len(index) + 1)
+                size = len(index) + 1
+                valence = np.zeros(size, dtype=np.float64)
+                in_lexicon = np.zeros(size, dtype=bool)
+                booster = np.zeros(size, dtype=np.float64)
+                is_booster = np.zeros(size, dtype=bool)
+                negate = np.zeros(size, dtype=bool)
+                for word, measure in lexicon.items():
+                    valence[index[word]] = measure
+                    in_lexicon[index[word]] = True
+                for word, scalar in constants.BOOSTER_DICT.items():
+                    if word in index:
+                        booster[index[word]] = scalar
+                        is_booster[index[word]] = True
+                for word in constants.NEGATE:
+                    negate[index[word]] = True
+                _compiled = CompiledLexicon(
+                    index, valence, in_lexicon, booster, is_booster, negate
+                )
+    return _compiled
+
+
+def warm_up_sa() -> CompiledLexicon:
+    """
+    Load the VADER lexicon and compile it, so neither scorer pays for it on the first request.
+
+    Returns:
+        CompiledLexicon: The compiled lexicon.
+    """
+    return get_compiled_lexicon()
+
+
+def _tokenize(text: str) -> List[str]:
+    """
+    Split a review into tokens like VADER: whitespace-separated, without single
+    characters, and with leading or trailing punctuation stripped off words.
+
+    Args:
+        text (str): The review.
+
+    Returns:
+        List[str]: The tokens.
+    """
+    tokens = [token for token in text.split() if len(token) > 1]
+    words_only = None
+    for i, token in enumerate(tokens):
+        if token[0] not in _PUNC_CHARS and token[-1] not in _PUNC_CHARS:
+            continue
+        if words_only is None:
+            no_punc_text = VaderConstants.REGEX_REMOVE_PUNCTUATION.sub("", text)
+            words_only = {word for word in no_punc_text.split() if len(word) > 1}
+        for punc in VaderConstants.PUNC_LIST:
+            if token.startswith(punc) and token[len(punc) :] in words_only:
+                tokens[i] = token[len(punc) :]
+                break
+            if token.endswith(punc) and token[: -len(punc)] in words_only:
+                tokens[i] = token[: -len(punc)]
+                break
+    return tokens
+
+
+def _shift(values: np.ndarray, offset: int, fill=0) -> np.ndarray:
+    """
+    Shift the token values so position `p` holds the value of position `p - offset`.
+
+    Args:
+        values (np.ndarray): The value of every token.
+        offset (int): The shift, negative to look ahead.
+        fill: The value of the positions shifted in.
+
+    Returns:
+        np.ndarray: The shifted values.
+    """
+    shifted = np.full_like(values, fill)
+    if offset > 0:
+        shifted[offset:] = values[:-offset]
+    elif offset < 0:
+        shifted[:offset] = values[-offset:]
+    else:
+        shifted[:] = values
+    return shifted
+
+
+def score_batch(texts: List[str]) -> np.ndarray:
+    """
+    Compute the VADER compound score of a batch of reviews at once.
+
+    The reviews are tokenized together into one array of token ids, and the
+    valences, the cap, booster, negation, "never", "least" and "but" rules, and
+    the compound scores are computed with array operations over all the tokens.
+    Only the idiom rule, which needs the surrounding words, runs per token, and
+    only next to idiom words. The scores are the same as
+    `SentimentIntensityAnalyzer.polarity_scores`.
+
+    Args:
+        texts (List[str]): The reviews.
+
+    Returns:
+        np.ndarray: The compound score of every review, rounded to 4 decimals.
+    """
+    lexicon = get_compiled_lexicon()
+    constants = VaderConstants
+
+    # tokenize the whole batch, remembering the first position of every token
+    # in its review since VADER scores repeated tokens at their first position
+    tokens: List[str] = []
+    lengths = np.zeros(len(texts), dtype=np.int64)
+    first = []
+    for r, text in enumerate(texts):
+        review_tokens = _tokenize(text)
+        first_index: Dict[str, int] = {}
+        offset = len(tokens)
+        for i, token in enumerate(review_tokens):
+            first.append(first_index.setdefault(token, offset + i))
+        tokens += review_tokens
+        lengths[r] = len(review_tokens)
+    num_tokens = len(tokens)
+    first = np.array(first, dtype=np.int64)
+
+    lowered = [token.lower() for token in tokens]
+    index = lexicon.index
+    ids = np.fromiter((index.get(word, 0) for word in lowered), np.int64, num_tokens)
+    upper = np.fromiter((token.isupper() for token in tokens), bool, num_tokens)
+    exact = np.fromiter(
+        (_EXACT_WORDS.get(token, 0) for token in tokens), np.int8, num_tokens
+    )
+    negated = lexicon.negate[ids] | np.fromiter(
+        ("n't" in word for word in lowered), bool, num_tokens
+    )
+
+    review = np.repeat(np.arange(len(texts)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    position = np.arange(num_tokens) - starts[review]
+    num_upper = np.bincount(review, weights=upper, minlength=len(texts))
+    cap_diff = ((num_upper > 0) & (num_upper < lengths))[review]
+    emphasized = upper & cap_diff
+
+    in_lexicon = lexicon.in_lexicon[ids]
+    valence = lexicon.valence[ids].copy()
+    valence += np.where(emphasized, np.where(valence > 0, 1, -1), 0) * constants.C_INCR
+    never = exact == _NEVER
+    so_this = exact == _SO_THIS
+    for start_i, damping in enumerate((1.0, 0.95, 0.9)):
+        distance = start_i + 1
+        previous = _shift(ids, distance)
+        applies = (position > start_i) & ~lexicon.in_lexicon[previous]
+
+        # boost or dampen by the preceding booster words
+        scalar = np.where(valence < 0, -1, 1) * lexicon.booster[previous]
+        caps = lexicon.is_booster[previous] & _shift(emphasized, distance, False)
+        scalar += np.where(caps, np.where(valence > 0, 1, -1), 0) * constants.C_INCR
+        if damping != 1.0:
+            scalar = np.where(scalar != 0, scalar * damping, scalar)
+        valence = np.where(applies, valence + scalar, valence)
+
+        # negations and "never so/this"
+        negation = applies & _shift(negated, distance, False)
+        if start_i == 0:
+            intensified = np.zeros(num_tokens, dtype=bool)
+        elif start_i == 1:
+            intensified = applies & _shift(never, 2, False) & _shift(so_this, 1, False)
+        else:
+            intensified = applies & (
+                (_shift(never, 3, False) & _shift(so_this, 2, False))
+                | _shift(so_this, 1, False)
+            )
+        valence = np.where(
+            intensified, valence * (1.5 if start_i == 1 else 1.25), valence
+        )
+        valence = np.where(
+            negation & ~intensified, valence * constants.N_SCALAR, valence
+        )
+
+        if start_i == 2:
+            idiom_word = np.fromiter(
+                (token in _IDIOM_WORDS for token in tokens), bool, num_tokens
+            )
+            near_idiom = idiom_word | _shift(idiom_word, 1, False)
+            near_idiom |= _shift(idiom_word, 2, False)
+            analyzer = get_analyzer()
+            for p in np.flatnonzero(applies & in_lexicon & near_idiom):
+                start = starts[review[p]]
+                valence[p] = analyzer._idioms_check(
+                    valence[p],
+                    tokens[start : start + lengths[review[p]]],
+                    position[p],
+                )
+
+    # "least" negates, unless preceded by "at" or "very"
+    least = lexicon.index["least"]
+    after_least = (_shift(ids, 1) == least) & ~lexicon.in_lexicon[least]
+    before_least = _shift(ids, 2)
+    at_very = (before_least == lexicon.index["at"]) | (
+        before_least == lexicon.index["very"]
+    )
+    negated_least = after_least & (((position > 1) & ~at_very) | (position == 1))
+    valence = np.where(negated_least, valence * constants.N_SCALAR, valence)
+
+    # tokens that are not in the lexicon, boosters and "kind of" carry no valence
+    kind_of = (
+        (ids == lexicon.index["kind"])
+        & (position < lengths[review] - 1)
+        & (_shift(ids, -1) == lexicon.index["of"])
+    )
+    valence = np.where(in_lexicon & ~lexicon.is_booster[ids] & ~kind_of, valence, 0.0)
+    sentiments = valence[first]
+
+    # "but" halves the valence before it and weighs the valence after it by half more
+    is_but = ids == lexicon.index["but"]
+    but = np.full(len(texts), np.iinfo(np.int64).max)
+    np.minimum.at(but, review[is_but], position[is_but])
+    but_position = but[review]
+    has_but = but_position != np.iinfo(np.int64).max
+    sentiments = np.where(
+        has_but & (position < but_position), sentiments * 0.5, sentiments
+    )
+    sentiments = np.where(
+        has_but & (position > but_position), sentiments * 1.5, sentiments
+    )
+
+    # bincount sums in token order, like VADER
+    sums = np.bincount(review, weights=sentiments, minlength=len(texts))
+    exclamations = np.array([min(text.count("!"), 4) for text in texts]) * 0.292
+    questions = np.array([text.count("?") for text in texts])
+    questions = np.where(
+        questions > 1, np.where(questions <= 3, questions * 0.18, 0.96), 0
+    )
+    emphasis = exclamations + questions
+    sums = np.where(
+        sums > 0, sums + emphasis, np.where(sums < 0, sums - emphasis, sums)
+    )
+    compound = np.where(lengths > 0, sums / np.sqrt(sums * sums + 15), 0.0)
+    return np.array([round(score, 4) for score in compound.tolist()])
+
+
 def _sa_algo(text: str) -> str:
     """
     Perform sentiment analysis on the given text.
@@ -32,8 +397,7 @@ def _sa_algo(text: str) -> str:
     Returns:
         str: The sentiment of the review.
     """
-    sia = SentimentIntensityAnalyzer()
-    score = sia.polarity_scores(text)
+    score = get_analyzer().polarity_scores(text)
     if score["compound"] >= 0.05:
         return "good"
     elif score["compound"] <= -0.05:
@@ -42,14 +406,310 @@ def _sa_algo(text: str) -> str:
         return "neutral"
 
 
-def sentiment_analysis(texts: List[str]) -> Tuple[float, float, float]:
-    # Perform sentiment analysis on each text
-    sentiments = [_sa_algo(text) for text in texts]
+def _classify(texts: List[str], scorer: str = DEFAULT_SCORER) -> List[str]:
+    """
+    Classify the reviews as good, bad, or neutral.
 
-    # Calculate the percentage of good, bad, and neutral inputs
-    total_res = len(sentiments)
-    good_percent = (sentiments.count("good") / total_res) * 100
-    bad_percent = (sentiments.count("bad") / total_res) * 100
-    neutral_percent = (sentiments.count("neutral") / total_res) * 100
+    Args:
+        texts (List[str]): The reviews.
+        scorer (str): "vader" scores every review with the analyzer, "batch" scores them together with `score_batch`.
 
-    return good_percent, bad_percent, neutral_percent
+    Returns:
+        List[str]: The sentiment of every review.
+    """
+    if scorer == "batch":
+        return [
+            "good" if score >= 0.05 else "bad" if score <= -0.05 else "neutral"
+            for score in score_batch(texts).tolist()
+        ]
+    return [_sa_algo(text) for text in texts]
+
+
+def get_scorer_in_use(scorer: str = DEFAULT_SCORER) -> str:
+    """
+    Get the scorer that scores the reviews, for the logs.
+
+    Args:
+        scorer (str): The requested scorer.
+
+    Returns:
+        str: The scorer name.
+    """
+    if scorer not in SCORERS:
+        raise ValueError(f"Invalid scorer: {scorer}. Valid scorers are: {SCORERS}")
+    return scorer
+
+
+def _classify_all(
+    texts: List[str],
+    workers: int = 1,
+    chunk_size: Optional[int] = None,
+    scorer: str = DEFAULT_SCORER,
+) -> List[str]:
+    """
+    Classify the reviews, spreading chunks of reviews across the workers.
+
+    Args:
+        texts (List[str]): The reviews.
+        workers (int): The number of worker processes. 1 scores the reviews serially in this process.
+        chunk_size (Optional[int]): The number of reviews scored per task by the workers. Defaults to splitting the reviews in 4 chunks per worker.
+        scorer (str): The scorer, see `sentiment_analysis`.
+
+    Returns:
+        List[str]: The sentiment of every review, in order.
+    """
+    if workers > 1 and len(texts) > 1:
+        size = chunk_size or -(-len(texts) // (workers * _CHUNKS_PER_WORKER))
+        chunks = [texts[i : i + size] for i in range(0, len(texts), size)]
+        classify = partial(_classify, scorer=scorer)
+        return [
+            sentiment
+            for sentiments in get_pool(workers, warm_up_sa).map(classify, chunks)
+            for sentiment in sentiments
+        ]
+    return _classify(texts, scorer)
+
+
+def _review_key(text: str) -> bytes:
+    """
+    Hash a review for the result cache.
+
+    The review is normalized by collapsing its whitespace, which VADER ignores.
+    The case and the punctuation are kept, since they change the score.
+
+    Args:
+        text (str): The review.
+
+    Returns:
+        bytes: The 128-bit BLAKE2 digest of the normalized review.
+    """
+    return hashlib.blake2b(
+        " ".join(text.split()).encode("utf-8"), digest_size=16
+    ).digest()
+
+
+def get_sa_cache_stats() -> Dict[str, int]:
+    """
+    Get the hits and misses of the result cache of this process, for the statistics.
+
+    A review that is repeated within a request is scored once, its repeats count as hits.
+
+    Returns:
+        Dict[str, int]: The number of hits, misses, and cached reviews.
+    """
+    with _cache_lock:
+        return {**_cache_stats, "size": len(_cache)}
+
+
+def clear_sa_cache():
+    """
+    Empty the result cache of this process and reset its hits and misses.
+    """
+    with _cache_lock:
+        _cache.clear()
+        _cache_stats["hits"] = 0
+        _cache_stats["misses"] = 0
+
+
+def _sentiments_all(
+    texts: List[str],
+    workers: int = 1,
+    chunk_size: Optional[int] = None,
+    scorer: str = DEFAULT_SCORER,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+) -> List[str]:
+    """
+    Classify the reviews, scoring only the reviews that are not cached.
+
+    Args:
+        texts (List[str]): The reviews.
+        workers (int): The number of worker processes. 1 scores the reviews serially in this process.
+        chunk_size (Optional[int]): The number of reviews scored per task by the workers. Defaults to splitting the reviews in 4 chunks per worker.
+        scorer (str): The scorer, see `sentiment_analysis`.
+        cache_size (int): The maximum number of cached results, 0 disables the cache.
+
+    Returns:
+        List[str]: The sentiment of every review, in order.
+    """
+    scorer = get_scorer_in_use(scorer)
+    if cache_size > 0:
+        keys = [_review_key(text) for text in texts]
+        sentiments = [None] * len(texts)
+        # the positions of every review that is not cached, by review hash
+        missing: Dict[bytes, List[int]] = {}
+        with _cache_lock:
+            for i, key in enumerate(keys):
+                sentiment = _cache.get(key)
+                if sentiment is not None:
+                    _cache.move_to_end(key)
+                    sentiments[i] = sentiment
+                else:
+                    missing.setdefault(key, []).append(i)
+            _cache_stats["misses"] += len(missing)
+            _cache_stats["hits"] += len(texts) - len(missing)
+
+        scored = _classify_all(
+            [texts[positions[0]] for positions in missing.values()],
+            workers,
+            chunk_size,
+            scorer,
+        )
+        with _cache_lock:
+            for (key, positions), sentiment in zip(missing.items(), scored):
+                for i in positions:
+                    sentiments[i] = sentiment
+                _cache[key] = sentiment
+            while len(_cache) > cache_size:
+                _cache.popitem(last=False)
+    else:
+        sentiments = _classify_all(texts, workers, chunk_size, scorer)
+    return sentiments
+
+
+def _count(sentiments: List[str]) -> Tuple[int, int, int]:
+    """
+    Count the good, bad, and neutral reviews.
+
+    Args:
+        sentiments (List[str]): The sentiment of every review.
+
+    Returns:
+        Tuple[int, int, int]: The number of good, bad, and neutral reviews.
+    """
+    return (
+        sentiments.count("good"),
+        sentiments.count("bad"),
+        sentiments.count("neutral"),
+    )
+
+
+class SentimentCounter:
+    """
+    Good, bad, and neutral review counters updated one chunk of reviews at a time.
+
+    The percentages after the last chunk equal those of `sentiment_analysis` on
+    all the reviews at once, so a reviews file can be streamed in constant memory.
+    """
+
+    def __init__(self):
+        self.good = 0
+        self.bad = 0
+        self.neutral = 0
+
+    @property
+    def total(self) -> int:
+        return self.good + self.bad + self.neutral
+
+    def update(
+        self,
+        texts: List[str],
+        workers: int = 1,
+        chunk_size: Optional[int] = None,
+        scorer: str = DEFAULT_SCORER,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ) -> Tuple[float, float, float]:
+        """
+        Score a chunk of reviews and add them to the counters.
+
+        Args:
+            texts (List[str]): The chunk of reviews.
+            workers (int): The number of worker processes.
+            chunk_size (Optional[int]): The number of reviews scored per task by the workers.
+            scorer (str): The scorer, see `sentiment_analysis`.
+            cache_size (int): The maximum number of cached results, see `sentiment_analysis`.
+
+        Returns:
+            Tuple[float, float, float]: The running percentage of good, bad, and neutral reviews.
+        """
+        good, bad, neutral = _count(
+            _sentiments_all(texts, workers, chunk_size, scorer, cache_size)
+        )
+        self.good += good
+        self.bad += bad
+        self.neutral += neutral
+        return self.percentages()
+
+    def percentages(self) -> Tuple[float, float, float]:
+        """
+        Get the percentage of good, bad, and neutral reviews counted so far.
+
+        Returns:
+            Tuple[float, float, float]: The percentage of good, bad, and neutral reviews, all 0 before any review is counted.
+        """
+        # Calculate the percentage of good, bad, and neutral inputs
+        total_res = self.total
+        if total_res == 0:
+            return 0.0, 0.0, 0.0
+        good_percent = (self.good / total_res) * 100
+        bad_percent = (self.bad / total_res) * 100
+        neutral_percent = (self.neutral / total_res) * 100
+
+        return good_percent, bad_percent, neutral_percent
+
+
+def sentiment_analysis(
+    texts: List[str],
+    workers: int = 1,
+    chunk_size: Optional[int] = None,
+    scorer: str = DEFAULT_SCORER,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+) -> Tuple[float, float, float]:
+    """
+    Perform sentiment analysis on the reviews.
+
+    The result of every review is cached by a hash of the review, up to
+    `cache_size` reviews, so duplicate reviews and data sets sent again are not
+    scored again.
+
+    Args:
+        texts (List[str]): The reviews.
+        workers (int): The number of worker processes. 1 scores the reviews serially in this process.
+        chunk_size (Optional[int]): The number of reviews scored per task by the workers. Defaults to splitting the reviews in 4 chunks per worker.
+        scorer (str): "vader" scores the reviews one at a time with the analyzer, "batch" scores each chunk of reviews at once with `score_batch`.
+        cache_size (int): The maximum number of cached results, the least recently used are evicted first. 0 disables the cache.
+
+    Returns:
+        Tuple[float, float, float]: The percentage of good, bad, and neutral reviews.
+    """
+    return SentimentCounter().update(texts, workers, chunk_size, scorer, cache_size)
+
+
+def sentiment_analysis_batch(
+    batch: List[List[str]],
+    workers: int = 1,
+    chunk_size: Optional[int] = None,
+    scorer: str = DEFAULT_SCORER,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+) -> List[Tuple[float, float, float]]:
+    """
+    Perform sentiment analysis on a batch of data sets at once. The reviews of
+    all the data sets go through the cache and the workers together, then are
+    counted per data set.
+
+    Args:
+        batch (List[List[str]]): The reviews of every data set.
+        workers (int): The number of worker processes, see `sentiment_analysis`.
+        chunk_size (Optional[int]): The number of reviews scored per task by the workers.
+        scorer (str): The scorer, see `sentiment_analysis`.
+        cache_size (int): The maximum number of cached results, see `sentiment_analysis`.
+
+    Returns:
+        List[Tuple[float, float, float]]: The result of `sentiment_analysis` on every data set, in order.
+    """
+    sentiments = _sentiments_all(
+        [text for texts in batch for text in texts],
+        workers,
+        chunk_size,
+        scorer,
+        cache_size,
+    )
+    results = []
+    start = 0
+    for texts in batch:
+        counter = SentimentCounter()
+        counter.good, counter.bad, counter.neutral = _count(
+            sentiments[start : start + len(texts)]
+        )
+        start += len(texts)
+        results.append(counter.percentages())
+    return results
@@ -0,0 +1,450 @@
+import json
+import time
+import zlib
+import struct
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Header of a raw frame: the magic and version, and the length of the metadata
+RAW_MAGIC: bytes = b"IEC1"
+_RAW_HEADER = struct.Struct("<4sI")
+# Alignment of the buffers in a raw frame, so NumPy arrays can be read in place
+_RAW_ALIGN: int = 8
+# Lists of at least this many strings are sent as one text buffer in a raw frame
+RAW_MIN_STRINGS: int = 16
+# msgpack extension type of NumPy arrays
+_MSGPACK_NDARRAY: int = 1
+# Header of a compressed frame: the magic, and the serializer of the frame inside
+ZLIB_MAGIC: bytes = b"IECZ"
+_ZLIB_HEADER = struct.Struct("<4s8s")
+
+
+class JsonSerializer:
+    """
+    The default socket.io encoding: the payload is emitted as it is, JSON with
+    every bytes object as a separate binary attachment.
+    """
+
+    def encode(self, payload: Any) -> Any:
+        """
+        Encode a payload.
+
+        Args:
+            payload (Any): The payload.
+
+        Returns:
+            Any: The payload as it is.
+        """
+        return payload
+
+    def decode(self, data: Any) -> Any:
+        """
+        Decode a payload.
+
+        Args:
+            data (Any): The payload as received.
+
+        Returns:
+            Any: The payload.
+        """
+        return data
+
+
+class RawSerializer:
+    """
+    One binary frame per payload: a small header, the payload structure as JSON,
+    and the bytes, NumPy arrays and long lists of strings of the payload as raw
+    buffers, without escaping them or splitting them into attachments.
+    """
+
+    def _split(self, value: Any, buffers: List[bytes]) -> Any:
+        """
+        Replace the binary values of a payload with references to buffers.
+
+        Args:
+            value (Any): The payload, or a value in it.
+            buffers (List[bytes]): The buffers, extended with those of the value.
+
+        Returns:
+            Any: The value with its binary values replaced.
+        """
+        if isinstance(value, dict):
+            return {key: self._split(item, buffers) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            if len(value) >= RAW_MIN_STRINGS and all(
+                isinstance(item, str) for item in value
+            ):
+                # one buffer for the text, the lengths split it again
+                buffers.append("".join(value).encode("utf-8"))
+                buffers.append(np.fromiter(map(len, value), np.uint32, len(value)))
+                return {"__strs__": len(buffers) - 2}
+            return [self._split(item, buffers) for item in value]
+        if isinstance(value, np.ndarray):
+            buffers.append(np.ascontiguousarray(value))
+            return {
+                "__nd__": len(buffers) - 1,
+                "dtype": value.dtype.str,
+                "shape": list(value.shape),
+            }
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            buffers.append(value)
+            return {"__buf__": len(buffers) - 1}
+        return value
+
+    def _join(self, value: Any, buffers: List[memoryview]) -> Any:
+        """
+        Put the buffers back in place of their references.
+
+        Args:
+            value (Any): The payload structure, or a value in it.
+            buffers (List[memoryview]): The buffers of the frame.
+
+        Returns:
+            Any: The value with its binary values.
+        """
+        if isinstance(value, list):
+            return [self._join(item, buffers) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if "__buf__" in value:
+            return bytes(buffers[value["__buf__"]])
+        if "__nd__" in value:
+            return np.frombuffer(buffers[value["__nd__"]], value["dtype"]).reshape(
+                value["shape"]
+            )
+        if "__strs__" in value:
+            text = str(buffers[value["__strs__"]], "utf-8")
+            lengths = np.frombuffer(buffers[value["__strs__"] + 1], np.uint32)
+            ends = np.cumsum(lengths, dtype=np.int64).tolist()
+            return [text[start:end] for start, end in zip([0] + ends[:-1], ends)]
+        return {key: self._join(item, buffers) for key, item in value.items()}
+
+    def encode(self, payload: Any) -> bytes:
+        """
+        Encode a payload.
+
+        Args:
+            payload (Any): The payload.
+
+        Returns:
+            bytes: The frame.
+        """
+        buffers = []
+        tree = self._split(payload, buffers)
+        # the offsets are aligned, relative to the end of the metadata
+        spans, offset = [], 0
+        for buffer in buffers:
+            size = memoryview(buffer).nbytes
+            spans.append((offset, size))
+            offset += -(-size // _RAW_ALIGN) * _RAW_ALIGN
+        meta = json.dumps(
+            {"tree": tree, "buffers": spans}, separators=(",", ":")
+        ).encode("utf-8")
+        meta += b" " * (-(_RAW_HEADER.size + len(meta)) % _RAW_ALIGN)
+        frame = bytearray(_RAW_HEADER.size + len(meta) + offset)
+        _RAW_HEADER.pack_into(frame, 0, RAW_MAGIC, len(meta))
+        start = _RAW_HEADER.size + len(meta)
+        frame[_RAW_HEADER.size : start] = meta
+        for buffer, (offset, size) in zip(buffers, spans):
+            frame[start + offset : start + offset + size] = memoryview(buffer).cast("B")
+        return bytes(frame)
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Decode a payload.
+
+        Args:
+            data (bytes): The frame.
+
+        Returns:
+            Any: The payload.
+        """
+        frame = memoryview(data)
+        magic, meta_size = _RAW_HEADER.unpack_from(frame)
+        if magic != RAW_MAGIC:
+            raise ValueError(f"Invalid raw frame: {bytes(magic)!r}")
+        start = _RAW_HEADER.size + meta_size
+        meta = json.loads(bytes(frame[_RAW_HEADER.size : start]))
+        buffers = [
+            frame[start + offset : start + offset + size]
+            for offset, size in meta["buffers"]
+        ]
+        return self._join(meta["tree"], buffers)
+
+
+class MsgpackSerializer:
+    """
+    One binary frame per payload, encoded with msgpack. NumPy arrays are sent as
+    an extension type, with their dtype and shape.
+    """
+
+    def _default(self, value: Any) -> Any:
+        if isinstance(value, np.ndarray):
+            array = np.ascontiguousarray(value)
+            header = json.dumps([array.dtype.str, list(array.shape)]).encode("utf-8")
+            return msgpack.ExtType(
+                _MSGPACK_NDARRAY,
+                struct.pack("<I", len(header)) + header + array.tobytes(),
+            )
+        raise TypeError(f"Cannot serialize {type(value).__name__} with msgpack")
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        if code != _MSGPACK_NDARRAY:
+            return msgpack.ExtType(code, data)
+        (header_size,) = struct.unpack_from("<I", data)
+        dtype, shape = json.loads(data[4 : 4 + header_size])
+        return np.frombuffer(data, dtype, offset=4 + header_size).reshape(shape)
+
+    def encode(self, payload: Any) -> bytes:
+        """
+        Encode a payload.
+
+        Args:
+            payload (Any): The payload.
+
+        Returns:
+            bytes: The msgpack frame.
+        """
+        return msgpack.packb(payload, default=self._default, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Decode a payload.
+
+        Args:
+            data (bytes): The msgpack frame.
+
+        Returns:
+            Any: The payload.
+        """
+        return msgpack.unpackb(
+            data, ext_hook=self._ext_hook, raw=False, strict_map_key=False
+        )
+
+
+# Serializers by name, msgpack is registered when it is installed
+SERIALIZERS: Dict[str, Any] = {"json": JsonSerializer(), "raw": RawSerializer()}
+if msgpack is not None:
+    SERIALIZERS["msgpack"] = MsgpackSerializer()
+# Every serializer a node may be asked for, available or not
+SERIALIZER_NAMES: List[str] = ["json", "raw", "msgpack"]
+# Serializer used when the one requested is not available
+FALLBACK_SERIALIZERS: Dict[str, str] = {"msgpack": "raw"}
+DEFAULT_SERIALIZER: str = "json"
+# Payload compressions, "none" sends the payloads as they are encoded
+COMPRESSION_NAMES: List[str] = ["none", "zlib"]
+DEFAULT_COMPRESSION: str = "none"
+DEFAULT_COMPRESSION_LEVEL: int = 6
+
+
+def get_serializer_in_use(serializer: str = DEFAULT_SERIALIZER) -> str:
+    """
+    Get the serializer that is used for the requested one, falling back when it is not available.
+
+    Args:
+        serializer (str): The requested serializer.
+
+    Returns:
+        str: The name of the serializer in use.
+    """
+    if serializer not in SERIALIZER_NAMES:
+        raise ValueError(
+            f"Invalid serializer: {serializer}. Valid serializers are: {SERIALIZER_NAMES}"
+        )
+    while serializer not in SERIALIZERS:
+        serializer = FALLBACK_SERIALIZERS.get(serializer, DEFAULT_SERIALIZER)
+    return serializer
+
+
+def choose_serializer(offered: List[str]) -> str:
+    """
+    Choose the serializer of a connection, the first one offered by the client that is available.
+
+    Args:
+        offered (List[str]): The serializers the client can use, by preference.
+
+    Returns:
+        str: The name of the chosen serializer.
+    """
+    return next((name for name in offered if name in SERIALIZERS), DEFAULT_SERIALIZER)
+
+
+def negotiate_serializer(sio_client: Any, serializer: str = DEFAULT_SERIALIZER) -> str:
+    """
+    Agree on the serializer of a connection with the server.
+
+    Args:
+        sio_client (socketio.Client): The connected socketio client.
+        serializer (str): The preferred serializer.
+
+    Returns:
+        str: The name of the serializer both ends use.
+    """
+    serializer = get_serializer_in_use(serializer)
+    if serializer == DEFAULT_SERIALIZER:
+        return serializer
+    return sio_client.call("serializer", [serializer, DEFAULT_SERIALIZER])
+
+
+def choose_compression(offered: str) -> str:
+    """
+    Choose the compression of a connection, the one offered by the client if it is known.
+
+    Args:
+        offered (str): The compression the client can use.
+
+    Returns:
+        str: The name of the chosen compression, "none" if it is not known.
+    """
+    return offered if offered in COMPRESSION_NAMES else DEFAULT_COMPRESSION
+
+
+def negotiate_compression(
+    sio_client: Any, compression: str = DEFAULT_COMPRESSION
+) -> str:
+    """
+    Agree on the compression of the payloads of a connection with the server.
+
+    Args:
+        sio_client (socketio.Client): The connected socketio client.
+        compression (str): The requested compression.
+
+    Returns:
+        str: The name of the compression both ends use.
+    """
+    if compression == DEFAULT_COMPRESSION:
+        return compression
+    return sio_client.call("compression", compression)
+
+
+class PayloadCompressor:
+    """
+    Compress the encoded payloads of a connection into zlib frames, timing the
+    compression and counting the bytes before and after it. Payloads of the
+    json serializer are not one buffer, they are encoded as a raw frame first.
+
+    Args:
+        compression (str): The compression agreed on with the receiving node, "none" sends the payloads as they are.
+        level (int): The zlib compression level, from 1 (fastest) to 9 (smallest).
+        threshold (Optional[int]): Compress every payload of at least this many bytes, None only those of algorithms that compress well.
+    """
+
+    def __init__(
+        self,
+        compression: str = DEFAULT_COMPRESSION,
+        level: int = DEFAULT_COMPRESSION_LEVEL,
+        threshold: Optional[int] = None,
+    ):
+        self.compression = compression
+        self.level = level
+        self.threshold = threshold
+        # CPU time of the compression of every payload, and the bytes before and after it
+        self.cputimes: List[float] = []
+        self.raw_bytes = 0
+        self.bytes = 0
+
+    def compress(self, serializer: str, payload: Any, always: bool = False) -> Any:
+        """
+        Compress an encoded payload if compression is agreed on and the payload
+        is large enough, or always is set.
+
+        Args:
+            serializer (str): The serializer of the connection.
+            payload (Any): The encoded payload.
+            always (bool): Compress the payload whatever its size, for the data of algorithms that compress well.
+
+        Returns:
+            Any: The compressed frame, or the payload as it is.
+        """
+        if self.compression == DEFAULT_COMPRESSION or (
+            not always and self.threshold is None
+        ):
+            return payload
+        start = time.thread_time()
+        if serializer == "json":
+            serializer, payload = "raw", SERIALIZERS["raw"].encode(payload)
+        if not always and len(payload) < self.threshold:
+            return payload
+        frame = _ZLIB_HEADER.pack(
+            ZLIB_MAGIC, serializer.encode("ascii")
+        ) + zlib.compress(payload, self.level)
+        self.cputimes.append(time.thread_time() - start)
+        self.raw_bytes += len(payload)
+        self.bytes += len(frame)
+        return frame
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the compression statistics of the payloads sent, see `merge_stats`.
+
+        Returns:
+            Optional[Dict[str, Any]]: The CPU time of the compression, of every compressed payload, and the bytes before and after it, or None if no payload was compressed.
+        """
+        if not self.cputimes:
+            return None
+        return {
+            "cputime": sum(self.cputimes),
+            "cputimes": list(self.cputimes),
+            "raw_bytes": self.raw_bytes,
+            "bytes": self.bytes,
+        }
+
+
+def as_frame(payload: Any) -> Any:
+    """
+    Get the binary frame of an encoded payload, so it can be hashed. Payloads of
+    the json serializer are not one buffer, they are encoded as a raw frame.
+
+    Args:
+        payload (Any): The encoded payload.
+
+    Returns:
+        Any: The payload as one binary frame.
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        return payload
+    return SERIALIZERS["raw"].encode(payload)
+
+
+def encode_payload(serializer: str, payload: Any) -> Any:
+    """
+    Encode a payload before it is emitted.
+
+    Args:
+        serializer (str): The serializer of the connection.
+        payload (Any): The payload.
+
+    Returns:
+        Any: The payload as emitted, a binary frame unless the serializer is json.
+    """
+    return SERIALIZERS[serializer].encode(payload)
+
+
+def decode_payload(serializer: str, data: Any) -> Any:
+    """
+    Decode a payload after it is received, decompressing it if it is a compressed
+    frame. Raw frames are recognised by their header whatever the serializer.
+
+    Args:
+        serializer (str): The serializer of the connection.
+        data (Any): The payload as received.
+
+    Returns:
+        Any: The payload. Packets that are not binary frames, such as the time statistics, are returned as they are.
+    """
+    if not isinstance(data, (bytes, bytearray)):
+        return data
+    if data[:4] == ZLIB_MAGIC:
+        # compressed frames name the serializer of the frame inside
+        _, inner = _ZLIB_HEADER.unpack_from(data)
+        serializer = inner.rstrip(b"\0").decode("ascii")
+        data = zlib.decompress(memoryview(data)[_ZLIB_HEADER.size :])
+    elif data[:4] == RAW_MAGIC:
+        # json payloads are sent as raw frames to be compressed or deduplicated
+        serializer = "raw"
+    return SERIALIZERS[serializer].decode(data)
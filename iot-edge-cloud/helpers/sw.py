@@ -1,6 +1,17 @@
 import os
-from typing import Tuple, List, Union
+import re
+import hashlib
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, NamedTuple, Optional, Tuple, List, Union
 import numpy as np
+from helpers.common import get_pool
+
+try:
+    # optional compiled kernel, built by `python setup.py build_ext --inplace`
+    from helpers import _sw_kernel
+except ImportError:
+    _sw_kernel = None
 
 
 def _get_records(filename: str) -> List[str]:
@@ -80,26 +91,273 @@ def _get_alphabet(filename: str) -> str:
         return "".join(f.read().splitlines())
 
 
+class SWData(NamedTuple):
+    """
+    Integer-encoded input of the Smith-Waterman algorithm.
+
+    Every sequence is stored as the alphabet index of each of its letters, so the
+    kernels look scores up with plain array indexing instead of `alphabet.index()`.
+    """
+
+    seq1s: List[np.ndarray]  # uint8 codes of the database sequences
+    seq2s: List[np.ndarray]  # uint8 codes of the query sequences
+    substitution: np.ndarray  # int32 (p, p) substitution table
+    gaps: np.ndarray  # int32 (p,) gap penalty of every letter
+    alphabet: str
+
+
+def _encode_seq(seq: str, alphabet: str) -> np.ndarray:
+    """
+    Encode a sequence as an array of alphabet indices.
+
+    Args:
+        seq (str): The sequence to encode.
+        alphabet (str): The alphabet.
+
+    Returns:
+        np.ndarray: The alphabet index of every letter in the sequence.
+    """
+    lookup = np.full(256, 255, dtype=np.uint8)
+    for code, letter in enumerate(alphabet):
+        lookup[ord(letter)] = code
+    codes = lookup[np.frombuffer(seq.encode("latin-1"), dtype=np.uint8)]
+    if np.any(codes == 255):
+        bad = seq[int(np.argmax(codes == 255))]
+        raise ValueError(f"Letter {bad!r} is not in the alphabet: {alphabet}")
+    return codes
+
+
+def encode_sw_data(
+    seq1s: List[str], seq2s: List[str], matrix: List[List[int]], alphabet: str
+) -> SWData:
+    """
+    Encode the sequences and build the substitution and gap tables.
+
+    Args:
+        seq1s (List[str]): The database sequences.
+        seq2s (List[str]): The query sequences.
+        matrix (List[List[int]]): The substitution matrix.
+        alphabet (str): The alphabet.
+
+    Returns:
+        SWData: The encoded sequences, the substitution table, and the gap table.
+    """
+    substitution = np.asarray(matrix, dtype=np.int32)
+    # the gap penalty of a letter is the last entry of its substitution matrix row
+    gaps = np.ascontiguousarray(substitution[:, -1])
+    return SWData(
+        seq1s=[_encode_seq(seq, alphabet) for seq in seq1s],
+        seq2s=[_encode_seq(seq, alphabet) for seq in seq2s],
+        substitution=substitution,
+        gaps=gaps,
+        alphabet=alphabet,
+    )
+
+
+def pack_sw_data(sw_data: SWData) -> Dict[str, Any]:
+    """
+    Pack the encoded data into a form that can be emitted through socketio.
+    The arrays are sent as raw bytes, which socketio transmits as binary attachments.
+
+    Args:
+        sw_data (SWData): The encoded data.
+
+    Returns:
+        Dict[str, Any]: The packed data.
+    """
+    return {
+        "alphabet": sw_data.alphabet,
+        "shape": list(sw_data.substitution.shape),
+        "substitution": sw_data.substitution.astype("<i4").tobytes(),
+        "gaps": sw_data.gaps.astype("<i4").tobytes(),
+        "seq1s": [seq.tobytes() for seq in sw_data.seq1s],
+        "seq2s": [seq.tobytes() for seq in sw_data.seq2s],
+    }
+
+
+def unpack_sw_data(packed: Dict[str, Any]) -> SWData:
+    """
+    Rebuild the encoded data from its packed form without copying the sequences.
+
+    Args:
+        packed (Dict[str, Any]): The packed data.
+
+    Returns:
+        SWData: The encoded data.
+    """
+    return SWData(
+        seq1s=[np.frombuffer(seq, dtype=np.uint8) for seq in packed["seq1s"]],
+        seq2s=[np.frombuffer(seq, dtype=np.uint8) for seq in packed["seq2s"]],
+        substitution=np.frombuffer(packed["substitution"], dtype="<i4").reshape(
+            packed["shape"]
+        ),
+        gaps=np.frombuffer(packed["gaps"], dtype="<i4"),
+        alphabet=packed["alphabet"],
+    )
+
+
+def _as_sw_data(sw_data: Any) -> SWData:
+    """
+    Normalize the input of `smith_waterman` to the encoded form.
+
+    Args:
+        sw_data (Any): The encoded data, its packed form, or the raw
+            (database sequences, query sequences, substitution matrix, alphabet) tuple.
+
+    Returns:
+        SWData: The encoded data.
+    """
+    if isinstance(sw_data, SWData):
+        return sw_data
+    if isinstance(sw_data, dict):
+        return unpack_sw_data(sw_data)
+    return encode_sw_data(*sw_data)
+
+
+# CIGAR operations: M = aligned pair, D = skipped database letters, I = skipped query letters
+_CIGAR_PATTERN = re.compile(r"(\d+)([MDI])")
+
+
+def _encode_alignment(result: Tuple) -> Tuple:
+    """
+    Encode the aligned indices of one result as their start offsets and a CIGAR string.
+
+    Args:
+        result (Tuple): The alignment score, the indices for the first aligned sequence, the indices for the second aligned sequence,
+            and any further fields (e.g., the flag of the heuristic modes).
+
+    Returns:
+        Tuple: The score, the start index in the first sequence, the start index in the second sequence, the CIGAR string, and the further fields.
+    """
+    score, seq1_indices, seq2_indices, *rest = result
+    if not seq1_indices:
+        return (score, 0, 0, "", *rest)
+    ops = []
+    run = 1
+    for prev1, prev2, index1, index2 in zip(
+        seq1_indices, seq2_indices, seq1_indices[1:], seq2_indices[1:]
+    ):
+        skipped1 = index1 - prev1 - 1
+        skipped2 = index2 - prev2 - 1
+        if skipped1 == 0 and skipped2 == 0:
+            run += 1
+            continue
+        ops.append(f"{run}M")
+        if skipped1:
+            ops.append(f"{skipped1}D")
+        if skipped2:
+            ops.append(f"{skipped2}I")
+        run = 1
+    ops.append(f"{run}M")
+    return (score, seq1_indices[0], seq2_indices[0], "".join(ops), *rest)
+
+
+def _decode_alignment(encoded: List[Any]) -> Tuple:
+    """
+    Rebuild the aligned indices of one result encoded by `_encode_alignment`.
+
+    Args:
+        encoded (List[Any]): The encoded result.
+
+    Returns:
+        Tuple: The alignment score, the indices for the first aligned sequence, the indices for the second aligned sequence, and the further fields.
+    """
+    score, index1, index2, cigar, *rest = encoded
+    seq1_indices = []
+    seq2_indices = []
+    for count, op in _CIGAR_PATTERN.findall(cigar):
+        count = int(count)
+        if op == "M":
+            seq1_indices.extend(range(index1, index1 + count))
+            seq2_indices.extend(range(index2, index2 + count))
+            index1 += count
+            index2 += count
+        elif op == "D":
+            index1 += count
+        else:
+            index2 += count
+    return (score, seq1_indices, seq2_indices, *rest)
+
+
+def _is_alignment(result: Any) -> bool:
+    """
+    Check whether a value is a single alignment result of `smith_waterman`.
+
+    Args:
+        result (Any): The value to check.
+
+    Returns:
+        bool: True for a (score, indices, indices, ...) tuple.
+    """
+    return (
+        isinstance(result, tuple)
+        and not isinstance(result, SearchResult)
+        and len(result) >= 3
+        and isinstance(result[0], (int, np.integer))
+        and isinstance(result[1], list)
+    )
+
+
+def pack_sw_result(result: Any) -> Any:
+    """
+    Encode the result of `smith_waterman` compactly before it is emitted.
+
+    Every alignment is sent as its score, the start index in each sequence, and a
+    CIGAR-style run-length string of aligned pairs (M) and skipped database (D)
+    or query (I) letters, instead of two lists of indices.
+
+    Args:
+        result (Any): A result of `smith_waterman`, or a list of results.
+
+    Returns:
+        Any: The packed result, or the result unchanged if it is not made of alignments (e.g., `top_k` search results).
+    """
+    if _is_alignment(result):
+        return {"cigar": _encode_alignment(result)}
+    if isinstance(result, list) and result and all(map(_is_alignment, result)):
+        return {"cigar": [_encode_alignment(out) for out in result]}
+    return result
+
+
+def unpack_sw_result(packed: Any) -> Any:
+    """
+    Rebuild the result of `smith_waterman` from its packed form.
+
+    Args:
+        packed (Any): The packed result. Values that were not packed are returned unchanged.
+
+    Returns:
+        Any: The result, with the lists of aligned indices.
+    """
+    if not isinstance(packed, dict) or "cigar" not in packed:
+        return packed
+    encoded = packed["cigar"]
+    # a single result starts with its score, a list of results with a result
+    if isinstance(encoded[0], (list, tuple)):
+        return [_decode_alignment(out) for out in encoded]
+    return _decode_alignment(encoded)
+
+
 def _calculate_score_data(
-    alphabet: str,
     row: int,
     column: int,
     substitution_matrix: List[List[int]],
+    gaps: List[int],
     scoring_matrix: np.ndarray,
-    seq1: str,
-    seq2: str,
+    seq1: List[int],
+    seq2: List[int],
 ) -> Tuple[int, int]:
     """
     Calculate the score and its origin for the current scoring matrix cell.
 
     Args:
-        alphabet (str): The alphabet.
         row (int): The row index.
         column (int): The column index.
         substitution_matrix (List[List[int]]): The substitution matrix.
+        gaps (List[int]): The gap penalty of every letter.
         scoring_matrix (np.ndarray): The scoring matrix.
-        seq1 (str): The first sequence.
-        seq2 (str): The second sequence.
+        seq1 (List[int]): The codes of the first sequence.
+        seq2 (List[int]): The codes of the second sequence.
 
     Returns:
         Tuple[int, int]: The score and its origin.
@@ -108,19 +366,11 @@ def _calculate_score_data(
     seq1_letter = seq1[column - 1]
     seq2_letter = seq2[row - 1]
 
-    match_score = substitution_matrix[alphabet.index(seq1_letter)][
-        alphabet.index(seq2_letter)
-    ]
+    match_score = substitution_matrix[seq1_letter][seq2_letter]
 
     diagonal_score = scoring_matrix[row - 1][column - 1] + match_score
-    left_score = (
-        scoring_matrix[row][column - 1]
-        + substitution_matrix[alphabet.index(seq1_letter)][-1]
-    )
-    up_score = (
-        scoring_matrix[row - 1][column]
-        + substitution_matrix[alphabet.index(seq2_letter)][-1]
-    )
+    left_score = scoring_matrix[row][column - 1] + gaps[seq1_letter]
+    up_score = scoring_matrix[row - 1][column] + gaps[seq2_letter]
 
     score = max(diagonal_score, up_score, left_score, 0)
     score_origin = 0
@@ -137,7 +387,7 @@ def _calculate_score_data(
 
 
 def _get_indices(
-    backtracking_matrix: np.ndarray, row: int, column: int, seq1: str, seq2: str
+    backtracking_matrix: np.ndarray, row: int, column: int
 ) -> Tuple[List[int], List[int]]:
     """
     Get the indices for the best alignment for both sequences.
@@ -146,16 +396,12 @@ def _get_indices(
         backtracking_matrix (np.ndarray): The backtracking matrix.
         row (int): The row index.
         column (int): The column index.
-        seq1 (str): The first sequence.
-        seq2 (str): The second sequence.
 
     Returns:
         Tuple[List[int], List[int]]: The indices for the best alignment for both sequences.
     """
     seq1_indices = []
     seq2_indices = []
-    seq1_alignment = ""
-    seq2_alignment = ""
 
     # iterate through backtracking matrix starting with cell which has the max score
     # iterate while collecting indices for the best alignment for both sequences
@@ -163,45 +409,40 @@ def _get_indices(
         score_origin = backtracking_matrix[row][column]
 
         if score_origin == 8:
-            seq1_alignment += seq1[column - 1]
-            seq2_alignment += seq2[row - 1]
             row = row - 1
             column = column - 1
             seq1_indices.append(column)
             seq2_indices.append(row)
         elif score_origin == 2:
-            seq1_alignment += "-"
-            seq2_alignment += seq2[row - 1]
             row = row - 1
         else:
-            seq1_alignment += seq1[column - 1]
-            seq2_alignment += "-"
             column = column - 1
 
     seq1_indices.sort()
     seq2_indices.sort()
-    seq1_alignment = seq1_alignment[::-1]
-    seq2_alignment = seq2_alignment[::-1]
     return (seq1_indices, seq2_indices)
 
 
 def _water(
-    alphabet: str, substitution_matrix: List[List[int]], seq1: str, seq2: str
+    substitution: np.ndarray, gaps: np.ndarray, seq1: np.ndarray, seq2: np.ndarray
 ) -> Tuple[int, List[int], List[int]]:
     """
     Perform the Smith-Waterman algorithm.
 
     Args:
-        alphabet (str): The alphabet.
-        substitution_matrix (List[List[int], str]): The substitution matrix and the alphabet.
-        seq1 (str): The first sequence.
-        seq2 (str): The second sequence.
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
 
     Returns:
         Tuple[int, List[int], List[int]]: The maximum alignment score, the indices for the first aligned sequence, and the indices for the second aligned sequence.
     """
-    # gathering values
-    p = len(alphabet)
+    # gathering values, plain lists are much faster than arrays to index cell by cell
+    substitution_matrix = substitution.tolist()
+    gap_list = gaps.tolist()
+    seq1 = seq1.tolist()
+    seq2 = seq2.tolist()
     seq1_len = len(seq1)
     seq2_len = len(seq2)
 
@@ -214,7 +455,13 @@ def _water(
     for row in range(1, seq2_len + 1):
         for column in range(1, seq1_len + 1):
             score_data = _calculate_score_data(
-                alphabet, row, column, substitution_matrix, scoring_matrix, seq1, seq2
+                row,
+                column,
+                substitution_matrix,
+                gap_list,
+                scoring_matrix,
+                seq1,
+                seq2,
             )
             score, score_origin = score_data[0], score_data[1]
             if score > max_score:
@@ -225,66 +472,1794 @@ def _water(
             scoring_matrix[row][column] = score
             backtracking_matrix[row][column] = score_origin
 
+    indices = _get_indices(backtracking_matrix, max_score_row, max_score_column)
+    return (int(max_score), indices[0], indices[1])
+
+
+def _water_wavefront(
+    substitution: np.ndarray, gaps: np.ndarray, seq1: np.ndarray, seq2: np.ndarray
+) -> Tuple[int, List[int], List[int]]:
+    """
+    Perform the Smith-Waterman algorithm one anti-diagonal at a time.
+
+    Every cell of an anti-diagonal only depends on the two previous anti-diagonals,
+    so a whole anti-diagonal is computed with a handful of NumPy operations. The
+    scoring and backtracking matrices are stored row-major, which makes each
+    anti-diagonal a strided view of the flattened matrix. The result is identical
+    to `_water`.
+
+    An anti-diagonal holds at most min(len(seq1), len(seq2)) cells, so this kernel
+    only beats the row-by-row kernels when both sequences are long (about 2x for
+    two sequences of 1000 letters or more). With a short query against a long
+    database, most of the time goes to the per-diagonal NumPy overhead.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+
+    Returns:
+        Tuple[int, List[int], List[int]]: The maximum alignment score, the indices for the first aligned sequence, and the indices for the second aligned sequence.
+    """
+    seq1_len = len(seq1)
+    seq2_len = len(seq2)
+    if seq1_len == 0 or seq2_len == 0:
+        return (0, [], [])
+
+    seq1_gaps_reversed = gaps.astype(np.int64)[seq1][::-1].copy()
+    seq2_gaps = gaps.astype(np.int64)[seq2]
+
+    width = seq1_len + 1
+    match_matrix = np.zeros((seq2_len + 1, width), dtype=np.int64)
+    match_matrix[1:, 1:] = substitution[seq1[None, :], seq2[:, None]]
+    scoring_matrix = np.zeros((seq2_len + 1, width), dtype=np.int64)
+    backtracking_matrix = np.zeros((seq2_len + 1, width), dtype=np.uint8)
+    match_flat = match_matrix.ravel()
+    scoring_flat = scoring_matrix.ravel()
+    backtracking_flat = backtracking_matrix.ravel()
+
+    # cell (row, diag - row) sits at flat index row * seq1_len + diag, so
+    # consecutive cells of an anti-diagonal are seq1_len elements apart
+    step = seq1_len
+    for diag in range(2, seq1_len + seq2_len + 1):
+        first_row = max(1, diag - seq1_len)
+        last_row = min(seq2_len, diag - 1)
+        start = first_row * step + diag
+        stop = last_row * step + diag + 1
+
+        diagonal_score = (
+            scoring_flat[start - step - 2 : stop - step - 2 : step]
+            + match_flat[start:stop:step]
+        )
+        up_score = (
+            scoring_flat[start - step - 1 : stop - step - 1 : step]
+            + seq2_gaps[first_row - 1 : last_row]
+        )
+        left_score = (
+            scoring_flat[start - 1 : stop - 1 : step]
+            + seq1_gaps_reversed[
+                seq1_len - diag + first_row : seq1_len - diag + last_row + 1
+            ]
+        )
+
+        score = np.maximum(
+            np.maximum(diagonal_score, up_score), np.maximum(left_score, 0)
+        )
+        scoring_flat[start:stop:step] = score
+        # 8 = DIAGONAL, 2 = UP, 4 = LEFT
+        backtracking_flat[start:stop:step] = np.where(
+            score == diagonal_score, 8, np.where(score == up_score, 2, 4)
+        )
+
+    # argmax returns the first maximum in row-major order, like the loop in `_water`
+    max_score_row, max_score_column = np.unravel_index(
+        np.argmax(scoring_matrix), scoring_matrix.shape
+    )
+    max_score = int(scoring_matrix[max_score_row, max_score_column])
+    if max_score <= 0:
+        return (0, [], [])
+
     indices = _get_indices(
-        backtracking_matrix, max_score_row, max_score_column, seq1, seq2
+        backtracking_matrix, int(max_score_row), int(max_score_column)
     )
-    return (int(max_score), indices[0], indices[1])
+    return (max_score, indices[0], indices[1])
 
 
-def collect_sw_data(
-    dir: str,
-    dbfilename: str = "database.txt",
-    queryfilename: str = "query.txt",
-    matrixfilename: str = "matrix.txt",
-    alphabetfilename: str = "alphabet.txt",
-) -> Tuple[List[str], List[str], List[List[int]], str]:
+def _next_row(
+    prev_row: np.ndarray,
+    match_scores: np.ndarray,
+    up_gap: Union[int, np.ndarray],
+    left_gap_sums: np.ndarray,
+    left: Union[int, np.ndarray] = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Collect the data needed for pairwise sequence alignment.
+    Compute one row of the scoring matrix and its score origins from the previous row.
+
+    The left dependency inside a row is resolved with a running maximum: a cell is
+    the best of its diagonal/up/zero score and the left cell plus a gap, which unrolls
+    to `left_gap_sums[j] + max(best[k] - left_gap_sums[k] for k <= j)`. Rows of
+    several scoring matrices sharing the same column sequence can be stacked as
+    lanes of 2-D arrays, with one up gap per lane. A row can also be computed one
+    block of columns at a time, `left` being the cell just left of the block.
 
     Args:
-        dir (str): The directory containing the files.
-        dbfilename (str): The name of the database file.
-        queryfilename (str): The name of the query file.
-        matrixfilename (str): The name of the matrix file.
-        alphabetfilename (str): The name of the alphabet file.
+        prev_row (np.ndarray): The previous row of the scoring matrix, column 0 included.
+        match_scores (np.ndarray): The substitution scores of the row letter against every column letter.
+        up_gap (Union[int, np.ndarray]): The gap penalty of the row letter, shape (lanes, 1) for stacked rows.
+        left_gap_sums (np.ndarray): The cumulative gap penalties of the column letters, starting with 0.
+        left (Union[int, np.ndarray]): The score of the cell left of the first column, shape (lanes,) for stacked rows.
 
     Returns:
-        Tuple[List[str], List[str], List[List[int]], str]: The database sequences, the query sequences, the substitution matrix, and the alphabet.
+        Tuple[np.ndarray, np.ndarray]: The row of the scoring matrix and the origin of every cell.
     """
-    dbfile = os.path.join(dir, dbfilename)
-    queryfile = os.path.join(dir, queryfilename)
-    matrixfile = os.path.join(dir, matrixfilename)
-    alphabetfile = os.path.join(dir, alphabetfilename)
-    seq1s = _get_records(dbfile)
-    seq2s = _get_records(queryfile)
-    matrix = _get_matrix(matrixfile)
-    alphabet = _get_alphabet(alphabetfile)
-    return (seq1s, seq2s, matrix, alphabet)
+    diagonal_score = prev_row[..., :-1] + match_scores
+    up_score = prev_row[..., 1:] + up_gap
+    best = np.zeros(prev_row.shape, dtype=np.int64)
+    best[..., 0] = left
+    np.maximum(np.maximum(diagonal_score, up_score), 0, out=best[..., 1:])
+    row = np.maximum.accumulate(best - left_gap_sums, axis=-1) + left_gap_sums
+    score = row[..., 1:]
+    # 8 = DIAGONAL, 2 = UP, 4 = LEFT
+    origins = np.where(score == diagonal_score, 8, np.where(score == up_score, 2, 4))
+    return row, origins
 
 
-def smith_waterman(
-    sw_data: Tuple[List[str], List[str], List[List[int]], str]
-) -> Union[List[Tuple[int, List[int], List[int]]], Tuple[int, List[int], List[int]]]:
+# Queries aligned together as lanes of one array by the batched kernel
+DEFAULT_LANES: int = 16
+# Cells of the (lanes, block) rows swept at a time when searching the maximum cell
+_BLOCK_CELLS: int = 2**18
+
+
+def _find_max_cells(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2s: List[np.ndarray],
+    block: Optional[int] = None,
+) -> List[Tuple[int, int, int]]:
     """
-    Perform the Smith-Waterman algorithm on the given sequences.
+    Find the first cell (in row-major order) holding the maximum score of every query.
+
+    The queries are stacked as lanes, padded to the longest one, and all their
+    scoring matrices advance one row per step. The database is swept in blocks of
+    `block` columns so that the (lanes, block) rows stay in the CPU cache; the last
+    column of every row is carried over to the next block. A lane stops tracking
+    its maximum once its query has no letters left.
 
     Args:
-        sw_data (Tuple[List[str], List[str], List[List[int]], str]): The database sequences, the query sequences, the substitution matrix, and the alphabet.
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the database sequence.
+        seq2s (List[np.ndarray]): The codes of the query sequences.
+        block (Optional[int]): The number of database columns swept at a time. Defaults to `_BLOCK_CELLS` cells per block.
 
     Returns:
-        Union[List[Tuple[int, List[int], List[int]]], Tuple[int, List[int], List[int]]]: The maximum alignment score, the indices for the first aligned sequence, and the indices for the second aligned sequence. If there are multiple pairs of sequences, return a list of tuples.
+        List[Tuple[int, int, int]]: The row, the column, and the maximum score of every query (-1, -1, 0 if no score is positive).
+    """
+    substitution = substitution.astype(np.int64)
+    gaps = gaps.astype(np.int64)
+    num_lanes = len(seq2s)
+    block = block or max(1, _BLOCK_CELLS // max(1, num_lanes))
+    lengths = np.array([len(seq2) for seq2 in seq2s], dtype=np.int64)
+    num_rows = int(lengths.max(initial=0))
+    letters = np.zeros((num_lanes, num_rows), dtype=np.intp)
+    for lane, seq2 in enumerate(seq2s):
+        letters[lane, : len(seq2)] = seq2
+    row_gaps = gaps[letters].T[:, :, None]
+    max_score = np.zeros(num_lanes, dtype=np.int64)
+    max_score_row = np.full(num_lanes, -1, dtype=np.int64)
+    max_score_column = np.full(num_lanes, -1, dtype=np.int64)
+    lane_indices = np.arange(num_lanes)
+    # (p, len(seq1)) substitution scores of every letter against the database
+    match_table = np.ascontiguousarray(substitution[seq1].T, dtype=np.int32)
+    # last column of every row of the previous block, row 0 included
+    edge = np.zeros((num_rows + 1, num_lanes), dtype=np.int64)
+
+    for first in range(0, len(seq1), block):
+        last = min(len(seq1), first + block)
+        left_gap_sums = np.concatenate(([0], np.cumsum(gaps[seq1[first:last]])))
+        row = np.zeros((num_lanes, last - first + 1), dtype=np.int64)
+        row[:, 0] = edge[0]
+        for row_index in range(1, num_rows + 1):
+            row_letters = letters[:, row_index - 1]
+            row, _ = _next_row(
+                row,
+                match_table[row_letters, first:last],
+                row_gaps[row_index - 1],
+                left_gap_sums,
+                edge[row_index],
+            )
+            edge[row_index] = row[:, -1]
+            columns = np.argmax(row[:, 1:], axis=1)
+            scores = row[lane_indices, columns + 1]
+            # blocks come in column order, so a tie only wins from an earlier row
+            improved = (scores > max_score) | (
+                (scores == max_score) & (scores > 0) & (row_index < max_score_row)
+            )
+            improved &= row_index <= lengths
+            max_score[improved] = scores[improved]
+            max_score_row[improved] = row_index
+            max_score_column[improved] = first + 1 + columns[improved]
+
+    return [
+        (int(r), int(c), int(m))
+        for r, c, m in zip(max_score_row, max_score_column, max_score)
+    ]
+
+
+def _find_max_cell(
+    substitution: np.ndarray, gaps: np.ndarray, seq1: np.ndarray, seq2: np.ndarray
+) -> Tuple[int, int, int]:
+    """
+    Find the first cell (in row-major order) holding the maximum score, row by row.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+
+    Returns:
+        Tuple[int, int, int]: The row, the column, and the maximum score (-1, -1, 0 if no score is positive).
+    """
+    return _find_max_cells(substitution, gaps, seq1, [seq2])[0]
+
+
+def _water_score(
+    substitution: np.ndarray, gaps: np.ndarray, seq1: np.ndarray, seq2: np.ndarray
+) -> Tuple[int, List[int], List[int]]:
+    """
+    Compute only the maximum alignment score, keeping two rows of the scoring matrix.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+
+    Returns:
+        Tuple[int, List[int], List[int]]: The maximum alignment score and two empty index lists.
+    """
+    return _water_batch(substitution, gaps, seq1, [seq2], traceback=False)[0]
+
+
+# Cells of a traceback block whose origins are kept and traced directly
+_HIRSCHBERG_BLOCK_CELLS: int = 2**16
+
+
+class _TraceBlock(NamedTuple):
+    """
+    A part of the backtracking path left to trace, see `_trace_path`.
+
+    The path enters the block at cell (bottom, end) and leaves it when it first
+    reaches row `top`; below row `top`, it never goes left of column `lo` except to
+    stop at column 0.
+    """
+
+    top: int
+    bottom: int
+    lo: int
+    end: int
+    top_row: np.ndarray  # row `top` of the scoring matrix, columns lo - 1 to end
+    left_column: np.ndarray  # column lo - 1 of the scoring matrix, rows top to bottom
+
+
+def _sweep_rows(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    top: int,
+    bottom: int,
+    lo: int,
+    top_row: np.ndarray,
+    left_column: np.ndarray,
+):
+    """
+    Compute rows `top + 1` to `bottom` of the scoring matrix from row `top`, one at
+    a time, over columns `lo - 1` to `lo + len(top_row) - 2`.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        top (int): The row index of `top_row`.
+        bottom (int): The row index of the last computed row.
+        lo (int): The first column whose cells are computed.
+        top_row (np.ndarray): Row `top` of the scoring matrix, from column `lo - 1`.
+        left_column (np.ndarray): Column `lo - 1` of the scoring matrix, from row `top`.
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: Every row, from column `lo - 1`, and the origin of its cells from column `lo`.
+    """
+    columns = seq1[lo - 1 : lo + len(top_row) - 2]
+    left_gap_sums = np.concatenate(([0], np.cumsum(gaps[columns])))
+    row = top_row
+    for row_index in range(top + 1, bottom + 1):
+        letter = seq2[row_index - 1]
+        row, origins = _next_row(
+            row,
+            substitution[columns, letter],
+            gaps[letter],
+            left_gap_sums,
+            left_column[row_index - top],
+        )
+        yield row, origins
+
+
+def _trace_path(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    row: int,
+    column: int,
+    seq1_indices: List[int],
+    seq2_indices: List[int],
+) -> None:
+    """
+    Follow the backtracking path from cell (row, column), in O(len(seq1) + len(seq2)) memory.
+
+    Blocks of at most `_HIRSCHBERG_BLOCK_CELLS` cells keep their origins and are
+    traced directly. A larger block is swept once, carrying for every cell below its
+    middle row the column where its path first reaches the middle row. The path is
+    split there into an upper and a lower block, which cover disjoint rows and
+    columns, so the blocks left to trace hold one row and one column of the matrix
+    in total, and every split halves the area left to sweep.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        row (int): The row index at which the trace starts.
+        column (int): The column index at which the trace starts.
+        seq1_indices (List[int]): The collected indices of the first sequence.
+        seq2_indices (List[int]): The collected indices of the second sequence.
+    """
+    blocks = [
+        _TraceBlock(
+            0,
+            row,
+            1,
+            column,
+            np.zeros(column + 1, dtype=np.int64),
+            np.zeros(row + 1, dtype=np.int64),
+        )
+    ]
+    while blocks:
+        top, bottom, lo, end, top_row, left_column = blocks.pop()
+        width = end - lo + 1
+        rows = _sweep_rows(
+            substitution, gaps, seq1, seq2, top, bottom, lo, top_row, left_column
+        )
+
+        if bottom - top <= 1 or (bottom - top) * width <= _HIRSCHBERG_BLOCK_CELLS:
+            origins = np.zeros((bottom - top + 1, width + 1), dtype=np.uint8)
+            for row_index, (_, row_origins) in enumerate(rows, start=1):
+                origins[row_index, 1:] = row_origins
+
+            row_index, column = bottom, end
+            while row_index > top and column > 0:
+                score_origin = origins[row_index - top][column - lo + 1]
+                if score_origin == 8:
+                    row_index = row_index - 1
+                    column = column - 1
+                    seq1_indices.append(column)
+                    seq2_indices.append(row_index)
+                elif score_origin == 2:
+                    row_index = row_index - 1
+                else:
+                    column = column - 1
+            continue
+
+        mid = (top + bottom) // 2
+        for _ in range(mid - top):
+            mid_row, _ = next(rows)
+        # column at which the path of every cell first reaches row `mid`,
+        # -1 once it stops at column 0 below row `mid`
+        reached = np.arange(lo - 1, end + 1)
+        cells = np.arange(1, width + 1)
+        for _, origins in rows:
+            # 8 = DIAGONAL, 2 = UP, 4 = LEFT
+            came = np.concatenate(
+                ([-1], np.where(origins == 8, reached[:-1], reached[1:]))
+            )
+            # a left step leads to the nearest cell on its left that is not one
+            source = np.maximum.accumulate(np.where(origins == 4, 0, cells))
+            reached = came[np.concatenate(([0], source))]
+        mid_column = int(reached[-1])
+
+        if mid_column < lo:
+            # the path stops at column 0 without reaching row `mid`
+            blocks.append(
+                _TraceBlock(mid, bottom, lo, end, mid_row, left_column[mid - top :])
+            )
+            continue
+        # column mid_column - 1 of the lower rows is the left border of the lower block
+        lower_left = left_column[mid - top :]
+        if mid_column > lo:
+            lower_left = [mid_row[mid_column - lo]]
+            lower_left.extend(
+                row[-1]
+                for row, _ in _sweep_rows(
+                    substitution,
+                    gaps,
+                    seq1,
+                    seq2,
+                    mid,
+                    bottom,
+                    lo,
+                    mid_row[: mid_column - lo + 1],
+                    left_column[mid - top :],
+                )
+            )
+        blocks.append(
+            _TraceBlock(
+                top,
+                mid,
+                lo,
+                mid_column,
+                top_row[: mid_column - lo + 2].copy(),
+                left_column[: mid - top + 1].copy(),
+            )
+        )
+        blocks.append(
+            _TraceBlock(
+                mid,
+                bottom,
+                mid_column,
+                end,
+                mid_row[mid_column - lo :].copy(),
+                np.array(lower_left, dtype=np.int64),
+            )
+        )
+
+
+def _water_hirschberg(
+    substitution: np.ndarray, gaps: np.ndarray, seq1: np.ndarray, seq2: np.ndarray
+) -> Tuple[int, List[int], List[int]]:
+    """
+    Perform the Smith-Waterman algorithm without storing the full matrices.
+
+    A first row-by-row pass finds the cell holding the maximum score. The
+    backtracking path is then recovered by divide and conquer (see `_trace_path`),
+    recomputing blocks of rows instead of storing them, in O(len(seq1) + len(seq2))
+    memory and at most about the time of the first pass again. The result is
+    identical to `_water`.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+
+    Returns:
+        Tuple[int, List[int], List[int]]: The maximum alignment score, the indices for the first aligned sequence, and the indices for the second aligned sequence.
+    """
+    return _water_batch(substitution, gaps, seq1, [seq2])[0]
+
+
+def _water_batch(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2s: List[np.ndarray],
+    traceback: bool = True,
+    lanes: int = DEFAULT_LANES,
+) -> List[Tuple[int, List[int], List[int]]]:
+    """
+    Align many queries against the same database sequence.
+
+    Up to `lanes` queries, sorted by length so that lanes are padded as little as
+    possible, share each row-by-row pass over the database (see `_find_max_cells`).
+    The backtracking path of every query is then recovered in linear memory by
+    `_trace_path`, from its maximum cell only. The results are identical to
+    aligning every pair with `_water`.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the database sequence.
+        seq2s (List[np.ndarray]): The codes of the query sequences.
+        traceback (bool): Whether to recover the aligned indices, or only the score.
+        lanes (int): The maximum number of queries aligned in one pass.
+
+    Returns:
+        List[Tuple[int, List[int], List[int]]]: The alignment of every query, in the order of `seq2s`.
     """
-    seq1s = sw_data[0]
-    seq2s = sw_data[1]
-    matrix = sw_data[2]
-    alphabet = sw_data[3]
+    substitution = substitution.astype(np.int64)
+    gaps = gaps.astype(np.int64)
+    order = sorted(range(len(seq2s)), key=lambda i: len(seq2s[i]))
+    max_cells = [None] * len(seq2s)
+    for start in range(0, len(order), lanes):
+        group = order[start : start + lanes]
+        for i, cell in zip(
+            group,
+            _find_max_cells(substitution, gaps, seq1, [seq2s[i] for i in group]),
+        ):
+            max_cells[i] = cell
 
     results = []
-    for seq1 in seq1s:
-        for seq2 in seq2s:
-            out = _water(alphabet, matrix, seq1, seq2)
-            results.append(out)
+    for seq2, (max_score_row, max_score_column, max_score) in zip(seq2s, max_cells):
+        if max_score <= 0:
+            results.append((0, [], []))
+            continue
+        if not traceback:
+            results.append((max_score, [], []))
+            continue
+        seq1_indices = []
+        seq2_indices = []
+        _trace_path(
+            substitution,
+            gaps,
+            seq1,
+            seq2,
+            max_score_row,
+            max_score_column,
+            seq1_indices,
+            seq2_indices,
+        )
+        seq1_indices.sort()
+        seq2_indices.sort()
+        results.append((max_score, seq1_indices, seq2_indices))
+    return results
 
-    if len(results) > 1:
-        return results
-    return results[0]
+
+# Score of cells that are outside the matrix or were dropped by a heuristic
+_NEG_INF: int = -(2**40)
+
+DEFAULT_BAND: int = 32
+DEFAULT_XDROP: int = 10
+# Length of the words shared with the query that seed the heuristic modes
+DEFAULT_WORD: int = 4
+
+
+def _seed_diagonals(
+    substitution: np.ndarray, seq1: np.ndarray, seq2: np.ndarray, word: int
+) -> np.ndarray:
+    """
+    Find the diagonals on which the two sequences share a word of `word` letters.
+
+    Every word of the first sequence is looked up in a table of the words of the
+    second sequence, so the search costs a few vector operations over the first
+    sequence instead of a pass over every cell.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        word (int): The word length, shortened to the length of the second sequence.
+
+    Returns:
+        np.ndarray: The sorted diagonals (first sequence index minus second sequence index) holding a shared word.
+    """
+    alphabet_size = len(substitution)
+    word = min(word, len(seq2))
+    query_codes = _kmer_codes(seq2, word, alphabet_size)
+    codes = _kmer_codes(seq1, word, alphabet_size)
+    in_query = np.zeros(alphabet_size**word, dtype=bool)
+    in_query[query_codes] = True
+    positions = np.flatnonzero(in_query[codes])
+    # pair every hit with the query offsets of its word
+    order = np.argsort(query_codes, kind="stable")
+    sorted_codes = query_codes[order]
+    first = np.searchsorted(sorted_codes, codes[positions], side="left")
+    counts = np.searchsorted(sorted_codes, codes[positions], side="right") - first
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    query_offsets = order[np.repeat(first, counts) + within]
+    return np.unique(np.repeat(positions, counts) - query_offsets)
+
+
+def _ungapped_diagonals(
+    substitution: np.ndarray, seq1: np.ndarray, seq2: np.ndarray, diagonals: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the best ungapped segment of the given diagonals of the scoring matrix.
+
+    Diagonal `d` holds the cells where the first sequence index minus the second
+    sequence index is `d`. The best segment ending at a row is its prefix sum minus
+    the lowest prefix sum before it (Kadane's algorithm), so blocks of diagonals are
+    solved with a few operations over (diagonals, len(seq2)) arrays. Cells outside
+    the matrix score `_NEG_INF`, which no segment crosses.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        diagonals (np.ndarray): The diagonals.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The best score, start row, and end row of every diagonal.
+    """
+    seq2_len = len(seq2)
+    best = np.zeros(len(diagonals), dtype=np.int64)
+    best_start = np.zeros(len(diagonals), dtype=np.int64)
+    best_end = np.zeros(len(diagonals), dtype=np.int64)
+    rows = np.arange(seq2_len)
+    prefixes = np.arange(seq2_len + 1)
+    block = max(1, _BLOCK_CELLS // max(1, seq2_len))
+
+    for first in range(0, len(diagonals), block):
+        part = slice(first, first + block)
+        columns = diagonals[part, None] + rows
+        valid = (columns >= 0) & (columns < len(seq1))
+        match = np.where(
+            valid,
+            substitution[seq1[np.clip(columns, 0, len(seq1) - 1)], seq2],
+            _NEG_INF,
+        )
+        # prefix sums, the first one being the empty prefix
+        sums = np.zeros((len(match), seq2_len + 1), dtype=np.int64)
+        np.cumsum(match, axis=1, out=sums[:, 1:])
+        lowest = np.minimum.accumulate(sums, axis=1)
+        # a segment starts after the last lowest prefix sum, ties restarting it
+        starts = np.maximum.accumulate(np.where(sums == lowest, prefixes, 0), axis=1)
+        scores = sums[:, 1:] - lowest[:, :-1]
+        # the first row reaching the best score ends the segment
+        ends = np.argmax(scores, axis=1)
+        part_best = scores[np.arange(len(scores)), ends]
+        positive = part_best > 0
+        best[part] = np.where(positive, part_best, 0)
+        best_start[part] = np.where(positive, starts[np.arange(len(starts)), ends], 0)
+        best_end[part] = np.where(positive, ends, 0)
+
+    return best, best_start, best_end
+
+
+def _best_seed(
+    substitution: np.ndarray, seq1: np.ndarray, seq2: np.ndarray, word: int
+) -> Tuple[int, int, int, int]:
+    """
+    Find the best ungapped segment among the diagonals seeded by a shared word.
+
+    All the diagonals are searched when no shared word seeds a positive segment.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        word (int): The length of the seeding words.
+
+    Returns:
+        Tuple[int, int, int, int]: The score, diagonal, start row, and end row of the segment.
+    """
+    diagonals = _seed_diagonals(substitution, seq1, seq2, word)
+    best, start, end = _ungapped_diagonals(substitution, seq1, seq2, diagonals)
+    if best.size == 0 or best.max() <= 0:
+        diagonals = np.arange(-(len(seq2) - 1), len(seq1))
+        best, start, end = _ungapped_diagonals(substitution, seq1, seq2, diagonals)
+    # the first maximum is on the lowest diagonal
+    seed = int(np.argmax(best))
+    return int(best[seed]), int(diagonals[seed]), int(start[seed]), int(end[seed])
+
+
+def _gaps_can_score(gaps: np.ndarray, seq1: np.ndarray, seq2: np.ndarray) -> bool:
+    """
+    Tell whether a gap alone can give a positive score, when no letter pair does.
+
+    Args:
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+
+    Returns:
+        bool: Whether a letter of either sequence has a positive gap penalty.
+    """
+    return bool(np.any(gaps[seq1] > 0) or np.any(gaps[seq2] > 0))
+
+
+def _water_banded(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    band: int = DEFAULT_BAND,
+    diagonal: Optional[int] = None,
+    word: int = DEFAULT_WORD,
+) -> Tuple[int, List[int], List[int], bool]:
+    """
+    Perform the Smith-Waterman algorithm on the cells within `band` diagonals of `diagonal`.
+
+    The band is stored in diagonal coordinates, one row of 2 * band + 1 cells per
+    letter of the second sequence, so the work is O(len(seq2) * band). Without a
+    given diagonal, the band is centered on the diagonal holding the best ungapped
+    segment among the diagonals sharing a word of `word` letters (see `_best_seed`).
+    The traceback stops at the first cell scoring 0.
+
+    The optimal score may have been missed when the alignment touches an edge of
+    the band where a better path could have come from outside it. An alignment
+    elsewhere in the matrix, away from the band, is not detected.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        band (int): The number of diagonals searched on each side of the center.
+        diagonal (Optional[int]): The center diagonal (first sequence index minus second sequence index).
+        word (int): The length of the words seeding the center diagonal.
+
+    Returns:
+        Tuple[int, List[int], List[int], bool]: The alignment score, the indices for the first aligned sequence, the indices for the second aligned sequence,
+        and whether the alignment reached an edge of the band, so the optimal score may have been missed.
+    """
+    seq1_len = len(seq1)
+    seq2_len = len(seq2)
+    if seq1_len == 0 or seq2_len == 0:
+        return (0, [], [], False)
+
+    substitution = substitution.astype(np.int64)
+    gaps = gaps.astype(np.int64)
+    if diagonal is None:
+        _, diagonal, _, _ = _best_seed(substitution, seq1, seq2, word)
+
+    width = 2 * band + 1
+    # column of every band cell of row 1; row i is shifted right by i - 1
+    columns = np.arange(diagonal - band + 1, diagonal + band + seq2_len + 1)
+    valid = (columns >= 1) & (columns <= seq1_len)
+    codes = np.where(valid, seq1[np.clip(columns - 1, 0, seq1_len - 1)], 0)
+    # a left step into a cell outside the matrix is never taken
+    left_gaps = np.where(valid, gaps[codes], _NEG_INF)
+    # (len(seq2), width) band cells of every row
+    cells = np.lib.stride_tricks.sliding_window_view(np.arange(len(columns)), width)
+    row_valid = valid[cells]
+    match = substitution[codes[cells], seq2[:, None]]
+    row_gaps = left_gaps[cells]
+    gap_sums = np.cumsum(row_gaps, axis=1) - row_gaps[:, :1]
+    up_gaps = gaps[seq2]
+
+    # the last column, just outside the band, stays 0
+    scores = np.zeros((seq2_len + 1, width + 1), dtype=np.int64)
+    for row in range(seq2_len):
+        prev_row = scores[row]
+        best = np.maximum(
+            np.maximum(prev_row[:-1] + match[row], prev_row[1:] + up_gaps[row]), 0
+        )
+        # no path goes through a cell outside the matrix
+        best[~row_valid[row]] = 0
+        score = np.maximum.accumulate(best - gap_sums[row]) + gap_sums[row]
+        scores[row + 1, :-1] = np.where(row_valid[row], score, 0)
+
+    score = scores[1:, :-1]
+    diagonal_score = scores[:-1, :-1] + match
+    up_score = scores[:-1, 1:] + up_gaps[:, None]
+    origins = np.zeros((seq2_len + 1, width), dtype=np.uint8)
+    # 8 = DIAGONAL, 2 = UP, 4 = LEFT, 0 = alignment start
+    origins[1:] = np.where(
+        score == 0,
+        0,
+        np.where(score == diagonal_score, 8, np.where(score == up_score, 2, 4)),
+    )
+    # argmax returns the first maximum in row-major order
+    max_score_row, max_score_cell = np.unravel_index(np.argmax(score), score.shape)
+    max_score = int(score[max_score_row, max_score_cell])
+    max_score_row, max_score_cell = int(max_score_row) + 1, int(max_score_cell)
+
+    if max_score <= 0:
+        return (0, [], [], _gaps_can_score(gaps, seq1, seq2))
+
+    seq1_indices = []
+    seq2_indices = []
+    missed = False
+    row, cell = max_score_row, max_score_cell
+    while row > 0 and origins[row][cell] != 0:
+        column = int(columns[row - 1 + cell])
+        # a left step into the first diagonal, or an up step into the last one,
+        # may have come from a better cell outside the band
+        if (cell == 0 and column > 1) or (cell == width - 1 and row > 1):
+            missed = True
+        score_origin = origins[row][cell]
+        if score_origin == 8:
+            row = row - 1
+            seq1_indices.append(column - 1)
+            seq2_indices.append(row)
+        elif score_origin == 2:
+            row = row - 1
+            cell = cell + 1
+            if cell == width:
+                # the path starts just outside the band
+                missed = True
+                break
+        else:
+            cell = cell - 1
+
+    seq1_indices.sort()
+    seq2_indices.sort()
+    return (max_score, seq1_indices, seq2_indices, missed)
+
+
+def _xdrop_extend(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    xdrop: int,
+    closed_end: bool = False,
+) -> Tuple[int, List[Tuple[int, int]], bool]:
+    """
+    Extend a gapped alignment from the start of both sequences with the X-drop rule.
+
+    Rows are computed one at a time over the range of columns still alive; a cell
+    dies when its score falls more than `xdrop` below the best score so far, and a
+    row may only grow `xdrop + 1` columns to the right of the previous one.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        xdrop (int): The score drop that stops the extension.
+        closed_end (bool): Whether the ends of the sequences are the border of the scoring matrix,
+            which a path cannot run along (backward extensions).
+
+    Returns:
+        Tuple[int, List[Tuple[int, int]], bool]: The best extension score, the aligned (first, second) index pairs,
+        and whether the X-drop rule stopped the extension before the end of the second sequence.
+    """
+    seq1_len = len(seq1)
+    # indexed by column, column 0 has no letter
+    column_codes = np.concatenate(([0], seq1)).astype(np.intp)
+    left_gaps = np.concatenate(([_NEG_INF], gaps[seq1]))
+    max_score, max_score_row, max_score_column = 0, 0, 0
+    rows = []
+    dropped = False
+
+    prev_low, prev_row = 0, np.zeros(1, dtype=np.int64)
+    for row in range(len(seq2) + 1):
+        low = prev_low
+        high = min(seq1_len, prev_low + len(prev_row) + xdrop + 1)
+        width = high - low + 1
+        # previous row values for columns low - 1 to high
+        padded = np.full(width + 1, _NEG_INF, dtype=np.int64)
+        padded[1 : 1 + min(len(prev_row), width)] = prev_row[:width]
+        if row == 0:
+            diagonal_score = np.full(width, _NEG_INF, dtype=np.int64)
+            up_score = np.full(width, _NEG_INF, dtype=np.int64)
+            diagonal_score[0] = 0
+        else:
+            letter = seq2[row - 1]
+            match = substitution[column_codes[low : high + 1], letter]
+            diagonal_score = padded[:-1] + match
+            if low == 0:
+                diagonal_score[0] = _NEG_INF
+            up_score = padded[1:] + gaps[letter]
+            if closed_end and high == seq1_len:
+                up_score[-1] = _NEG_INF
+        best = np.maximum(diagonal_score, up_score)
+        step_gaps = left_gaps[low : high + 1].copy()
+        step_gaps[0] = _NEG_INF
+        if closed_end and row == len(seq2):
+            step_gaps[:] = _NEG_INF
+        gap_sums = np.cumsum(step_gaps) - step_gaps[0]
+        score = np.maximum.accumulate(best - gap_sums) + gap_sums
+
+        cell = int(np.argmax(score))
+        if score[cell] > max_score:
+            max_score, max_score_row, max_score_column = (
+                int(score[cell]),
+                row,
+                low + cell,
+            )
+        dead = score < max_score - xdrop
+        alive = np.flatnonzero(~dead)
+        if alive.size == 0:
+            dropped = True
+            break
+        # 8 = DIAGONAL, 2 = UP, 4 = LEFT
+        origins = np.where(
+            score == diagonal_score, 8, np.where(score == up_score, 2, 4)
+        ).astype(np.uint8)
+        rows.append((low, origins))
+        score[dead] = _NEG_INF
+        prev_low = low + int(alive[0])
+        prev_row = score[alive[0] : alive[-1] + 1]
+
+    pairs = []
+    row, column = max_score_row, max_score_column
+    while row > 0 or column > 0:
+        low, origins = rows[row]
+        score_origin = origins[column - low] if row > 0 else 4
+        if score_origin == 8:
+            row = row - 1
+            column = column - 1
+            pairs.append((column, row))
+        elif score_origin == 2:
+            row = row - 1
+        else:
+            column = column - 1
+    return max_score, pairs, dropped
+
+
+def _water_xdrop(
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    xdrop: int = DEFAULT_XDROP,
+    word: int = DEFAULT_WORD,
+) -> Tuple[int, List[int], List[int], bool]:
+    """
+    Perform a seed-and-extend alignment with X-drop gapped extensions.
+
+    The seed is the middle of the best ungapped segment among the diagonals
+    sharing a word of `word` letters (see `_best_seed`). The alignment is extended
+    forward and backward from the seed, and each extension stops once its score
+    drops more than `xdrop` below the best score it reached.
+
+    The optimal score may have been missed when an extension was stopped by the
+    X-drop rule rather than by the end of the sequences. An alignment away from the
+    seed is not detected.
+
+    Args:
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        seq1 (np.ndarray): The codes of the first sequence.
+        seq2 (np.ndarray): The codes of the second sequence.
+        xdrop (int): The score drop that stops an extension.
+        word (int): The length of the words seeding the alignment.
+
+    Returns:
+        Tuple[int, List[int], List[int], bool]: The alignment score, the indices for the first aligned sequence, the indices for the second aligned sequence,
+        and whether an extension was stopped early, so the optimal score may have been missed.
+    """
+    seq1_len = len(seq1)
+    seq2_len = len(seq2)
+    if seq1_len == 0 or seq2_len == 0:
+        return (0, [], [], False)
+
+    substitution = substitution.astype(np.int64)
+    gaps = gaps.astype(np.int64)
+    seed_score, diagonal, seed_start, seed_end = _best_seed(
+        substitution, seq1, seq2, word
+    )
+    if seed_score <= 0:
+        return (0, [], [], _gaps_can_score(gaps, seq1, seq2))
+    seed_row = (seed_start + seed_end + 1) // 2
+    seed_column = seed_row + diagonal
+
+    forward = _xdrop_extend(
+        substitution, gaps, seq1[seed_column:], seq2[seed_row:], xdrop
+    )
+    backward = _xdrop_extend(
+        substitution,
+        gaps,
+        seq1[:seed_column][::-1],
+        seq2[:seed_row][::-1],
+        xdrop,
+        closed_end=True,
+    )
+    score = forward[0] + backward[0]
+    seq1_indices = sorted(
+        [seed_column + column for column, _ in forward[1]]
+        + [seed_column - 1 - column for column, _ in backward[1]]
+    )
+    seq2_indices = sorted(
+        [seed_row + row for _, row in forward[1]]
+        + [seed_row - 1 - row for _, row in backward[1]]
+    )
+    return (score, seq1_indices, seq2_indices, forward[2] or backward[2])
+
+
+# Available Smith-Waterman kernels, selectable through `smith_waterman`
+KERNELS = {
+    "python": _water,
+    "wavefront": _water_wavefront,
+    # aligns all the queries against a database sequence together, see `_water_batch`
+    "batch": _water_hirschberg,
+}
+if _sw_kernel is not None:
+    KERNELS["compiled"] = _sw_kernel.water
+# Kernels used instead of the ones missing from this installation
+FALLBACK_KERNELS: Dict[str, str] = {"compiled": "batch"}
+DEFAULT_KERNEL: str = "compiled"
+
+# Modes: "full" keeps both matrices and runs the selected kernel, "score" only
+# returns the maximum score, "hirschberg" keeps a few rows. The heuristic modes
+# "banded" and "xdrop" bound the searched area and add a fourth result field
+# telling whether the optimal score may have been missed.
+MODES = {
+    "full": None,
+    "score": _water_score,
+    "hirschberg": _water_hirschberg,
+    "banded": _water_banded,
+    "xdrop": _water_xdrop,
+}
+HEURISTIC_MODES: List[str] = ["banded", "xdrop"]
+# modes aligning the regions seeded by a database search, see `search_database`
+SEARCH_MODES: List[str] = ["full", "banded"]
+# modes aligning all the queries against a database sequence in one pass
+BATCH_MODES: List[str] = ["score", "hirschberg"]
+DEFAULT_MODE: str = "full"
+
+
+def _resolve_kernel(kernel: str) -> str:
+    """
+    Get the kernel that runs for a requested kernel, falling back when it is not installed.
+
+    Args:
+        kernel (str): The requested kernel name.
+
+    Returns:
+        str: The name of the kernel that runs.
+    """
+    if kernel not in KERNELS and kernel in FALLBACK_KERNELS:
+        kernel = FALLBACK_KERNELS[kernel]
+    if kernel not in KERNELS:
+        raise ValueError(
+            f"Invalid kernel: {kernel}. Valid kernels are: {list(KERNELS)}"
+        )
+    return kernel
+
+
+def get_kernel_in_use(kernel: str = DEFAULT_KERNEL, mode: str = DEFAULT_MODE) -> str:
+    """
+    Get the name of the kernel that aligns the sequences, for logs and benchmarks.
+
+    Args:
+        kernel (str): The requested kernel name.
+        mode (str): The mode name.
+
+    Returns:
+        str: The kernel name in "full" mode (e.g., "compiled", or "batch" when the compiled
+        kernel is not installed), "batch" for the modes aligning the queries together,
+        and the mode name for the heuristic modes.
+    """
+    kernel = _resolve_kernel(kernel)
+    if mode in BATCH_MODES:
+        return "batch"
+    if mode in HEURISTIC_MODES:
+        return mode
+    return kernel
+
+
+def _get_water(
+    kernel: str,
+    mode: str,
+    band: int = DEFAULT_BAND,
+    xdrop: int = DEFAULT_XDROP,
+    diagonal: Optional[int] = None,
+) -> Any:
+    """
+    Get the function aligning one pair of sequences for a kernel and a mode.
+
+    Args:
+        kernel (str): The kernel name.
+        mode (str): The mode name.
+        band (int): The half width of the band in "banded" mode.
+        xdrop (int): The score drop that stops an extension in "xdrop" mode.
+        diagonal (Optional[int]): The center diagonal of the band in "banded" mode.
+
+    Returns:
+        Any: The alignment function.
+    """
+    kernel = _resolve_kernel(kernel)
+    if mode not in MODES:
+        raise ValueError(f"Invalid mode: {mode}. Valid modes are: {list(MODES)}")
+    if mode == "banded":
+        return partial(_water_banded, band=band, diagonal=diagonal)
+    if mode == "xdrop":
+        return partial(_water_xdrop, xdrop=xdrop)
+    return MODES[mode] or KERNELS[kernel]
+
+
+def collect_sw_data(
+    dir: str,
+    dbfilename: str = "database.txt",
+    queryfilename: str = "query.txt",
+    matrixfilename: str = "matrix.txt",
+    alphabetfilename: str = "alphabet.txt",
+) -> SWData:
+    """
+    Collect and encode the data needed for pairwise sequence alignment.
+
+    Args:
+        dir (str): The directory containing the files.
+        dbfilename (str): The name of the database file.
+        queryfilename (str): The name of the query file.
+        matrixfilename (str): The name of the matrix file.
+        alphabetfilename (str): The name of the alphabet file.
+
+    Returns:
+        SWData: The encoded database sequences, the encoded query sequences, the substitution table, the gap table, and the alphabet.
+    """
+    dbfile = os.path.join(dir, dbfilename)
+    queryfile = os.path.join(dir, queryfilename)
+    matrixfile = os.path.join(dir, matrixfilename)
+    alphabetfile = os.path.join(dir, alphabetfilename)
+    seq1s = _get_records(dbfile)
+    seq2s = _get_records(queryfile)
+    matrix = _get_matrix(matrixfile)
+    alphabet = _get_alphabet(alphabetfile)
+    return encode_sw_data(seq1s, seq2s, matrix, alphabet)
+
+
+def smith_waterman(
+    sw_data: Union[
+        SWData, Dict[str, Any], Tuple[List[str], List[str], List[List[int]], str]
+    ],
+    kernel: str = DEFAULT_KERNEL,
+    mode: str = DEFAULT_MODE,
+    workers: int = 1,
+    tile_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    band: int = DEFAULT_BAND,
+    xdrop: int = DEFAULT_XDROP,
+    top_k: Optional[int] = None,
+    lanes: int = DEFAULT_LANES,
+    data_dir: Optional[str] = None,
+) -> Union[List[Tuple[int, List[int], List[int]]], Tuple[int, List[int], List[int]]]:
+    """
+    Perform the Smith-Waterman algorithm on the given sequences.
+
+    Args:
+        sw_data (Union[SWData, Dict[str, Any], Tuple[List[str], List[str], List[List[int]], str]]): The encoded data, its packed form, or the database sequences, the query sequences, the substitution matrix, and the alphabet.
+        kernel (str): The kernel used to align each pair of sequences in "full" mode ("compiled", "wavefront", "python", or "batch" to align the queries together).
+            "compiled" falls back to "batch" when the extension is not built. "wavefront" only pays off when both sequences are long.
+        mode (str): The mode ("full", "score" for the score only, "hirschberg" for a linear-memory traceback, or the heuristic "banded" and "xdrop"). "score" and "hirschberg" align the queries together.
+        workers (int): The number of worker processes. 1 aligns the pairs serially in this process.
+        tile_size (Optional[int]): The length of the database tiles searched in parallel. Defaults to splitting every database sequence across the workers.
+        overlap (Optional[int]): The number of database letters shared by consecutive tiles. Defaults to twice the query length.
+        band (int): The number of diagonals searched on each side of the best ungapped diagonal in "banded" mode.
+        xdrop (int): The score drop that stops an extension in "xdrop" mode.
+        lanes (int): The maximum number of queries aligned together against a database sequence.
+        top_k (Optional[int]): When given, search the database with a k-mer prefilter instead and return the `top_k` best hits of every query (see `search_database`).
+            The regions are aligned in "full" mode with the selected kernel, or in "banded" mode; the other modes are not supported.
+        data_dir (Optional[str]): The directory of the data set, whose persisted k-mer index is memory-mapped when searching with `top_k` (see `get_database_index`).
+
+    Returns:
+        Union[List[Tuple[int, List[int], List[int]]], Tuple[int, List[int], List[int]]]: The maximum alignment score, the indices for the first aligned sequence, and the indices for the second aligned sequence. If there are multiple pairs of sequences, return a list of tuples.
+        The heuristic modes add a fourth field, True when the band edge or the X-drop limit cut the alignment, so the optimal score may have been missed.
+    """
+    sw_data = _as_sw_data(sw_data)
+    kernel = _resolve_kernel(kernel)
+    if top_k is not None:
+        if mode not in SEARCH_MODES:
+            raise ValueError(
+                f"Invalid mode for a database search: {mode}. Valid modes are: {SEARCH_MODES}"
+            )
+        results = search_database(
+            sw_data,
+            get_database_index(sw_data, data_dir),
+            top_k=top_k,
+            extend=mode,
+            kernel=kernel,
+            band=band,
+        )
+        return results if len(results) > 1 else results[0]
+    mode_options = {"band": band, "xdrop": xdrop}
+    water = _get_water(kernel, mode, **mode_options)
+
+    if workers > 1:
+        results = _smith_waterman_parallel(
+            sw_data, kernel, mode, workers, tile_size, overlap, mode_options
+        )
+    elif mode in BATCH_MODES or (mode == "full" and kernel == "batch"):
+        results = []
+        for seq1 in sw_data.seq1s:
+            results.extend(
+                _water_batch(
+                    sw_data.substitution,
+                    sw_data.gaps,
+                    seq1,
+                    sw_data.seq2s,
+                    traceback=mode != "score",
+                    lanes=lanes,
+                )
+            )
+    else:
+        results = []
+        for seq1 in sw_data.seq1s:
+            for seq2 in sw_data.seq2s:
+                out = water(sw_data.substitution, sw_data.gaps, seq1, seq2)
+                results.append(out)
+
+    if len(results) > 1:
+        return results
+    return results[0]
+
+
+# Database sequences shorter than this are never split into tiles
+MIN_TILE_SIZE: int = 4096
+
+# Shared memory segment the current worker process is attached to
+_attached: Dict[str, SharedMemory] = {}
+
+
+def _attach_shared(name: str) -> SharedMemory:
+    """
+    Attach the worker process to a shared memory segment, detaching from the previous one.
+
+    Args:
+        name (str): The name of the shared memory segment.
+
+    Returns:
+        SharedMemory: The shared memory segment.
+    """
+    shm = _attached.get(name)
+    if shm is None:
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        shm = SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def _get_tiles(seq_len: int, tile_size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Split a sequence into overlapping tiles.
+
+    Args:
+        seq_len (int): The length of the sequence.
+        tile_size (int): The number of letters each tile adds.
+        overlap (int): The number of letters shared with the previous tile.
+
+    Returns:
+        List[Tuple[int, int]]: The start and stop index of every tile.
+    """
+    if seq_len <= tile_size:
+        return [(0, seq_len)]
+    return [
+        (max(0, start - overlap), min(seq_len, start + tile_size))
+        for start in range(0, seq_len, tile_size)
+    ]
+
+
+def _align_tile(
+    shm_name: str,
+    offset: int,
+    start: int,
+    stop: int,
+    seq2: np.ndarray,
+    substitution: np.ndarray,
+    gaps: np.ndarray,
+    kernel: str,
+    mode: str,
+    mode_options: Dict[str, Any],
+) -> Tuple[Tuple[int, int, int], Tuple[int, List[int], List[int]]]:
+    """
+    Align a query against one tile of a database sequence stored in shared memory.
+
+    Every tile is aligned in a single pass over its cells: the compiled kernel
+    reports its maximum cell, and the other kernels of the exact modes are replaced
+    by the row-by-row pass of `_find_max_cell` and a traceback from its cell, which
+    give the same alignment.
+
+    Args:
+        shm_name (str): The name of the shared memory segment holding the database.
+        offset (int): The position of the database sequence in the segment.
+        start (int): The start index of the tile in the database sequence.
+        stop (int): The stop index of the tile in the database sequence.
+        seq2 (np.ndarray): The codes of the query sequence.
+        substitution (np.ndarray): The substitution table.
+        gaps (np.ndarray): The gap penalty of every letter.
+        kernel (str): The kernel name.
+        mode (str): The mode name.
+        mode_options (Dict[str, Any]): The options of the heuristic modes.
+
+    Returns:
+        Tuple[Tuple[int, int, int], Tuple[int, List[int], List[int]]]: The maximum score with the row and column
+        of its cell, and the alignment result with the database indices relative to the whole sequence.
+    """
+    shm = _attach_shared(shm_name)
+    # copy the tile out so no view keeps the segment exported when it is closed
+    seq1 = np.array(np.frombuffer(shm.buf, np.uint8, stop - start, offset + start))
+    if mode in HEURISTIC_MODES:
+        # the heuristics do not scan every cell, so tiles are ranked by their score
+        out = _get_water(kernel, mode, **mode_options)(substitution, gaps, seq1, seq2)
+        key = (out[0], 0, start)
+    elif mode == "full" and kernel == "compiled":
+        # the compiled kernel reports the cell its traceback starts from
+        *out, row, column = KERNELS[kernel](
+            substitution, gaps, seq1, seq2, max_cell=True
+        )
+        key = (out[0], row, start + column)
+    else:
+        # the other kernels give the same alignment as a row-by-row pass finding
+        # the maximum cell and a traceback from that cell
+        row, column, max_score = _find_max_cell(substitution, gaps, seq1, seq2)
+        if max_score <= 0:
+            return (0, -1, -1), (0, [], [])
+        out = (max_score, [], [])
+        if mode != "score":
+            _trace_path(
+                substitution.astype(np.int64),
+                gaps.astype(np.int64),
+                seq1,
+                seq2,
+                row,
+                column,
+                out[1],
+                out[2],
+            )
+            out[1].sort()
+            out[2].sort()
+        key = (max_score, row, start + column)
+    return key, (out[0], [start + i for i in out[1]], *out[2:])
+
+
+def _smith_waterman_parallel(
+    sw_data: SWData,
+    kernel: str,
+    mode: str,
+    workers: int,
+    tile_size: Optional[int],
+    overlap: Optional[int],
+    mode_options: Dict[str, Any],
+) -> List[Tuple[int, List[int], List[int]]]:
+    """
+    Align every (database, query) pair on a pool of worker processes.
+
+    The database sequences are copied once into a shared memory segment that the
+    workers read from, so only tile boundaries and the short queries are pickled per
+    task. Long database sequences are split into overlapping tiles; the tile holding
+    the best cell (highest score, then lowest row and column, like the serial scan)
+    gives the result. Tiling finds the same alignment as the serial path as long as
+    the alignment spans fewer database letters than the overlap.
+
+    Args:
+        sw_data (SWData): The encoded data.
+        kernel (str): The kernel name.
+        mode (str): The mode name.
+        workers (int): The number of worker processes.
+        tile_size (Optional[int]): The length of the database tiles.
+        overlap (Optional[int]): The number of database letters shared by consecutive tiles.
+        mode_options (Dict[str, Any]): The options of the heuristic modes.
+
+    Returns:
+        List[Tuple[int, List[int], List[int]]]: The results in the same order as the serial path.
+    """
+    offsets = np.cumsum([0] + [len(seq) for seq in sw_data.seq1s])
+    shm = SharedMemory(create=True, size=max(1, int(offsets[-1])))
+    try:
+        database = np.ndarray((int(offsets[-1]),), dtype=np.uint8, buffer=shm.buf)
+        for seq1, offset in zip(sw_data.seq1s, offsets):
+            database[offset : offset + len(seq1)] = seq1
+        del database
+
+        pool = get_pool(workers)
+        pair_futures = []
+        for seq1, offset in zip(sw_data.seq1s, offsets):
+            size = tile_size or max(MIN_TILE_SIZE, -(-len(seq1) // workers))
+            for seq2 in sw_data.seq2s:
+                tile_overlap = 2 * len(seq2) if overlap is None else overlap
+                pair_futures.append(
+                    [
+                        pool.submit(
+                            _align_tile,
+                            shm.name,
+                            int(offset),
+                            start,
+                            stop,
+                            seq2,
+                            sw_data.substitution,
+                            sw_data.gaps,
+                            kernel,
+                            mode,
+                            mode_options,
+                        )
+                        for start, stop in _get_tiles(len(seq1), size, tile_overlap)
+                    ]
+                )
+
+        results = []
+        for futures in pair_futures:
+            tiles = [future.result() for future in futures]
+            best = min(tiles, key=lambda tile: (-tile[0][0], tile[0][1], tile[0][2]))
+            results.append(best[1])
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# k-mer length of the database index, 4 ** 4 buckets for nucleotides. Queries
+# shorter than this are never seeded.
+DEFAULT_KMER: int = 4
+# minimum number of k-mer hits on a diagonal for it to be extended, so a seed
+# needs a shared word of at least DEFAULT_KMER + DEFAULT_MIN_HITS - 1 letters
+DEFAULT_MIN_HITS: int = 3
+DEFAULT_TOP_K: int = 5
+# index file format version, stored in the header
+_INDEX_VERSION: int = 1
+_INDEX_HEADER: int = 6
+# Databases whose k-mer index is kept by a process, see `get_database_index`
+_MAX_INDEXES: int = 4
+
+
+class KmerIndex(NamedTuple):
+    """
+    Positions of every k-mer of the database sequences.
+
+    The positions are sorted by k-mer code, and the positions of k-mer `c` are
+    `positions[bucket_offsets[c] : bucket_offsets[c + 1]]`. A position is an index
+    into the concatenation of all the database sequences, and the sequence `r`
+    starts at `record_offsets[r]`. No k-mer crosses two sequences.
+    """
+
+    k: int
+    alphabet_size: int
+    record_offsets: np.ndarray  # int64 (records + 1,) start of every sequence
+    bucket_offsets: np.ndarray  # int64 (p ** k + 1,) start of every k-mer bucket
+    positions: np.ndarray  # int64 database positions sorted by k-mer code
+
+
+class SearchHit(NamedTuple):
+    """
+    An alignment of a query against a region of one database sequence.
+    """
+
+    record: int  # index of the database sequence
+    score: int
+    seq1_indices: List[int]
+    seq2_indices: List[int]
+    missed: bool  # the banded extension may have missed the optimal score of the region
+
+
+class SearchResult(NamedTuple):
+    """
+    The best hits of a query, with the number of seeds the prefilter discarded.
+    """
+
+    hits: List[SearchHit]
+    candidates: int  # seeded diagonals that were extended
+    pruned: int  # seeded diagonals with fewer than `min_hits` k-mer hits
+    records_skipped: int  # database sequences that were never aligned
+
+
+def _kmer_codes(seq: np.ndarray, k: int, alphabet_size: int) -> np.ndarray:
+    """
+    Compute the code of every k-mer of a sequence.
+
+    Args:
+        seq (np.ndarray): The codes of the sequence.
+        k (int): The k-mer length.
+        alphabet_size (int): The number of letters in the alphabet.
+
+    Returns:
+        np.ndarray: The code of the k-mer starting at every position, len(seq) - k + 1 values.
+    """
+    num_kmers = len(seq) - k + 1
+    if num_kmers <= 0:
+        return np.zeros(0, dtype=np.int64)
+    codes = seq[:num_kmers].astype(np.int64)
+    for offset in range(1, k):
+        codes = codes * alphabet_size + seq[offset : offset + num_kmers]
+    return codes
+
+
+def build_kmer_index(
+    seq1s: List[np.ndarray], alphabet_size: int, k: int = DEFAULT_KMER
+) -> KmerIndex:
+    """
+    Build the k-mer index of the database sequences.
+
+    Args:
+        seq1s (List[np.ndarray]): The codes of the database sequences.
+        alphabet_size (int): The number of letters in the alphabet.
+        k (int): The k-mer length.
+
+    Returns:
+        KmerIndex: The index.
+    """
+    record_offsets = np.cumsum([0] + [len(seq) for seq in seq1s], dtype=np.int64)
+    codes = []
+    starts = []
+    for seq1, offset in zip(seq1s, record_offsets):
+        seq_codes = _kmer_codes(seq1, k, alphabet_size)
+        codes.append(seq_codes)
+        starts.append(offset + np.arange(len(seq_codes), dtype=np.int64))
+    codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+    # a stable sort keeps the positions of every k-mer in database order
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=alphabet_size**k)
+    bucket_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return KmerIndex(k, alphabet_size, record_offsets, bucket_offsets, starts[order])
+
+
+def save_kmer_index(index: KmerIndex, filename: str) -> None:
+    """
+    Save a k-mer index as a single NumPy file that can be memory-mapped.
+
+    Args:
+        index (KmerIndex): The index.
+        filename (str): The name of the index file.
+    """
+    header = [
+        _INDEX_VERSION,
+        index.k,
+        index.alphabet_size,
+        len(index.record_offsets),
+        len(index.bucket_offsets),
+        len(index.positions),
+    ]
+    # write to a temporary file first, so a reader never maps a partial index
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, "wb") as f:
+        np.save(
+            f,
+            np.concatenate(
+                (
+                    np.asarray(header, dtype=np.int64),
+                    index.record_offsets,
+                    index.bucket_offsets,
+                    index.positions,
+                )
+            ),
+        )
+    os.replace(tmp_filename, filename)
+
+
+def load_kmer_index(filename: str) -> KmerIndex:
+    """
+    Load a k-mer index saved by `save_kmer_index`, memory-mapping the file.
+
+    Only the buckets of the k-mers a query contains are read from disk.
+
+    Args:
+        filename (str): The name of the index file.
+
+    Returns:
+        KmerIndex: The index, backed by the memory-mapped file.
+    """
+    data = np.load(filename, mmap_mode="r")
+    version, k, alphabet_size, num_records, num_buckets, num_positions = (
+        int(x) for x in data[:_INDEX_HEADER]
+    )
+    if version != _INDEX_VERSION:
+        raise ValueError(f"Unsupported k-mer index version {version}: {filename}")
+    start = _INDEX_HEADER
+    record_offsets = data[start : start + num_records]
+    start += num_records
+    bucket_offsets = data[start : start + num_buckets]
+    start += num_buckets
+    positions = data[start : start + num_positions]
+    return KmerIndex(k, alphabet_size, record_offsets, bucket_offsets, positions)
+
+
+def get_index_filename(dbfile: str, k: int = DEFAULT_KMER) -> str:
+    """
+    Get the name of the k-mer index file stored next to a database file.
+
+    Args:
+        dbfile (str): The name of the database file.
+        k (int): The k-mer length.
+
+    Returns:
+        str: The name of the index file (e.g., database.kmer4.npy).
+    """
+    return f"{os.path.splitext(dbfile)[0]}.kmer{k}.npy"
+
+
+def collect_kmer_index(
+    dir: str,
+    k: int = DEFAULT_KMER,
+    dbfilename: str = "database.txt",
+    alphabetfilename: str = "alphabet.txt",
+) -> KmerIndex:
+    """
+    Load the k-mer index of a database, building and saving it next to the database
+    file when it is missing or older than the database.
+
+    Args:
+        dir (str): The directory containing the files.
+        k (int): The k-mer length.
+        dbfilename (str): The name of the database file.
+        alphabetfilename (str): The name of the alphabet file.
+
+    Returns:
+        KmerIndex: The memory-mapped index.
+    """
+    dbfile = os.path.join(dir, dbfilename)
+    index_file = get_index_filename(dbfile, k)
+    if not os.path.exists(index_file) or os.path.getmtime(
+        index_file
+    ) < os.path.getmtime(dbfile):
+        alphabet = _get_alphabet(os.path.join(dir, alphabetfilename))
+        seq1s = [_encode_seq(seq, alphabet) for seq in _get_records(dbfile)]
+        save_kmer_index(build_kmer_index(seq1s, len(alphabet), k), index_file)
+    return load_kmer_index(index_file)
+
+
+# k-mer indexes of the databases searched by this process, by database digest
+_indexes: Dict[str, KmerIndex] = {}
+
+
+def _database_digest(sw_data: SWData) -> str:
+    """
+    Hash the database sequences and the alphabet of the data.
+
+    Args:
+        sw_data (SWData): The encoded data.
+
+    Returns:
+        str: The hexadecimal BLAKE2 digest of the database.
+    """
+    digest = hashlib.blake2b(sw_data.alphabet.encode(), digest_size=16)
+    for seq1 in sw_data.seq1s:
+        digest.update(len(seq1).to_bytes(8, "little"))
+        digest.update(seq1)
+    return digest.hexdigest()
+
+
+def get_database_index(sw_data: SWData, dir: Optional[str] = None) -> KmerIndex:
+    """
+    Get the k-mer index of the database of the data, built once per database and process.
+
+    The index persisted next to the database file of `dir` is memory-mapped (see
+    `collect_kmer_index`), unless it indexes records of other lengths than the
+    database of the data, which is then indexed in memory.
+
+    Args:
+        sw_data (SWData): The encoded data.
+        dir (Optional[str]): The directory of the data set, None to index the data in memory.
+
+    Returns:
+        KmerIndex: The index.
+    """
+    key = _database_digest(sw_data)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+    lengths = [len(seq1) for seq1 in sw_data.seq1s]
+    if dir is not None and os.path.exists(os.path.join(dir, "database.txt")):
+        index = collect_kmer_index(dir)
+        if index.alphabet_size != len(sw_data.alphabet) or not np.array_equal(
+            np.diff(index.record_offsets), lengths
+        ):
+            index = None
+    if index is None:
+        index = build_kmer_index(sw_data.seq1s, len(sw_data.alphabet))
+    if len(_indexes) >= _MAX_INDEXES:
+        # drop the index of the database searched first
+        del _indexes[next(iter(_indexes))]
+    _indexes[key] = index
+    return index
+
+
+def _find_seeds(
+    index: KmerIndex, seq2: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the diagonals on which the query shares k-mers with the database.
+
+    Args:
+        index (KmerIndex): The database index.
+        seq2 (np.ndarray): The codes of the query sequence.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The database sequence, the diagonal (database index minus
+        query index), and the number of k-mer hits of every seeded diagonal.
+    """
+    query_codes = _kmer_codes(seq2, index.k, index.alphabet_size)
+    starts = np.asarray(index.bucket_offsets[query_codes])
+    stops = np.asarray(index.bucket_offsets[query_codes + 1])
+    counts = stops - starts
+    if counts.sum() == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    # gather every bucket at once: the i-th hit of query k-mer j is at starts[j] + i
+    query_offsets = np.repeat(np.arange(len(query_codes)), counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.asarray(index.positions[np.repeat(starts, counts) + within])
+    record_offsets = np.asarray(index.record_offsets)
+    records = np.searchsorted(record_offsets, positions, side="right") - 1
+    diagonals = positions - record_offsets[records] - query_offsets
+    # the diagonals of a record span len(record) + len(query_codes) - 1 values, so
+    # this key orders the seeds by record, then diagonal, without overlapping
+    keys = positions - query_offsets + records * len(query_codes)
+    _, first, hits = np.unique(keys, return_index=True, return_counts=True)
+    return records[first], diagonals[first], hits
+
+
+def search_database(
+    sw_data: Any,
+    index: Optional[KmerIndex] = None,
+    top_k: int = DEFAULT_TOP_K,
+    min_hits: int = DEFAULT_MIN_HITS,
+    extend: str = "full",
+    kernel: str = DEFAULT_KERNEL,
+    band: int = DEFAULT_BAND,
+) -> List[SearchResult]:
+    """
+    Search the database for every query, aligning only the regions seeded by shared k-mers.
+
+    Every diagonal with at least `min_hits` k-mer hits is extended: the database
+    region it covers, widened by `band` letters on each side, is aligned with the
+    query. Overlapping regions of a sequence are merged and aligned once, and so
+    are regions with the same letters, as in repeated database segments. With
+    "full" extension each region is aligned exactly; "banded" extension only
+    searches `band` diagonals around the diagonal with the most hits, and flags
+    the hits that reached an edge of the band (see `_water_banded`).
+
+    Args:
+        sw_data (Any): The encoded data, its packed form, or the database sequences, the query sequences, the substitution matrix, and the alphabet.
+        index (Optional[KmerIndex]): The database index (see `get_database_index`). Built in memory when not given.
+        top_k (int): The number of hits kept per query.
+        min_hits (int): The minimum number of k-mer hits on a diagonal for it to be extended.
+        extend (str): How the seeded regions are aligned ("full" or "banded").
+        kernel (str): The kernel used by the "full" extension.
+        band (int): The number of letters (diagonals) added on each side of the seeded diagonals.
+
+    Returns:
+        List[SearchResult]: The best hits of every query, best first, and the prefilter counters.
+    """
+    sw_data = _as_sw_data(sw_data)
+    if extend not in ("full", "banded"):
+        raise ValueError(
+            f"Invalid extension: {extend}. Valid extensions are: ['full', 'banded']"
+        )
+    if index is None:
+        index = build_kmer_index(sw_data.seq1s, len(sw_data.alphabet))
+    water = _get_water(kernel, "full")
+
+    results = []
+    for seq2 in sw_data.seq2s:
+        records, diagonals, hits = _find_seeds(index, seq2)
+        kept = hits >= min_hits
+        # alignments of the regions by their letters (and seeded diagonal)
+        aligned = {}
+        hit_list = []
+        for record in np.unique(records[kept]).tolist():
+            seq1 = sw_data.seq1s[record]
+            in_record = kept & (records == record)
+            # regions sorted by start, merged when they overlap
+            order = np.argsort(diagonals[in_record], kind="stable")
+            regions = []
+            for diagonal, count in zip(
+                diagonals[in_record][order].tolist(), hits[in_record][order].tolist()
+            ):
+                start = max(0, diagonal - band)
+                stop = min(len(seq1), diagonal + len(seq2) + band)
+                if regions and start <= regions[-1][1]:
+                    last = regions[-1]
+                    best = (diagonal, count) if count > last[2][1] else last[2]
+                    regions[-1] = (last[0], max(last[1], stop), best)
+                else:
+                    regions.append((start, stop, (diagonal, count)))
+            for start, stop, (diagonal, _) in regions:
+                region = seq1[start:stop]
+                key = (region.tobytes(), diagonal - start if extend == "banded" else 0)
+                out = aligned.get(key)
+                if out is None:
+                    if extend == "banded":
+                        out = _water_banded(
+                            sw_data.substitution,
+                            sw_data.gaps,
+                            region,
+                            seq2,
+                            band=band,
+                            diagonal=diagonal - start,
+                        )
+                    else:
+                        out = (
+                            *water(sw_data.substitution, sw_data.gaps, region, seq2),
+                            False,
+                        )
+                    aligned[key] = out
+                if out[0] > 0:
+                    hit_list.append((-out[0], record, start, out))
+        # regions do not overlap, so their starts order the hits like their indices
+        hit_list.sort(key=lambda hit: hit[:3])
+        results.append(
+            SearchResult(
+                hits=[
+                    SearchHit(
+                        record,
+                        out[0],
+                        [start + i for i in out[1]],
+                        list(out[2]),
+                        bool(out[3]),
+                    )
+                    for _, record, start, out in hit_list[:top_k]
+                ],
+                candidates=int(kept.sum()),
+                pruned=int((~kept).sum()),
+                records_skipped=len(sw_data.seq1s) - len(np.unique(records[kept])),
+            )
+        )
+    return results
@@ -0,0 +1,183 @@
+import itertools
+import threading
+import time
+import socketio
+from typing import Any, Dict, Hashable, List, Optional
+from helpers.common import DEFAULT_ACK_TIMEOUT
+
+# Bytes of the chunks of a payload, and the chunks of a stream in flight waiting for acknowledgement
+DEFAULT_CHUNK_SIZE: int = 256 * 2**10
+DEFAULT_CHUNK_WINDOW: int = 4
+
+
+class ChunkedSender:
+    """
+    Emit payloads as chunks of `chunk_size` bytes, each acknowledged by the
+    receiving node. Every stream has `window` credits: a chunk takes one and its
+    acknowledgement gives it back, so a stream has at most `window` chunks in
+    flight and a slow receiver holds its sender back.
+
+    Args:
+        sio_client (socketio.Client): The socketio client.
+        chunk_size (int): The bytes of the chunks.
+        window (int): The number of chunks of a stream in flight waiting for acknowledgement.
+        timeout (float): The seconds to wait for a credit or for the last acknowledgements.
+    """
+
+    def __init__(
+        self,
+        sio_client: socketio.Client,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        window: int = DEFAULT_CHUNK_WINDOW,
+        timeout: float = DEFAULT_ACK_TIMEOUT,
+    ):
+        self.sio_client = sio_client
+        self.chunk_size = chunk_size
+        self.window = window
+        self.timeout = timeout
+        self.ids = itertools.count()
+        # Credits of the streams in progress, by stream key
+        self.credits: Dict[Hashable, threading.Semaphore] = {}
+        self.lock = threading.Condition()
+        self.in_flight = 0
+        # Chunks and bytes sent, and the time waiting for a credit
+        self.chunks = 0
+        self.chunk_bytes = 0
+        self.waittime = 0.0
+
+    def send(
+        self, frame: Any, stream: Optional[Hashable] = None, last: bool = True
+    ) -> float:
+        """
+        Emit a binary frame in chunks, each once its stream has a credit.
+
+        Args:
+            frame (Any): The binary frame.
+            stream (Optional[Hashable]): The key of the stream of the frame, whose credits it shares with the other frames of the stream. None makes the frame a stream of its own.
+            last (bool): Whether the frame is the last of its stream.
+
+        Returns:
+            float: The time until the last chunk was queued, including the time waiting for credits.
+
+        Raises:
+            socketio.exceptions.TimeoutError: If no credit is given back in time.
+        """
+        start = time.perf_counter()
+        transfer_id = next(self.ids)
+        if stream is None:
+            stream = ("transfer", transfer_id)
+        credits = self.credits.get(stream)
+        if credits is None:
+            credits = self.credits[stream] = threading.Semaphore(self.window)
+
+        def on_ack(*args):
+            with self.lock:
+                self.in_flight -= 1
+                if self.in_flight == 0:
+                    self.lock.notify_all()
+            credits.release()
+
+        view = memoryview(frame)
+        for offset in range(0, len(view), self.chunk_size):
+            chunk = view[offset : offset + self.chunk_size]
+            waited = time.perf_counter()
+            if not credits.acquire(timeout=self.timeout):
+                raise socketio.exceptions.TimeoutError()
+            with self.lock:
+                self.waittime += time.perf_counter() - waited
+                self.in_flight += 1
+                self.chunks += 1
+                self.chunk_bytes += len(chunk)
+            # socketio sends bytes objects as binary attachments, the chunk is copied once here
+            self.sio_client.emit(
+                "chunk",
+                (
+                    {"id": transfer_id, "offset": offset, "size": len(view)},
+                    bytes(chunk),
+                ),
+                callback=on_ack,
+            )
+        if last:
+            del self.credits[stream]
+        return time.perf_counter() - start
+
+    def flush(self):
+        """
+        Wait until every chunk sent is acknowledged.
+
+        Raises:
+            socketio.exceptions.TimeoutError: If the chunks are not acknowledged in time.
+        """
+        with self.lock:
+            if not self.lock.wait_for(lambda: self.in_flight == 0, self.timeout):
+                raise socketio.exceptions.TimeoutError()
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the chunking statistics of the payloads sent, see `merge_stats`.
+
+        Returns:
+            Optional[Dict[str, Any]]: The number of chunks and their bytes, and the time waiting for a credit, or None if no chunk was sent.
+        """
+        with self.lock:
+            if not self.chunks:
+                return None
+            return {
+                "chunks": self.chunks,
+                "chunk_bytes": self.chunk_bytes,
+                "waittime": self.waittime,
+            }
+
+
+class ChunkAssembler:
+    """
+    Reassemble the payloads received in chunks. The buffer of a payload is
+    allocated at its full size on its first chunk, and every chunk is written in
+    place at its offset, so the chunks are never joined.
+    """
+
+    def __init__(self):
+        # Buffers of the payloads in progress and their bytes received, by client and transfer
+        self.transfers: Dict[Hashable, List[Any]] = {}
+        self.lock = threading.Lock()
+
+    def add(
+        self, key: Hashable, header: Dict[str, int], chunk: bytes
+    ) -> Optional[bytes]:
+        """
+        Write a chunk into the buffer of its payload.
+
+        Args:
+            key (Hashable): The key of the transfer, unique among the transfers of every client.
+            header (Dict[str, int]): The offset of the chunk and the size of the payload.
+            chunk (bytes): The chunk.
+
+        Returns:
+            Optional[bytes]: The payload once all its chunks are received, otherwise None.
+        """
+        if header["offset"] == 0 and len(chunk) == header["size"]:
+            # a payload of one chunk is used as it is
+            return chunk
+        with self.lock:
+            transfer = self.transfers.get(key)
+            if transfer is None:
+                transfer = self.transfers[key] = [bytearray(header["size"]), 0]
+            offset = header["offset"]
+            # through a memoryview, assigning to a bytearray slice copies the chunk first
+            memoryview(transfer[0])[offset : offset + len(chunk)] = chunk
+            transfer[1] += len(chunk)
+            if transfer[1] < header["size"]:
+                return None
+            del self.transfers[key]
+            return transfer[0]
+
+    def discard(self, client: Hashable):
+        """
+        Drop the payloads in progress of a client, when it disconnects.
+
+        Args:
+            client (Hashable): The first element of the keys of the transfers of the client.
+        """
+        with self.lock:
+            for key in [key for key in self.transfers if key[0] == client]:
+                del self.transfers[key]
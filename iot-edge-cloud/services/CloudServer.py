@@ -2,10 +2,27 @@ import eventlet
 import socketio
 import queue
 import threading
+from typing import Any, Dict, Iterable, List, Optional
 from dotenv import load_dotenv
 import pandas as pd
 from tabulate import tabulate
-from helpers.common import get_device_id, process_data, print_dict
+from helpers.common import (
+    get_cache_stats,
+    get_device_id,
+    get_kernel_name,
+    process_data,
+    process_stream_chunk,
+    print_dict,
+    warm_up,
+)
+from helpers.dedup import DEFAULT_DEDUP_STORE_BYTES, PayloadStore
+from helpers.transfer import ChunkAssembler
+from helpers.serializer import (
+    DEFAULT_SERIALIZER,
+    choose_compression,
+    choose_serializer,
+    decode_payload,
+)
 from . import *
 
 load_dotenv()
@@ -21,12 +38,26 @@ class CloudServer:
     :type port: int, optional
     :param arch: The architecture type, either 'Edge' or 'Cloud', defaults to ModelArch.EDGE.
     :type arch: ModelArch, optional
+    :param workers: The number of worker processes used by the algorithms, defaults to 1.
+    :type workers: int, optional
+    :param dedup_store_bytes: The bytes of the payloads kept for client nodes that offer their digests, 0 disables it, defaults to 64 MiB.
+    :type dedup_store_bytes: int, optional
     """
 
-    def __init__(self, device_id: str, arch: ModelArch, port: int = 20000):
+    def __init__(
+        self,
+        device_id: str,
+        arch: ModelArch,
+        port: int = 20000,
+        workers: int = 1,
+        dedup_store_bytes: int = DEFAULT_DEDUP_STORE_BYTES,
+    ):
         self.device_id = device_id
         self.port = port
         self.arch = arch
+        self.workers = workers
+        # Payloads recently received, sent again by their digest only
+        self.store = PayloadStore(dedup_store_bytes)
         self.sio = socketio.Server(
             always_connect=True,
             max_http_buffer_size=10**8,
@@ -43,10 +74,36 @@ class CloudServer:
         self.num_proc_packets = 0
         self.transtimes = {}
         self.proctimes = {}
+        self.loadtimes = {}
+        self.kernels = {}
+        # Result cache hits and misses of the nodes processing the data
+        self.cache_stats = {}
+        # Bytes sent with and without reduction, and reduction time of the IoT devices
+        self.reduce_stats = {}
+        # Acknowledgement times and bytes of the packets of the client nodes, when acknowledged
+        self.ack_stats = {}
+        # Compression time and bytes of the packets of the client nodes, when compressed
+        self.compress_stats = {}
+        # Payload store hits, misses and bytes avoided of this server and the edge servers
+        self.dedup_stats = {}
+        # Batch sizes and batching latencies of the messages of the client nodes, when batched
+        self.batch_stats = {}
+        # Chunks sent by the client nodes and the time waiting for credits, when sent in chunks
+        self.chunk_stats = {}
+        # Payloads received in chunks, reassembled in place
+        self.assembler = ChunkAssembler()
+        # Counters of the streams in progress, by client node and stream
+        self.streams = {}
 
         # Log the initialization details
         self.logger.info(
-            {"device_id": self.device_id, "port": self.port, "arch": self.arch.name}
+            {
+                "device_id": self.device_id,
+                "port": self.port,
+                "arch": self.arch.name,
+                "workers": self.workers,
+                "dedup_store_bytes": dedup_store_bytes,
+            }
         )
 
     def process_recv_data(self):
@@ -59,34 +116,154 @@ class CloudServer:
                 device_id, data = self.queue.get(
                     timeout=1
                 )  # Fetch data from the queue with timeout
-                algo = Algorithm[data["algo"]]  # Get the algorithm type
-                recv_data = data["data"]  # Extract the received data
+                messages = data.get("batch")
+                if messages is None:
+                    self._process_message(device_id, data)
+                else:
+                    self._process_batch(device_id, messages)
+                self.queue.task_done()  # Mark the task as done in the queue
+            except queue.Empty:
+                continue  # Continue if the queue is empty
 
-                # Process the data using the algorithm's processing function
-                result, pt = process_data(func=algo.value["process"], data=recv_data)
+    def _get_options(
+        self, device_id: str, algo: Algorithm, data: Any
+    ) -> Dict[str, Any]:
+        """
+        Get the options of the algorithm for a message, keeping the kernel they select.
 
-                # Update the processed data count and log the result
-                self.num_proc_packets += 1
-                self.logger.info(
-                    f"(#{self.num_proc_packets}) Processed data from node {device_id}: {result}"
-                )
+        Args:
+            device_id (str): The identifier of the client node.
+            algo (Algorithm): The algorithm of the message.
+            data (Any): The message received from the client node.
 
-                # Update processing times and store the result
+        Returns:
+            Dict[str, Any]: The algorithm options sent with the message, with the worker count of this server and the data directory of the message.
+        """
+        # Per-request algorithm options, the worker count is set by this node
+        options = {
+            **data.get("options", {}),
+            "workers": self.workers,
+            "data_dir": data["data_dir"],
+        }
+        self.kernels[device_id] = get_kernel_name(algo.value, options)
+        return options
+
+    def _process_batch(self, device_id: str, messages: List[Any]):
+        """
+        Process a batch of messages from a client node, at once if the algorithm can process a batch.
+
+        Args:
+            device_id (str): The identifier of the client node.
+            messages (List[Any]): The messages of the batch.
+        """
+        algo = Algorithm[messages[0]["algo"]]
+        process_batch = algo.value.get("process_batch")
+        if process_batch is None or any(
+            m.get("stream") is not None or m["algo"] != messages[0]["algo"]
+            for m in messages
+        ):
+            for message in messages:
+                self._process_message(device_id, message)
+            return
+        options = self._get_options(device_id, algo, messages[0])
+        results, pt = process_data(
+            func=process_batch, data=[m["data"] for m in messages], **options
+        )
+        with threading.Lock():
+            self.proctimes[device_id] += pt
+        for message, result in zip(messages, results):
+            self._store_result(device_id, algo, message, result)
+
+    def _process_message(self, device_id: str, data: Any):
+        """
+        Process a message from a client node.
+
+        Args:
+            device_id (str): The identifier of the client node.
+            data (Any): The message received from the client node.
+        """
+        algo = Algorithm[data["algo"]]  # Get the algorithm type
+        recv_data = data["data"]  # Extract the received data
+        options = self._get_options(device_id, algo, data)
+
+        stream = data.get("stream")
+        if stream is not None:
+            # Add the chunk to the counters of its stream, the result is stored after the last chunk
+            result, pt = process_stream_chunk(
+                self.streams,
+                (device_id, stream["id"]),
+                algo.value["counter"],
+                recv_data,
+                stream["last"],
+                **options,
+            )
+            if not stream["last"]:
                 with threading.Lock():
                     self.proctimes[device_id] += pt
-                    self.data.setdefault(device_id, []).append(
-                        {
-                            "arch": data["arch"],
-                            "data_size": data["data_size"],
-                            "data_dir": data["data_dir"],
-                            "algo": data["algo"],
-                            "data": result,
-                            "iot_device_id": device_id,
-                        }
-                    )
-                self.queue.task_done()  # Mark the task as done in the queue
-            except queue.Empty:
-                continue  # Continue if the queue is empty
+                self.logger.debug(
+                    f"Running result of stream {stream['id']} from node {device_id}: {result}"
+                )
+                return
+        else:
+            # Process the data using the algorithm's processing function
+            result, pt = process_data(
+                func=algo.value["process"], data=recv_data, **options
+            )
+
+        # Update processing times and store the result
+        with threading.Lock():
+            self.proctimes[device_id] += pt
+        self._store_result(device_id, algo, data, result)
+
+    def _store_result(self, device_id: str, algo: Algorithm, data: Any, result: Any):
+        """
+        Store the result of a message from a client node.
+
+        Args:
+            device_id (str): The identifier of the client node.
+            algo (Algorithm): The algorithm of the message.
+            data (Any): The message received from the client node.
+            result (Any): The result of the message.
+        """
+        cache_stats = get_cache_stats(algo.value)
+        if cache_stats is not None:
+            self.cache_stats[self.device_id] = cache_stats
+
+        # Update the processed data count and log the result
+        self.num_proc_packets += 1
+        self.logger.info(
+            f"(#{self.num_proc_packets}) Processed data from node {device_id} "
+            f"(kernel: {self.kernels[device_id]}): {result}"
+        )
+
+        with threading.Lock():
+            self.data.setdefault(device_id, []).append(
+                {
+                    "arch": data["arch"],
+                    "data_size": data["data_size"],
+                    "data_dir": data["data_dir"],
+                    "algo": data["algo"],
+                    "data": result,
+                    "iot_device_id": device_id,
+                }
+            )
+
+    @staticmethod
+    def _throughput(ack_stats: Iterable[Dict[str, Any]]) -> Optional[float]:
+        """
+        Calculate the effective throughput of acknowledged packets.
+
+        Args:
+            ack_stats (Iterable[Dict[str, Any]]): The acknowledgement statistics of client nodes.
+
+        Returns:
+            Optional[float]: The bytes per second from sending to acknowledgement, or None without acknowledged packets.
+        """
+        ack_stats = list(ack_stats)
+        acktime = sum(a["acktime"] for a in ack_stats)
+        if not acktime:
+            return None
+        return sum(a["packet_bytes"] for a in ack_stats) / acktime
 
     def print_stats(self):
         """
@@ -101,6 +278,10 @@ class CloudServer:
         # Calculate average transmission and processing times
         transtime = sum(self.transtimes.values()) / len(self.transtimes)
         proctime = sum(self.proctimes.values()) / len(self.proctimes)
+        # One-time load cost of the nodes processing the data, not part of the processing time
+        loadtime = (
+            sum(self.loadtimes.values()) / len(self.loadtimes) if self.loadtimes else 0
+        )
 
         if arch == ModelArch.EDGE:
             df = pd.DataFrame(
@@ -112,11 +293,75 @@ class CloudServer:
                         for files in self.data.values()
                     ],
                     "Transmission Time": list(self.transtimes.values()),
+                    "Acked Time": [
+                        self.ack_stats.get(d, {}).get("acktime")
+                        for d in self.transtimes
+                    ],
+                    "Throughput (B/s)": [
+                        (
+                            self._throughput([self.ack_stats[d]])
+                            if d in self.ack_stats
+                            else None
+                        )
+                        for d in self.transtimes
+                    ],
                     "Processing Time": list(self.proctimes.values()),
+                    "Kernel": [self.kernels.get(d) for d in self.transtimes],
+                    "Cache Hits": [
+                        self.cache_stats.get(d, {}).get("hits") for d in self.transtimes
+                    ],
+                    "Cache Misses": [
+                        self.cache_stats.get(d, {}).get("misses")
+                        for d in self.transtimes
+                    ],
+                    "Bytes Saved": [
+                        (
+                            self.reduce_stats[d]["raw_bytes"]
+                            - self.reduce_stats[d]["sent_bytes"]
+                            if d in self.reduce_stats
+                            else None
+                        )
+                        for d in self.transtimes
+                    ],
+                    "Compression Saved": [
+                        (
+                            self.compress_stats[d]["raw_bytes"]
+                            - self.compress_stats[d]["bytes"]
+                            if d in self.compress_stats
+                            else None
+                        )
+                        for d in self.transtimes
+                    ],
+                    "Mean Batch Size": [
+                        (
+                            sum(self.batch_stats[d]["sizes"])
+                            / len(self.batch_stats[d]["sizes"])
+                            if d in self.batch_stats
+                            else None
+                        )
+                        for d in self.transtimes
+                    ],
+                    "Dedup Hits": [
+                        self.dedup_stats.get(d, {}).get("hits") for d in self.transtimes
+                    ],
+                    "Bytes Avoided": [
+                        self.dedup_stats.get(d, {}).get("bytes_avoided")
+                        for d in self.transtimes
+                    ],
                 }
             )
             print(tabulate(df, headers="keys", tablefmt="pretty", showindex=False))
 
+        if self.store.stats() is not None:
+            self.dedup_stats[self.device_id] = self.store.stats()
+        throughput = self._throughput(self.ack_stats.values())
+        dedup_offers = sum(d["hits"] + d["misses"] for d in self.dedup_stats.values())
+        compress_saved = sum(
+            c["raw_bytes"] - c["bytes"] for c in self.compress_stats.values()
+        )
+        batch_sizes = [n for b in self.batch_stats.values() for n in b["sizes"]]
+        batch_waits = [t for b in self.batch_stats.values() for t in b["waittimes"]]
+
         # Print overall statistics
         print_dict(
             {
@@ -125,7 +370,60 @@ class CloudServer:
                 "Total File Size": total_size,
                 "Receive From": list(self.transtimes.keys()),
                 "Transmission Time": transtime,
+                "Acked Transmission Time": (
+                    sum(a["acktime"] for a in self.ack_stats.values())
+                    / len(self.ack_stats)
+                    if self.ack_stats
+                    else None
+                ),
+                "Max Packet Ack Time": max(
+                    (t for a in self.ack_stats.values() for t in a["acktimes"]),
+                    default=None,
+                ),
+                "Window Wait Time": sum(a["waittime"] for a in self.ack_stats.values()),
+                "Bytes Sent": sum(a["packet_bytes"] for a in self.ack_stats.values()),
+                "Throughput (B/s)": throughput,
+                "Compression CPU Time": sum(
+                    c["cputime"] for c in self.compress_stats.values()
+                ),
+                "Bytes Saved by Compression": compress_saved,
+                # Estimated from the acknowledged throughput, the link rate actually measured
+                "Transmission Time Saved": (
+                    compress_saved / throughput if throughput else None
+                ),
+                "Dedup Hit Rate": (
+                    sum(d["hits"] for d in self.dedup_stats.values()) / dedup_offers
+                    if dedup_offers
+                    else None
+                ),
+                "Bytes Avoided by Dedup": sum(
+                    d["bytes_avoided"] for d in self.dedup_stats.values()
+                ),
+                "Batches": len(batch_sizes),
+                "Mean Batch Size": (
+                    sum(batch_sizes) / len(batch_sizes) if batch_sizes else None
+                ),
+                # Time the messages waited for their batch to fill up before being sent
+                "Mean Batching Latency": (
+                    sum(batch_waits) / len(batch_waits) if batch_waits else None
+                ),
+                "Max Batching Latency": max(batch_waits, default=None),
+                "Chunks Sent": sum(c["chunks"] for c in self.chunk_stats.values()),
+                # Time the senders waited for the receivers to acknowledge chunks
+                "Flow Control Wait Time": sum(
+                    c["waittime"] for c in self.chunk_stats.values()
+                ),
                 "Processing Time": proctime,
+                "Load Time": loadtime,
+                "Kernel": sorted({str(k) for k in self.kernels.values()}),
+                "Cache Hits": sum(c["hits"] for c in self.cache_stats.values()),
+                "Cache Misses": sum(c["misses"] for c in self.cache_stats.values()),
+                "Bytes Saved": sum(
+                    r["raw_bytes"] - r["sent_bytes"] for r in self.reduce_stats.values()
+                ),
+                "Reduction Time": sum(
+                    r["reducetime"] for r in self.reduce_stats.values()
+                ),
             }
         )
 
@@ -145,6 +443,10 @@ class CloudServer:
         This function spawns a server thread and sets up event handlers for client connections, disconnections,
         and data reception.
         """
+        if self.arch == ModelArch.CLOUD:
+            # Load the algorithm resources before accepting connections, apart from the processing time
+            self.loadtimes[self.device_id] = warm_up([algo.value for algo in Algorithm])
+            self.logger.info({"loadtime": self.loadtimes[self.device_id]})
         server_thread = eventlet.spawn(self.run_server)
 
         @self.sio.event
@@ -159,35 +461,129 @@ class CloudServer:
         def disconnect(sid):
             session = self.sio.get_session(sid)
             device_id = session["device_id"]
+            self.assembler.discard(sid)
             self.logger.info(f"Client node {device_id} disconnected")
 
+        @self.sio.event
+        def serializer(sid, offered):
+            # Use the first serializer offered by the client node that this server has
+            session = self.sio.get_session(sid)
+            session["serializer"] = choose_serializer(offered)
+            self.sio.save_session(sid, session)
+            return session["serializer"]
+
+        @self.sio.event
+        def compression(sid, offered):
+            # Compressed packets are recognised by their header, any known compression is accepted
+            session = self.sio.get_session(sid)
+            session["compression"] = choose_compression(offered)
+            self.sio.save_session(sid, session)
+            return session["compression"]
+
+        @self.sio.event
+        def dedup(sid, offered):
+            # Keep the payloads of the client node, so it can offer their digests first
+            session = self.sio.get_session(sid)
+            session["dedup"] = bool(offered) and self.store.max_bytes > 0
+            self.sio.save_session(sid, session)
+            return session["dedup"]
+
+        @self.sio.event
+        def offer(sid, digest):
+            # Process the stored copy of an offered payload, the client node sends it only on a miss
+            payload = self.store.get(digest)
+            if payload is None:
+                return False
+            receive(sid, payload)
+            return True
+
+        @self.sio.event
+        def chunk(sid, header, data):
+            # Write the chunk in place into the buffer of its payload, received once complete;
+            # the acknowledgement gives the client node its credit back
+            payload = self.assembler.add((sid, header["id"]), header, data)
+            if payload is not None:
+                recv(sid, payload)
+            return True
+
         @self.sio.event
         def recv(sid, data):
+            if self.sio.get_session(sid).get("dedup") and isinstance(
+                data, (bytes, bytearray)
+            ):
+                self.store.put(data)
+            receive(sid, data)
+
+        def receive_result(device_id, data):
+            self.num_recv_packets += 1
+            # Rebuild results sent in a compact wire form
+            unpack_result = Algorithm[data["algo"]].value.get("unpack_result")
+            if unpack_result is not None:
+                data["data"] = unpack_result(data["data"])
+            self.logger.info(
+                f"(#{self.num_recv_packets}) Result from client node {device_id}: {data}"
+            )
+            self.data[device_id].append(data)
+
+        def receive(sid, data):
             session = self.sio.get_session(sid)
             device_id = session["device_id"]
+            data = decode_payload(session.get("serializer", DEFAULT_SERIALIZER), data)
 
             # Initialize data structures if not already present
             self.data.setdefault(device_id, [])
             self.transtimes.setdefault(device_id, 0)
             self.proctimes.setdefault(device_id, 0)
 
-            if "data" in data and data["data"] is not None:
-                self.num_recv_packets += 1
+            if "batch" in data:
+                if self.arch == ModelArch.CLOUD:
+                    # A batch of messages is queued and processed at once
+                    self.num_recv_packets += len(data["batch"])
+                    self.queue.put((device_id, data))
+                else:
+                    for message in data["batch"]:
+                        receive_result(device_id, message)
+            elif "data" in data and data["data"] is not None:
                 if self.arch == ModelArch.CLOUD:
+                    self.num_recv_packets += 1
                     self.queue.put((device_id, data))  # Queue the data for processing
                 else:
-                    self.logger.info(
-                        f"(#{self.num_recv_packets}) Result from client node {device_id}: {data}"
-                    )
-                    self.data[device_id].append(data)
+                    receive_result(device_id, data)
             elif "acc_transtime" in data and "acc_proctime" in data:
                 self.logger.info(
                     {
                         "device_id": device_id,
                         "acc_transtime": data["acc_transtime"],
                         "acc_proctime": data["acc_proctime"],
+                        "loadtime": data.get("loadtime"),
+                        "kernel": data.get("kernel"),
+                        "cache": data.get("cache"),
+                        "reduce": data.get("reduce"),
+                        "ack": data.get("ack"),
+                        "compress": data.get("compress"),
+                        "dedup": data.get("dedup"),
+                        "batching": data.get("batching"),
+                        "chunking": data.get("chunking"),
                     }
                 )
+                if data.get("ack") is not None:
+                    self.ack_stats[device_id] = data["ack"]
+                if data.get("reduce") is not None:
+                    self.reduce_stats[device_id] = data["reduce"]
+                if data.get("compress") is not None:
+                    self.compress_stats[device_id] = data["compress"]
+                if data.get("dedup") is not None:
+                    self.dedup_stats[device_id] = data["dedup"]
+                if data.get("batching") is not None:
+                    self.batch_stats[device_id] = data["batching"]
+                if data.get("chunking") is not None:
+                    self.chunk_stats[device_id] = data["chunking"]
+                if data.get("cache") is not None:
+                    self.cache_stats[device_id] = data["cache"]
+                if data.get("loadtime"):
+                    self.loadtimes[device_id] = data["loadtime"]
+                if data.get("kernel") is not None:
+                    self.kernels[device_id] = data["kernel"]
                 self.transtimes[device_id] += data["acc_transtime"]
                 self.proctimes[device_id] += data["acc_proctime"]
 
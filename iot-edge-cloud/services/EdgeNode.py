@@ -3,10 +3,43 @@ import threading
 import eventlet
 import socketio
 import queue
-from typing import Any
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
+from helpers.dedup import (
+    DEFAULT_DEDUP_STORE_BYTES,
+    PayloadStore,
+    negotiate_dedup,
+    offer_payload,
+)
+from helpers.transfer import DEFAULT_CHUNK_WINDOW, ChunkAssembler, ChunkedSender
+from helpers.serializer import (
+    DEFAULT_COMPRESSION,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_SERIALIZER,
+    PayloadCompressor,
+    as_frame,
+    choose_compression,
+    choose_serializer,
+    decode_payload,
+    encode_payload,
+    get_serializer_in_use,
+    negotiate_compression,
+    negotiate_serializer,
+)
 from . import *
-from helpers.common import get_device_id, process_data, emit_data
+from helpers.common import (
+    get_cache_stats,
+    get_device_id,
+    get_kernel_name,
+    MessageBatcher,
+    WindowedSender,
+    process_data,
+    process_stream_chunk,
+    emit_data,
+    merge_stats,
+    DEFAULT_BATCH_WAIT,
+    warm_up,
+)
 
 load_dotenv()
 
@@ -21,6 +54,19 @@ class EdgeNode:
         device_id: str,
         port: int = 10000,
         cloud_addr: str = os.getenv("EDGE_TARGET"),
+        workers: int = 1,
+        ack: bool = False,
+        window: int = 1,
+        serializer: str = DEFAULT_SERIALIZER,
+        compression: str = DEFAULT_COMPRESSION,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        compression_threshold: int = None,
+        dedup: bool = False,
+        dedup_store_bytes: int = DEFAULT_DEDUP_STORE_BYTES,
+        batch_size: int = 1,
+        batch_wait: float = DEFAULT_BATCH_WAIT,
+        chunk_size: Optional[int] = None,
+        chunk_window: int = DEFAULT_CHUNK_WINDOW,
     ):
         """
         Initialize the EdgeNode instance.
@@ -29,14 +75,60 @@ class EdgeNode:
             device_id (str): The unique identifier of the edge node.
             port (int, optional): The port on which the edge node will run. Defaults to 10000.
             cloud_addr (str, optional): The address of the cloud server. Defaults to EDGE_TARGET.
+            workers (int, optional): The number of worker processes used by the algorithms. Defaults to 1.
+            ack (bool, optional): Wait for the cloud to acknowledge every result, timing the round trip. Defaults to False.
+            window (int, optional): The number of results in flight waiting for acknowledgement. Defaults to 1.
+            serializer (str, optional): The serializer requested for the results sent to the cloud. Defaults to json.
+            compression (str, optional): The compression requested for the results sent to the cloud. Defaults to none.
+            compression_level (int, optional): The zlib compression level. Defaults to 6.
+            compression_threshold (int, optional): Compress every result of at least this many bytes, None only those of algorithms that compress well. Defaults to None.
+            dedup (bool, optional): Offer the digest of every result to the cloud first, sending it only if the cloud does not have it. Defaults to False.
+            dedup_store_bytes (int, optional): The bytes of the payloads kept for IoT devices that offer their digests, 0 disables it. Defaults to 64 MiB.
+            batch_size (int, optional): The number of results sent to the cloud together, 1 sends every result on its own. Defaults to 1.
+            batch_wait (float, optional): The seconds a batch of results waits to fill up. Defaults to 0.05.
+            chunk_size (int, optional): Send the results to the cloud in chunks of this many bytes, None sends every result whole. Defaults to None.
+            chunk_window (int, optional): The number of chunks of a result in flight waiting for acknowledgement. Defaults to 4.
         """
         self.device_id = device_id
         self.cloud_addr = cloud_addr
         self.port = port
+        self.workers = workers
+        self.ack = ack
+        self.window = window
+        # Serializer of the results sent to the cloud, agreed on when connecting
+        self.serializer = get_serializer_in_use(serializer)
+        # Compressor of the results sent to the cloud, the compression in use is agreed on when connecting
+        self.compressor = PayloadCompressor(
+            compression, compression_level, compression_threshold
+        )
+        # Offer the digest of every result first, agreed on when connecting
+        self.dedup = dedup
+        # Payloads recently received from IoT devices, sent again by their digest only
+        self.store = PayloadStore(dedup_store_bytes)
         self.sio_client = socketio.Client(
             logger=True,
             # engineio_logger=True,
         )
+        # Batches of the results sent to the cloud
+        self.batcher = (
+            MessageBatcher(
+                lambda messages: self._send({"batch": messages}),
+                batch_size,
+                batch_wait,
+            )
+            if batch_size > 1
+            else None
+        )
+        # Sender of the acknowledged results
+        self.sender = WindowedSender(self.sio_client, window) if ack else None
+        # Sender of the results in chunks, with `chunk_window` chunks in flight per result
+        self.chunker = (
+            ChunkedSender(self.sio_client, chunk_size, chunk_window)
+            if chunk_size
+            else None
+        )
+        # Payloads received in chunks from IoT devices, reassembled in place
+        self.assembler = ChunkAssembler()
         self.sio_server = socketio.Server(
             always_connect=True,
             max_http_buffer_size=10**8,
@@ -51,14 +143,45 @@ class EdgeNode:
         self.queue = queue.Queue()
         self.transtime = 0
         self.proctime = 0
+        self.loadtime = 0
         self.iters = 0
         self.num_proc_packets = 0
+        # The statistics are sent once all packets are processed and the IoT device sent its own
+        self.iot_stats_received = False
+        self.stats_lock = threading.Lock()
+        self.kernel = None
+        self.cache_stats = None
+        # Reduction bytes and time of the IoT devices, summed
+        self.reduce_stats = None
+        # Acknowledgement times and bytes of the packets of the IoT devices
+        self.ack_stats = None
+        # Compression time and bytes of the packets of the IoT devices
+        self.compress_stats = None
+        # Batch sizes and batching latencies of the messages of the IoT devices
+        self.batch_stats = None
+        # Chunks sent by the IoT devices, and the time waiting for credits
+        self.chunk_stats = None
+        # Counters of the streams in progress, by IoT device and stream
+        self.streams = {}
         self.running = threading.Event()
         self.logger.info(
             {
                 "device_id": self.device_id,
                 "port": self.port,
                 "cloud_addr": self.cloud_addr,
+                "workers": self.workers,
+                "ack": self.ack,
+                "window": self.window,
+                "serializer": self.serializer,
+                "compression": compression,
+                "compression_level": compression_level,
+                "compression_threshold": compression_threshold,
+                "dedup": self.dedup,
+                "dedup_store_bytes": dedup_store_bytes,
+                "batch_size": batch_size,
+                "batch_wait": batch_wait,
+                "chunk_size": chunk_size,
+                "chunk_window": chunk_window,
             }
         )
 
@@ -69,36 +192,172 @@ class EdgeNode:
         while self.running.is_set():
             try:
                 device_id, data = self.queue.get(timeout=1)
-                self._process_iot_data(device_id, data)
+                sent = self._process_iot_data(device_id, data)
                 self.queue.task_done()
-                self.num_proc_packets += 1
-                if self.num_proc_packets == self.iters:
-                    self._emit_timestats()
+                if not sent:
+                    continue
+                self.num_proc_packets += sent
+                self._emit_timestats_when_done()
             except queue.Empty:
                 pass
 
+    def _emit_timestats_when_done(self):
+        """
+        Send the time statistics once every packet of the IoT device is processed
+        and its own statistics are received, whichever comes last.
+        """
+        with self.stats_lock:
+            if self.num_proc_packets != self.iters or not self.iot_stats_received:
+                return
+            self.iot_stats_received = False
+        self._emit_timestats()
+
     def _emit_timestats(self):
+        batch_stats = self.batch_stats
+        if self.batcher is not None:
+            # Send the results waiting for their batch first
+            self.batcher.flush()
+            if self.batcher.stats() is not None:
+                batch_stats = merge_stats(batch_stats, self.batcher.stats())
+        ack_stats = self.ack_stats
+        if self.sender is not None:
+            # The statistics include every result once all are acknowledged
+            self.sender.flush()
+            ack_stats = merge_stats(ack_stats, self.sender.stats())
+        chunk_stats = self.chunk_stats
+        if self.chunker is not None:
+            self.chunker.flush()
+            if self.chunker.stats() is not None:
+                chunk_stats = merge_stats(chunk_stats, self.chunker.stats())
+        compress_stats = self.compress_stats
+        if self.compressor.cputimes:
+            compress_stats = merge_stats(compress_stats, self.compressor.stats())
         time_stats = {
             "acc_transtime": self.transtime,
             "acc_proctime": self.proctime,
+            "loadtime": self.loadtime,
+            "kernel": self.kernel,
+            "cache": self.cache_stats,
+            "reduce": self.reduce_stats,
+            "ack": ack_stats,
+            "compress": compress_stats,
+            "dedup": self.store.stats(),
+            "batching": batch_stats,
+            "chunking": chunk_stats,
         }
         self.logger.info(time_stats)
         self.sio_client.emit("recv", data=time_stats)
 
-    def _process_iot_data(self, device_id: str, data: Any):
+    def _get_options(self, algo: Algorithm, data: Any) -> Dict[str, Any]:
+        """
+        Get the options of the algorithm for a message, logging the kernel they select when it changes.
+
+        Args:
+            algo (Algorithm): The algorithm of the message.
+            data (Any): The message received from the IoT device.
+
+        Returns:
+            Dict[str, Any]: The algorithm options sent with the message, with the worker count of this node and the data directory of the message.
+        """
+        # Per-request algorithm options, the worker count is set by this node
+        options = {
+            **data.get("options", {}),
+            "workers": self.workers,
+            "data_dir": data["data_dir"],
+        }
+        kernel = get_kernel_name(algo.value, options)
+        if kernel != self.kernel:
+            self.kernel = kernel
+            self.logger.info(f"Processing {algo.name} data with kernel: {kernel}")
+        return options
+
+    def _process_iot_data(self, device_id: str, data: Any) -> int:
         """
-        Process the data received from an IoT device.
+        Process the data received from an IoT device, a message or a batch of messages.
+        The messages of a batch are processed at once if the algorithm can process a batch.
 
         Args:
             device_id (str): The identifier of the IoT device.
             data (Any): The data received from the IoT device.
+
+        Returns:
+            int: The number of results sent to the cloud, 0 for the chunks of a stream before the last one.
+        """
+        messages = data.get("batch")
+        if messages is None:
+            return self._process_message(device_id, data)
+        algo = Algorithm[messages[0]["algo"]]
+        process_batch = algo.value.get("process_batch")
+        if process_batch is None or any(
+            m.get("stream") is not None or m["algo"] != messages[0]["algo"]
+            for m in messages
+        ):
+            return sum(self._process_message(device_id, m) for m in messages)
+        options = self._get_options(algo, messages[0])
+        results, pt = process_data(
+            func=process_batch, data=[m["data"] for m in messages], **options
+        )
+        self.proctime += pt
+        for message, result in zip(messages, results):
+            self._send_result(device_id, algo, message, result)
+        return len(messages)
+
+    def _process_message(self, device_id: str, data: Any) -> int:
+        """
+        Process a message received from an IoT device.
+
+        Args:
+            device_id (str): The identifier of the IoT device.
+            data (Any): The message received from the IoT device.
+
+        Returns:
+            int: 1 if the result was sent to the cloud, 0 for the chunks of a stream before the last one.
         """
         # Sample: data = {"data_size": data_size, "data_dir": data_dir, "data": formatted, "algo": algo}
         recv_data = data["data"]
         algo = Algorithm[data["algo"]]
+        options = self._get_options(algo, data)
 
-        result, pt = process_data(func=algo.value["process"], data=recv_data)
-        self.proctime += pt
+        stream = data.get("stream")
+        if stream is not None:
+            # Add the chunk to the counters of its stream, the result is sent after the last chunk
+            result, pt = process_stream_chunk(
+                self.streams,
+                (device_id, stream["id"]),
+                algo.value["counter"],
+                recv_data,
+                stream["last"],
+                **options,
+            )
+            self.proctime += pt
+            if not stream["last"]:
+                self.logger.debug(
+                    f"Running result of stream {stream['id']} from IoT device {device_id}: {result}"
+                )
+                return 0
+        else:
+            result, pt = process_data(
+                func=algo.value["process"], data=recv_data, **options
+            )
+            self.proctime += pt
+        self._send_result(device_id, algo, data, result)
+        return 1
+
+    def _send_result(self, device_id: str, algo: Algorithm, data: Any, result: Any):
+        """
+        Send the result of a message to the cloud, through the batch of results when batching.
+
+        Args:
+            device_id (str): The identifier of the IoT device.
+            algo (Algorithm): The algorithm of the message.
+            data (Any): The message received from the IoT device.
+            result (Any): The result of the message.
+        """
+        self.cache_stats = get_cache_stats(algo.value)
+        # Send the compact wire form of the result if the algorithm has one
+        pack_result = algo.value.get("pack_result")
+        if pack_result is not None:
+            result = pack_result(result)
 
         # Remain attributes the same, just change the data to the result and the device_id of the IoT device
         sent_data = {
@@ -109,8 +368,35 @@ class EdgeNode:
             "data": result,
             "iot_device_id": device_id,
         }
+        if self.batcher is not None:
+            self.batcher.add(sent_data)
+        else:
+            self._send(sent_data)
+
+    def _send(self, message: Any):
+        """
+        Encode a message or a batch of messages and emit it to the cloud.
 
-        tt = emit_data(self.sio_client, sent_data)
+        Args:
+            message (Any): The message, or the batch as {"batch": messages}.
+        """
+        algo = Algorithm[message.get("batch", [message])[0]["algo"]]
+        payload = self.compressor.compress(
+            self.serializer,
+            encode_payload(self.serializer, message),
+            always=algo.value.get("compress", False),
+        )
+        if self.dedup:
+            payload, hit, ot = offer_payload(self.sio_client, payload)
+            self.transtime += ot
+            if hit:
+                return
+        if self.chunker is not None:
+            tt = self.chunker.send(as_frame(payload))
+        elif self.sender is None:
+            tt = emit_data(self.sio_client, payload)
+        else:
+            tt = self.sender.send(payload)
         self.transtime += tt
 
     def run_server(self):
@@ -126,6 +412,9 @@ class EdgeNode:
         """
         Run the edge node.
         """
+        # Load the algorithm resources before accepting connections, apart from the processing time
+        self.loadtime = warm_up([algo.value for algo in Algorithm])
+        self.logger.info({"loadtime": self.loadtime})
         server_thread = eventlet.spawn(self.run_server)
 
         @self.sio_server.event
@@ -138,14 +427,70 @@ class EdgeNode:
         def disconnect(sid):
             session = self.sio_server.get_session(sid)
             device_id = session["device_id"]
+            self.assembler.discard(sid)
             self.logger.info(f"IoT device {device_id} disconnected")
 
+        @self.sio_server.event
+        def serializer(sid, offered):
+            # Use the first serializer offered by the IoT device that this node has
+            session = self.sio_server.get_session(sid)
+            session["serializer"] = choose_serializer(offered)
+            self.sio_server.save_session(sid, session)
+            return session["serializer"]
+
+        @self.sio_server.event
+        def compression(sid, offered):
+            # Compressed packets are recognised by their header, any known compression is accepted
+            session = self.sio_server.get_session(sid)
+            session["compression"] = choose_compression(offered)
+            self.sio_server.save_session(sid, session)
+            return session["compression"]
+
+        @self.sio_server.event
+        def dedup(sid, offered):
+            # Keep the payloads of the IoT device, so it can offer their digests first
+            session = self.sio_server.get_session(sid)
+            session["dedup"] = bool(offered) and self.store.max_bytes > 0
+            self.sio_server.save_session(sid, session)
+            return session["dedup"]
+
+        @self.sio_server.event
+        def offer(sid, digest):
+            # Process the stored copy of an offered payload, the IoT device sends it only on a miss
+            payload = self.store.get(digest)
+            if payload is None:
+                return False
+            receive(sid, payload)
+            return True
+
+        @self.sio_server.event
+        def chunk(sid, header, data):
+            # Write the chunk in place into the buffer of its payload, received once complete;
+            # the acknowledgement gives the IoT device its credit back
+            payload = self.assembler.add((sid, header["id"]), header, data)
+            if payload is not None:
+                recv(sid, payload)
+            return True
+
         @self.sio_server.event
         def recv(sid, data):
+            if self.sio_server.get_session(sid).get("dedup") and isinstance(
+                data, (bytes, bytearray)
+            ):
+                self.store.put(data)
+            receive(sid, data)
+
+        def receive(sid, data):
             session = self.sio_server.get_session(sid)
             device_id = session["device_id"]
+            data = decode_payload(session.get("serializer", DEFAULT_SERIALIZER), data)
             # device_id = "iot-1"
-            if "data" in data and data["data"] is not None:
+            if "batch" in data:
+                # A batch of messages is queued and processed at once
+                if self.iters == 0:
+                    self.iters = data["batch"][0]["iters"]
+                self.queue.put((device_id, data))
+            elif "data" in data and data["data"] is not None:
                 # Sample: data = {"data_size": data_size, "data_dir": data_dir, "data": formatted, "algo": algo}
                 if self.iters == 0:
                     self.iters = data["iters"]
@@ -155,6 +500,20 @@ class EdgeNode:
                 self.logger.info(
                     f"Accumulated transmission time from IoT device {device_id}: {data['acc_transtime']}s"
                 )
+                if data.get("ack") is not None:
+                    self.ack_stats = merge_stats(self.ack_stats, data["ack"])
+                if data.get("reduce") is not None:
+                    self.reduce_stats = merge_stats(self.reduce_stats, data["reduce"])
+                if data.get("compress") is not None:
+                    self.compress_stats = merge_stats(
+                        self.compress_stats, data["compress"]
+                    )
+                if data.get("batching") is not None:
+                    self.batch_stats = merge_stats(self.batch_stats, data["batching"])
+                if data.get("chunking") is not None:
+                    self.chunk_stats = merge_stats(self.chunk_stats, data["chunking"])
+                self.iot_stats_received = True
+                self._emit_timestats_when_done()
                 # self.proctime += data["acc_proctime"]
                 # self.logger.info(
                 #     f"Accumulated processing time from IoT device {device_id}: {data['acc_proctime']}s"
@@ -169,7 +528,16 @@ class EdgeNode:
                 headers={"device_id": self.device_id},
                 transports=["websocket"],
             )
-            self.logger.info(f"Connected to cloud ({self.cloud_addr})")
+            self.serializer = negotiate_serializer(self.sio_client, self.serializer)
+            self.compressor.compression = negotiate_compression(
+                self.sio_client, self.compressor.compression
+            )
+            self.dedup = negotiate_dedup(self.sio_client, self.dedup)
+            self.logger.info(
+                f"Connected to cloud ({self.cloud_addr}), "
+                f"serializer: {self.serializer}, compression: {self.compressor.compression}, "
+                f"dedup: {self.dedup}"
+            )
             server_thread.wait()
         except Exception as e:
             pidt.join()
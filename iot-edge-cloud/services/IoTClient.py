@@ -2,9 +2,34 @@ import os
 import socketio
 import time
 import threading
-from typing import Any
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 from dotenv import load_dotenv
-from helpers.common import cal_data_size, process_data, emit_data
+from helpers.common import (
+    cal_data_size,
+    cal_payload_size,
+    get_cache_stats,
+    get_kernel_name,
+    MessageBatcher,
+    WindowedSender,
+    iter_with_last,
+    process_data,
+    emit_data,
+    warm_up,
+    DEFAULT_BATCH_WAIT,
+)
+from helpers.dedup import negotiate_dedup, offer_payload
+from helpers.transfer import DEFAULT_CHUNK_WINDOW, ChunkedSender
+from helpers.serializer import (
+    DEFAULT_COMPRESSION,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_SERIALIZER,
+    PayloadCompressor,
+    as_frame,
+    encode_payload,
+    get_serializer_in_use,
+    negotiate_compression,
+    negotiate_serializer,
+)
 from . import *
 
 load_dotenv()
@@ -19,6 +44,19 @@ class IoTClient(threading.Thread):
         algo: Algorithm,
         arch: ModelArch,
         iterations: int,
+        workers: int = 1,
+        algo_options: Dict[str, Any] = None,
+        ack: bool = False,
+        window: int = 1,
+        serializer: str = DEFAULT_SERIALIZER,
+        compression: str = DEFAULT_COMPRESSION,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        compression_threshold: int = None,
+        dedup: bool = False,
+        batch_size: int = 1,
+        batch_wait: float = DEFAULT_BATCH_WAIT,
+        chunk_size: Optional[int] = None,
+        chunk_window: int = DEFAULT_CHUNK_WINDOW,
     ):
         super().__init__()
         self.device_id = device_id
@@ -28,12 +66,62 @@ class IoTClient(threading.Thread):
         self.target_address = target_address
         self.iterations = iterations
         self.arch = arch
+        self.workers = workers
+        self.algo_options = algo_options or {}
+        # Wait for the target node to acknowledge every packet, timing the round trip,
+        # with up to `window` packets in flight
+        self.ack = ack
+        self.window = window
+        # Serializer requested for the payloads, the one in use is agreed on when connecting
+        self.serializer = get_serializer_in_use(serializer)
+        # Compressor of the payloads, the compression in use is agreed on when connecting
+        self.compressor = PayloadCompressor(
+            compression, compression_level, compression_threshold
+        )
+        # Kernel used when this device processes the data (IOT architecture)
+        self.kernel = get_kernel_name(algo.value, self.algo_options)
+        # Stream the data in chunks of this many items, if the algorithm can stream it
+        self.stream_chunk = (
+            self.algo_options.get("stream_chunk")
+            if algo.value.get("stream") is not None
+            else None
+        )
+        # Reduce the data before sending it, if the algorithm can reduce it
+        self.reduce = (
+            algo.value.get("reduce")
+            if self.algo_options.get("reduce") and arch != ModelArch.IOT
+            else None
+        )
+        # Offer the digest of every payload first, the target node may have it already;
+        # agreed on when connecting
+        self.dedup = dedup
         self.sio = socketio.Client(
             logger=True,
             # engineio_logger=True,
         )
         self.transtime = 0
         self.proctime = 0
+        self.loadtime = 0
+        # Time spent reducing the data, and the bytes sent with and without reduction
+        self.reducetime = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        # Batches of up to `batch_size` messages, sent together
+        self.batcher = (
+            MessageBatcher(
+                lambda messages: self._send({"batch": messages}),
+                batch_size,
+                batch_wait,
+            )
+            if batch_size > 1
+            else None
+        )
+        # Sender of the acknowledged packets
+        self.sender = WindowedSender(self.sio, window) if ack else None
+        # Sender of the payloads in chunks, with `chunk_window` chunks in flight per stream
+        self.chunker = (
+            ChunkedSender(self.sio, chunk_size, chunk_window) if chunk_size else None
+        )
         self.logger = Logger(self.device_id)
         self.running = threading.Event()
         self.running.set()
@@ -46,10 +134,69 @@ class IoTClient(threading.Thread):
                 "algo": self.algo.name,
                 "iterations": self.iterations,
                 "arch": self.arch.name,
+                "workers": self.workers,
+                "algo_options": self.algo_options,
+                "kernel": self.kernel,
+                "stream_chunk": self.stream_chunk,
+                "reduce": self.reduce is not None,
+                "ack": self.ack,
+                "window": self.window,
+                "serializer": self.serializer,
+                "compression": compression,
+                "compression_level": compression_level,
+                "compression_threshold": compression_threshold,
+                "dedup": self.dedup,
+                "batch_size": batch_size,
+                "batch_wait": batch_wait,
+                "chunk_size": chunk_size,
+                "chunk_window": chunk_window,
             }
         )
 
-    def _format_and_send(self, data_size: int, data: Any):
+    def _prepare(self, data: Any) -> Tuple[Any, int]:
+        """
+        Reduce the data if enabled, then convert it to its compact wire form if the algorithm has one.
+
+        Args:
+            data (Any): The preprocessed data, or a chunk of it.
+
+        Returns:
+            Tuple[Any, int]: The data to send, and its size before reduction.
+        """
+        raw_size = cal_payload_size(data)
+        if self.reduce is not None:
+            data, rt = process_data(func=self.reduce, data=data, **self.algo_options)
+            self.reducetime += rt
+        pack = self.algo.value.get("pack")
+        return (pack(data) if pack is not None else data), raw_size
+
+    def _split(self, data: Any) -> Optional[List[Any]]:
+        """
+        Split a data set larger than a chunk into slices of about a chunk each, when sending
+        in chunks the data of an algorithm that can process it in a stream, so the target
+        node processes every slice as it arrives instead of waiting for the whole data set.
+
+        Args:
+            data (Any): The preprocessed data.
+
+        Returns:
+            Optional[List[Any]]: The slices, or None if the data is sent whole.
+        """
+        if (
+            self.chunker is None
+            or self.algo.value.get("counter") is None
+            or not isinstance(data, list)
+        ):
+            return None
+        size = cal_payload_size(data)
+        if size <= self.chunker.chunk_size:
+            return None
+        per_slice = max(1, len(data) * self.chunker.chunk_size // size)
+        return [data[i : i + per_slice] for i in range(0, len(data), per_slice)]
+
+    def _format_and_send(
+        self, data_size: int, data: Any, stream: Dict = None, raw_size: int = None
+    ):
         sent_data = {
             "arch": self.arch.name,
             "data_size": data_size,
@@ -57,17 +204,178 @@ class IoTClient(threading.Thread):
             "algo": self.algo.name,
             "data": data,
             "iters": self.iterations,
+            "options": self.algo_options,
         }
+        if stream is not None:
+            sent_data["stream"] = stream
+        if self.reduce is not None:
+            self.raw_bytes += raw_size
+            self.sent_bytes += cal_payload_size(data)
+        if self.batcher is not None:
+            self.batcher.add(sent_data)
+        else:
+            self._send(sent_data)
+
+    def _send(self, message: Dict[str, Any]):
+        """
+        Encode a message or a batch of messages and emit it.
+
+        Args:
+            message (Dict[str, Any]): The message, or the batch as {"batch": messages}.
+        """
+        payload = self.compressor.compress(
+            self.serializer,
+            encode_payload(self.serializer, message),
+            always=self.algo.value.get("compress", False),
+        )
+        # The chunks of the messages of a stream share its credits
+        stream = message.get("stream")
+        stream_key = ("stream", stream["id"]) if stream is not None else None
+        last = stream["last"] if stream is not None else True
         if self.arch == ModelArch.EDGE:
             with self.lock:
-                tt = emit_data(self.sio, sent_data)
-                self.transtime += tt
+                self._emit(payload, stream_key, last)
         else:
-            tt = emit_data(self.sio, sent_data)
-            self.transtime += tt
+            self._emit(payload, stream_key, last)
+
+    def _emit(self, payload: Any, stream_key: Hashable = None, last: bool = True):
+        """
+        Emit a packet, through the window of packets in flight in the acknowledged mode,
+        or in chunks when sending in chunks. With deduplication, its digest is offered
+        first and it is sent only if the target node does not have it.
+
+        Args:
+            payload (Any): The encoded packet.
+            stream_key (Hashable): The stream of the packet when sending in chunks, None if it is not streamed.
+            last (bool): Whether the packet is the last of its stream.
+        """
+        if self.dedup:
+            payload, hit, ot = offer_payload(self.sio, payload)
+            self.transtime += ot
+            if hit:
+                return
+        if self.chunker is not None:
+            self.transtime += self.chunker.send(as_frame(payload), stream_key, last)
+        elif self.sender is None:
+            self.transtime += emit_data(self.sio, payload)
+        else:
+            self.transtime += self.sender.send(payload)
+
+    def _send_all(self, data_size: int):
+        """
+        Read the whole data set once and send it, or its result in the IOT architecture, every iteration.
+
+        Args:
+            data_size (int): The size of the data set.
+        """
+        formatted_data = self.algo.value["preprocess"](self.data_dir)
+        slices = None
+        if self.arch != ModelArch.IOT:
+            slices = self._split(formatted_data)
+            if slices is not None:
+                packed_slices = [self._prepare(data) for data in slices]
+            else:
+                packed_data, raw_size = self._prepare(formatted_data)
+
+        # Wrap the iterations loop with tqdm for progress tracking
+        for iteration in range(self.iterations):
+            if self.arch == ModelArch.IOT:
+                result, pt = process_data(
+                    func=self.algo.value["process"],
+                    data=formatted_data,
+                    **{
+                        **self.algo_options,
+                        "workers": self.workers,
+                        "data_dir": self.data_dir,
+                    },
+                )
+                self.proctime += pt
+                # Send the compact wire form of the result if the algorithm has one
+                pack_result = self.algo.value.get("pack_result")
+                if pack_result is not None:
+                    result = pack_result(result)
+                self._format_and_send(data_size, result)
+            elif slices is not None:
+                # Send the slices as a stream, processed by the target node as they arrive
+                for seq, (packed_slice, slice_size) in enumerate(packed_slices):
+                    self._format_and_send(
+                        data_size,
+                        packed_slice,
+                        {
+                            "id": iteration,
+                            "seq": seq,
+                            "last": seq == len(packed_slices) - 1,
+                        },
+                        slice_size,
+                    )
+            else:
+                self._format_and_send(data_size, packed_data, raw_size=raw_size)
+
+    def _stream(self, data_size: int, stream_id: int):
+        """
+        Read the data in chunks and send every chunk as soon as it is read, so only
+        one chunk is held in memory. In the IOT architecture, the chunks are
+        processed here and only the final result is sent.
+
+        Args:
+            data_size (int): The size of the whole data set.
+            stream_id (int): The identifier of the stream, the iteration number.
+        """
+        chunks = self.algo.value["stream"](self.data_dir, self.stream_chunk)
+        if self.arch == ModelArch.IOT:
+            counter = self.algo.value["counter"]()
+            # The running result after the last chunk is the result of the whole data
+            result = None
+            for chunk in chunks:
+                result, pt = process_data(
+                    func=counter.update,
+                    data=chunk,
+                    **{**self.algo_options, "workers": self.workers},
+                )
+                self.proctime += pt
+            pack_result = self.algo.value.get("pack_result")
+            if pack_result is not None:
+                result = pack_result(result)
+            self._format_and_send(data_size, result)
+        else:
+            for seq, (chunk, last) in enumerate(iter_with_last(chunks)):
+                packed_chunk, raw_size = self._prepare(chunk)
+                self._format_and_send(
+                    data_size,
+                    packed_chunk,
+                    {"id": stream_id, "seq": seq, "last": last},
+                    raw_size,
+                )
 
     def _emit_timestats(self):
-        time_stats = {"acc_transtime": self.transtime, "acc_proctime": self.proctime}
+        time_stats = {
+            "acc_transtime": self.transtime,
+            "acc_proctime": self.proctime,
+            "loadtime": self.loadtime,
+        }
+        if self.arch == ModelArch.IOT:
+            time_stats["kernel"] = self.kernel
+            time_stats["cache"] = get_cache_stats(self.algo.value)
+        if self.batcher is not None:
+            # Send the messages waiting for their batch first
+            self.batcher.flush()
+            time_stats["batching"] = self.batcher.stats()
+        if self.sender is not None:
+            # The statistics include every packet once all are acknowledged
+            self.sender.flush()
+            time_stats["ack"] = self.sender.stats()
+        if self.chunker is not None:
+            self.chunker.flush()
+            time_stats["chunking"] = self.chunker.stats()
+        if self.reduce is not None:
+            time_stats["reduce"] = {
+                "raw_bytes": self.raw_bytes,
+                "sent_bytes": self.sent_bytes,
+                "reducetime": self.reducetime,
+            }
+        compress_stats = self.compressor.stats()
+        if compress_stats is not None:
+            time_stats["compress"] = compress_stats
         self.logger.info(time_stats)
         if self.arch == ModelArch.EDGE:
             with self.lock:
@@ -83,25 +391,32 @@ class IoTClient(threading.Thread):
             wait=True,
             wait_timeout=20,
         )
-        self.logger.info(f"Connected to target node ({self.target_address})")
+        self.serializer = negotiate_serializer(self.sio, self.serializer)
+        self.compressor.compression = negotiate_compression(
+            self.sio, self.compressor.compression
+        )
+        self.dedup = negotiate_dedup(self.sio, self.dedup)
+        self.logger.info(
+            f"Connected to target node ({self.target_address}), "
+            f"serializer: {self.serializer}, compression: {self.compressor.compression}, "
+            f"dedup: {self.dedup}"
+        )
 
     def run(self):
         try:
+            if self.arch == ModelArch.IOT:
+                # Load the algorithm resources once, apart from the processing time
+                self.loadtime = warm_up([self.algo.value])
+                self.logger.info({"loadtime": self.loadtime})
             self.connect_to_target()
 
             data_size = cal_data_size(self.data_dir)
-            formatted_data = self.algo.value["preprocess"](self.data_dir)
-
-            # Wrap the iterations loop with tqdm for progress tracking
-            for _ in range(self.iterations):
-                if self.arch == ModelArch.IOT:
-                    result, pt = process_data(
-                        func=self.algo.value["process"], data=formatted_data
-                    )
-                    self.proctime += pt
-                    self._format_and_send(data_size, result)
-                else:
-                    self._format_and_send(data_size, formatted_data)
+            if self.stream_chunk:
+                # Read the data again for every iteration, one chunk at a time
+                for stream_id in range(self.iterations):
+                    self._stream(data_size, stream_id)
+            else:
+                self._send_all(data_size)
 
             self._emit_timestats()
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the helpers and the configuration are imported from the package directory, as the nodes do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
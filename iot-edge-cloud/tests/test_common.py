@@ -0,0 +1,48 @@
+"""
+Merging of the statistics reported by the senders of the nodes, and the size of
+the socketio packets they send.
+
+Run from the repository root:
+
+    python -m pytest iot-edge-cloud/tests
+"""
+
+import pytest
+from socketio.packet import Packet
+from helpers.common import cal_packet_size, merge_stats
+
+# strings with escaped characters, binary attachments, and nested containers
+PAYLOADS = [
+    "plain text",
+    'quotes " and backslashes \\',
+    "\t",
+    "tab\tnewline\ncarriage\rbackspace\bform feed\f",
+    "null\x00 escape\x1b delete\x7f",
+    "caf\u00e9 \U0001f600",
+    b"\x00\x01binary",
+    {"image": b"jpeg", "name": "KL-31\tB", "size": [1, 2.5, None, True]},
+    [[], {}, "", b"", -3],
+]
+
+
+def test_merge_stats_sums_totals_and_concatenates_lists():
+    stats = merge_stats(None, {"bytes": 10, "times": [0.5]})
+    stats = merge_stats(stats, {"bytes": 5, "times": [0.25]})
+    assert stats == {"bytes": 15, "times": [0.5, 0.25]}
+
+
+def test_merge_stats_with_different_keys():
+    first = {"bytes": 10, "times": [0.5]}
+    stats = merge_stats(None, first)
+    stats = merge_stats(stats, {"times": [0.25], "evictions": 1})
+    assert stats == {"bytes": 10, "times": [0.5, 0.25], "evictions": 1}
+    # the statistics of a sender are not changed by merging them
+    assert first == {"bytes": 10, "times": [0.5]}
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_packet_size_matches_encoding(payload):
+    encoded = Packet(data=["recv", payload]).encode()
+    if isinstance(encoded, str):
+        encoded = [encoded]
+    assert cal_packet_size(payload) == sum(len(part) for part in encoded)
@@ -0,0 +1,48 @@
+"""
+The OCR backends: the fallback of the persistent engine when it fails to start,
+and the text returned as recognized by Tesseract.
+
+Run from the repository root:
+
+    python -m pytest iot-edge-cloud/tests
+"""
+
+import numpy as np
+import helpers.ocr as ocr
+from helpers.ocr import (
+    OCR_CONFIG,
+    PytesseractEngine,
+    get_backend_in_use,
+    get_ocr_engine,
+)
+
+
+class FailingEngine:
+    """
+    An engine that fails to start, as tesserocr does without its trained data.
+    """
+
+    def __init__(self):
+        raise RuntimeError("Failed to init API, possibly an invalid tessdata path")
+
+
+def test_engine_failing_to_start_falls_back(monkeypatch):
+    monkeypatch.setitem(ocr.BACKENDS, "tesserocr", FailingEngine)
+    monkeypatch.setattr(ocr, "_engines", {})
+    monkeypatch.setattr(ocr, "_failed_backends", {})
+    assert isinstance(get_ocr_engine("tesserocr"), PytesseractEngine)
+    assert get_backend_in_use("tesserocr") == "pytesseract"
+    assert "tessdata" in ocr._failed_backends["tesserocr"]
+
+
+def test_pytesseract_text_is_not_changed(monkeypatch):
+    calls = []
+
+    def image_to_string(image, config):
+        calls.append(config)
+        return "KL31B4000\n\f"
+
+    monkeypatch.setattr(ocr, "image_to_string", image_to_string)
+    text = PytesseractEngine().recognize(np.zeros((8, 8), dtype=np.uint8))
+    assert text == "KL31B4000\n\f"
+    assert calls == [OCR_CONFIG]
@@ -0,0 +1,87 @@
+"""
+Parity of the batch VADER scorer with `SentimentIntensityAnalyzer.polarity_scores`,
+on the bundled reviews data sets and on reviews exercising the VADER rules, and
+the result cache used by default.
+
+Run from the repository root:
+
+    python -m pytest iot-edge-cloud/tests
+"""
+
+import os
+import pytest
+from config import DATA_CONFIG
+from helpers.sa import (
+    SentimentCounter,
+    _classify,
+    clear_sa_cache,
+    collect_sa_data,
+    get_analyzer,
+    get_sa_cache_stats,
+    score_batch,
+    sentiment_analysis,
+)
+
+# the data directories of the configuration are relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# negations, boosters, caps, "but", "least", "kind of", "never so", idioms and emphasis
+RULE_REVIEWS = [
+    "",
+    "The food was not good.",
+    "The food wasn't very good at all!!",
+    "The service was VERY good, but the food was BAD.",
+    "It was kind of great, I guess?",
+    "This is the least good place in town.",
+    "At least it was not the worst.",
+    "I have never been so happy here.",
+    "Never this bad, never so good.",
+    "The staff was extremely rude and the room was barely clean...",
+    "Yeah right, it was the bomb. Cut me some slack!",
+    "NOT BAD AT ALL",
+    "GREAT!!!! Would come back???",
+    "Good, good, good, good.",
+    ":) nice :(",
+]
+
+
+def expected_scores(texts):
+    """
+    Score every review with the VADER analyzer, one review at a time.
+    """
+    analyzer = get_analyzer()
+    return [analyzer.polarity_scores(text)["compound"] for text in texts]
+
+
+@pytest.mark.parametrize("size", DATA_CONFIG["sa"]["avail_sizes"])
+def test_batch_scorer_matches_vader_on_datasets(size):
+    texts = collect_sa_data(os.path.join(ROOT, DATA_CONFIG["sa"]["data_dir"], size))
+    assert score_batch(texts).tolist() == expected_scores(texts)
+    assert _classify(texts, scorer="batch") == _classify(texts, scorer="vader")
+
+
+def test_batch_scorer_matches_vader_on_rules():
+    assert score_batch(RULE_REVIEWS).tolist() == expected_scores(RULE_REVIEWS)
+    assert _classify(RULE_REVIEWS, scorer="batch") == _classify(
+        RULE_REVIEWS, scorer="vader"
+    )
+
+
+def test_counter_percentages_without_reviews():
+    counter = SentimentCounter()
+    assert counter.percentages() == (0.0, 0.0, 0.0)
+    assert counter.update([]) == (0.0, 0.0, 0.0)
+
+
+def test_data_set_sent_again_is_cached_by_default():
+    clear_sa_cache()
+    try:
+        first = sentiment_analysis(RULE_REVIEWS)
+        misses = get_sa_cache_stats()["misses"]
+        assert sentiment_analysis(RULE_REVIEWS) == first
+        stats = get_sa_cache_stats()
+        assert stats["misses"] == misses
+        assert stats["hits"] >= len(RULE_REVIEWS)
+        assert sentiment_analysis(RULE_REVIEWS, cache_size=0) == first
+        assert get_sa_cache_stats()["hits"] == stats["hits"]
+    finally:
+        clear_sa_cache()
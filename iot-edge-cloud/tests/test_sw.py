@@ -0,0 +1,247 @@
+"""
+Parity of the Smith-Waterman kernels with the reference Python implementation
+`_water` on the bundled seq_align data sets and on random pairs, the flag of
+the heuristic modes telling that they may have missed the optimal score, and
+the k-mer prefiltered database search.
+
+Run from the repository root:
+
+    python -m pytest iot-edge-cloud/tests
+"""
+
+import os
+import random
+import tracemalloc
+import pytest
+from config import DATA_CONFIG
+import helpers.sw as sw
+from helpers.sw import (
+    HEURISTIC_MODES,
+    KERNELS,
+    _water,
+    _water_batch,
+    _water_hirschberg,
+    _water_wavefront,
+    collect_sw_data,
+    encode_sw_data,
+    get_kernel_in_use,
+    search_database,
+    smith_waterman,
+)
+
+# Kernels returning the full traceback, compared with `_water`
+KERNELS_UNDER_TEST = {
+    "wavefront": _water_wavefront,
+    "hirschberg": _water_hirschberg,
+    **({"compiled": KERNELS["compiled"]} if "compiled" in KERNELS else {}),
+}
+NUM_RANDOM_PAIRS = 200
+# a self-alignment of this length keeps a long traceback path
+LINEAR_MEMORY_LEN = 2000
+LINEAR_MEMORY_BYTES_PER_LETTER = 256
+PARALLEL_TILE_SIZE = 5000
+# an asymmetric matrix catches kernels that swap the sequences
+RANDOM_MATRIX = [[2, -1, -3, 0], [-2, 1, -1, -1], [0, -3, 3, -2], [-1, 0, -1, 1]]
+RANDOM_ALPHABET = "acgt"
+# matches score 2, mismatches -1, and every letter pays 2 for a gap through the
+# last letter of the alphabet, which the sequences do not use
+GAP_MATRIX = [
+    [2, -1, -1, -1, -2],
+    [-1, 2, -1, -1, -2],
+    [-1, -1, 2, -1, -2],
+    [-1, -1, -1, 2, -2],
+    [-2, -2, -2, -2, -2],
+]
+GAP_ALPHABET = "acgt-"
+# the data directories of the configuration are relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="module", params=DATA_CONFIG["sw"]["avail_sizes"])
+def dataset(request):
+    """
+    Encode a bundled data set and align its first pair with the reference kernel.
+    """
+    sw_data = collect_sw_data(
+        os.path.join(ROOT, DATA_CONFIG["sw"]["data_dir"], request.param)
+    )
+    args = (sw_data.substitution, sw_data.gaps, sw_data.seq1s[0], sw_data.seq2s[0])
+    return sw_data, args, _water(*args)
+
+
+def random_pairs(num_pairs: int = NUM_RANDOM_PAIRS):
+    """
+    Yield random short pairs, including empty sequences, encoded with `RANDOM_MATRIX`.
+    """
+    rng = random.Random(0)
+    for _ in range(num_pairs):
+        seq1 = "".join(rng.choice(RANDOM_ALPHABET) for _ in range(rng.randint(0, 40)))
+        seq2 = "".join(rng.choice(RANDOM_ALPHABET) for _ in range(rng.randint(0, 40)))
+        yield encode_sw_data([seq1], [seq2], RANDOM_MATRIX, RANDOM_ALPHABET)
+
+
+@pytest.mark.parametrize("name", list(KERNELS_UNDER_TEST))
+def test_kernel_matches_reference_on_datasets(dataset, name):
+    _, args, expected = dataset
+    assert KERNELS_UNDER_TEST[name](*args) == expected
+
+
+def test_batch_matches_reference_on_datasets(dataset):
+    sw_data, args, expected = dataset
+    # the query and its prefixes share the database pass as lanes of different lengths
+    seq2 = sw_data.seq2s[0]
+    seq2s = [seq2, seq2[: len(seq2) // 2], seq2[:1]]
+    results = _water_batch(sw_data.substitution, sw_data.gaps, args[2], seq2s, lanes=2)
+    assert results[0] == expected
+    assert results == [_water(*args[:3], seq2) for seq2 in seq2s]
+
+
+@pytest.mark.parametrize("name", list(KERNELS_UNDER_TEST))
+def test_kernel_matches_reference_on_random_pairs(name):
+    water = KERNELS_UNDER_TEST[name]
+    for sw_data in random_pairs():
+        args = (sw_data.substitution, sw_data.gaps, sw_data.seq1s[0], sw_data.seq2s[0])
+        assert water(*args) == _water(*args), sw_data
+
+
+def test_batch_matches_reference_on_random_pairs():
+    rng = random.Random(1)
+    for sw_data in random_pairs():
+        seq1, seq2 = sw_data.seq1s[0], sw_data.seq2s[0]
+        seq2s = [seq2[: rng.randint(0, len(seq2))] for _ in range(rng.randint(1, 5))]
+        results = _water_batch(sw_data.substitution, sw_data.gaps, seq1, seq2s, lanes=3)
+        assert results == [
+            _water(sw_data.substitution, sw_data.gaps, seq1, seq2) for seq2 in seq2s
+        ], sw_data
+
+
+@pytest.mark.parametrize("mode", HEURISTIC_MODES)
+def test_heuristic_never_exceeds_optimum(dataset, mode):
+    sw_data, _, _ = dataset
+    for pair in [sw_data, *random_pairs()]:
+        optimal = _water(pair.substitution, pair.gaps, pair.seq1s[0], pair.seq2s[0])
+        score, _, _, _ = smith_waterman(pair, mode=mode)
+        assert score <= optimal[0], pair
+
+
+@pytest.mark.parametrize("mode", HEURISTIC_MODES)
+def test_heuristic_runs_no_exact_pass(dataset, mode, monkeypatch):
+    sw_data, _, _ = dataset
+
+    def exact_pass(*args, **kwargs):
+        raise AssertionError("exact pass in a heuristic mode")
+
+    monkeypatch.setattr(sw, "_find_max_cells", exact_pass)
+    for name in KERNELS:
+        monkeypatch.setitem(KERNELS, name, exact_pass)
+    smith_waterman(sw_data, mode=mode)
+
+
+def test_full_width_band_is_exact(dataset):
+    sw_data, _, _ = dataset
+    for pair in [sw_data, *random_pairs()]:
+        seq1, seq2 = pair.seq1s[0], pair.seq2s[0]
+        optimal = _water(pair.substitution, pair.gaps, seq1, seq2)
+        # every diagonal of the matrix is within the band, no edge cuts a path
+        band = len(seq1) + len(seq2)
+        score, _, _, missed = smith_waterman(pair, mode="banded", band=band)
+        assert (score, missed) == (optimal[0], False), pair
+
+
+def test_band_edge_flags_missed_optimum():
+    # the optimal alignment skips the "c" of the first sequence, one diagonal over
+    sw_data = encode_sw_data(["aaaaacggggg"], ["aaaaaggggg"], GAP_MATRIX, GAP_ALPHABET)
+    optimal = _water(sw_data.substitution, sw_data.gaps, *sw_data.seq1s, *sw_data.seq2s)
+    assert smith_waterman(sw_data, mode="banded", band=1) == (*optimal, True)
+    score, _, _, missed = smith_waterman(sw_data, mode="banded", band=0)
+    assert score < optimal[0] and missed
+
+
+def test_xdrop_flags_early_stop():
+    sw_data = encode_sw_data(["aaaaacggggg"], ["aaaaaggggg"], GAP_MATRIX, GAP_ALPHABET)
+    optimal = _water(sw_data.substitution, sw_data.gaps, *sw_data.seq1s, *sw_data.seq2s)
+    score, _, _, missed = smith_waterman(sw_data, mode="xdrop", xdrop=0)
+    assert score < optimal[0] and missed
+    assert smith_waterman(sw_data, mode="xdrop", xdrop=100) == (*optimal, False)
+
+
+def test_missing_compiled_kernel_falls_back_to_rows(dataset, monkeypatch):
+    sw_data, _, expected = dataset
+    monkeypatch.delitem(KERNELS, "compiled", raising=False)
+    assert get_kernel_in_use("compiled") == "batch"
+    assert smith_waterman(sw_data, kernel="compiled") == expected
+
+
+@pytest.mark.parametrize("cells", [1, 50])
+def test_split_traceback_matches_reference(dataset, cells, monkeypatch):
+    _, args, expected = dataset
+    # small blocks split even the short random pairs
+    monkeypatch.setattr(sw, "_HIRSCHBERG_BLOCK_CELLS", cells)
+    assert _water_hirschberg(*args) == expected
+    for sw_data in random_pairs():
+        args = (sw_data.substitution, sw_data.gaps, sw_data.seq1s[0], sw_data.seq2s[0])
+        assert _water_hirschberg(*args) == _water(*args), sw_data
+
+
+def test_hirschberg_memory_is_linear(dataset):
+    sw_data, _, _ = dataset
+    seq = sw_data.seq1s[0][:LINEAR_MEMORY_LEN].copy()
+    tracemalloc.start()
+    try:
+        _water_hirschberg(sw_data.substitution, sw_data.gaps, seq, seq)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the origins of the whole matrix alone would take len(seq) ** 2 bytes
+    assert peak < LINEAR_MEMORY_BYTES_PER_LETTER * 2 * len(seq)
+
+
+@pytest.mark.parametrize(
+    "kernel,mode",
+    [(kernel, "full") for kernel in KERNELS]
+    + [("compiled", "score"), ("compiled", "hirschberg")],
+)
+def test_parallel_tiles_match_serial(dataset, kernel, mode):
+    sw_data, _, _ = dataset
+    serial = smith_waterman(sw_data, kernel=kernel, mode=mode)
+    # the tiles split every database sequence between the workers
+    assert (
+        smith_waterman(
+            sw_data, kernel=kernel, mode=mode, workers=2, tile_size=PARALLEL_TILE_SIZE
+        )
+        == serial
+    )
+
+
+@pytest.mark.parametrize("extend", sw.SEARCH_MODES)
+def test_search_finds_optimum_and_prunes_seeds(dataset, extend):
+    sw_data, _, optimal = dataset
+    (result,) = search_database(sw_data, extend=extend)
+    assert result.hits[0].score == optimal[0]
+    assert result.pruned > 0
+    assert not any(hit.missed for hit in result.hits)
+    scores = [hit.score for hit in result.hits]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_aligns_repeated_regions_alike():
+    segment = "ttacgtacggtt"
+    spacer = "c" * 20
+    sw_data = encode_sw_data(
+        [segment + spacer + segment], ["acgtacgg"], GAP_MATRIX, GAP_ALPHABET
+    )
+    (result,) = search_database(sw_data, band=2)
+    first, second = result.hits
+    offset = len(segment) + len(spacer)
+    assert second.score == first.score
+    assert second.seq1_indices == [i + offset for i in first.seq1_indices]
+    assert second.seq2_indices == first.seq2_indices
+
+
+def test_search_flags_band_edge():
+    sw_data = encode_sw_data(["aaaaacggggg"], ["aaaaaggggg"], GAP_MATRIX, GAP_ALPHABET)
+    optimal = _water(sw_data.substitution, sw_data.gaps, *sw_data.seq1s, *sw_data.seq2s)
+    (result,) = search_database(sw_data, min_hits=1, extend="banded", band=0)
+    assert result.hits[0].score < optimal[0] and result.hits[0].missed
+    (result,) = search_database(sw_data, min_hits=1, band=0)
+    assert (result.hits[0].score, result.hits[0].missed) == (optimal[0], False)
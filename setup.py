@@ -1,4 +1,25 @@
-from setuptools import setup, find_packages
+from setuptools import Extension, setup, find_packages
+
+try:
+    import numpy
+    from Cython.Build import cythonize
+except ImportError:
+    # Without Cython (or NumPy), helpers/sw.py falls back to its NumPy kernels
+    ext_modules = []
+else:
+    ext_modules = cythonize(
+        [
+            Extension(
+                "helpers._sw_kernel",
+                ["iot-edge-cloud/helpers/_sw_kernel.pyx"],
+                include_dirs=[numpy.get_include()],
+                define_macros=[("NPY_NO_DEPRECATED_API", "NPY_1_7_API_VERSION")],
+                # a missing compiler skips the extension instead of failing the install
+                optional=True,
+            )
+        ],
+        language_level=3,
+    )
 
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
@@ -37,6 +58,10 @@ setup(
         "tabulate>=0.8.7",
         "XlsxWriter>=1.3.7",
     ],
+    extras_require={
+        # the persistent OCR engine, pytesseract is used without it
+        "ocr": ["tesserocr>=2.5.0"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: Implementation :: PyPy",
@@ -44,6 +69,8 @@ setup(
         "Operating System :: OS Independent",
     ],
     python_requires=">=3.6",
-    # Uncomment if you are using Cython extensions:
-    # ext_modules=cythonize("iot_edge_cloud/*.py"),
+    # The compiled extension is built next to helpers/sw.py, which is where it is
+    # imported from (python setup.py build_ext --inplace)
+    package_dir={"helpers": "iot-edge-cloud/helpers"},
+    ext_modules=ext_modules,
 )